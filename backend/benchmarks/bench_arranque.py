@@ -0,0 +1,98 @@
+"""
+Benchmark de arranque en frío: tiempo de `import main` y tiempo hasta la
+primera respuesta, cada corrida en un intérprete nuevo.
+
+La primera petición es un login con un usuario inexistente (401): pasa por
+el lifespan, el router, la BD y la serialización, pero no por bcrypt.
+Por defecto usa una SQLite temporal; con DATABASE_URL exportada usa esa base.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_arranque --corridas 5
+    python -m benchmarks.bench_arranque --guardar   # agrega el resultado a resultados_arranque.csv
+
+El CSV no se versiona: los tiempos dependen de la máquina. Sirve para comparar
+en un mismo equipo el arranque antes y después de un cambio (cada fila guarda
+la revisión de git).
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTADOS = os.path.join(BACKEND_DIR, "benchmarks", "resultados_arranque.csv")
+
+CODIGO = r"""
+import json, sys, time
+inicio = time.perf_counter()
+import main
+importado = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as cliente:
+    r = cliente.post("/usuarios/login", data={"username": "nadie@bench.com", "password": "x"})
+primera = time.perf_counter()
+print(json.dumps({
+    "import_ms": (importado - inicio) * 1000,
+    "primera_peticion_ms": (primera - inicio) * 1000,
+    "status": r.status_code,
+    "modulos": len(sys.modules),
+}))
+"""
+
+
+def _corrida(env: dict) -> dict:
+    resultado = subprocess.run(
+        [sys.executable, "-c", CODIGO], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=300
+    )
+    if resultado.returncode != 0:
+        raise RuntimeError(resultado.stderr)
+    return json.loads(resultado.stdout.strip().splitlines()[-1])
+
+
+def _revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de arranque en frío de la API")
+    parser.add_argument("--corridas", type=int, default=5)
+    parser.add_argument("--guardar", action="store_true", help="Agregar el resultado a resultados_arranque.csv")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if "DATABASE_URL" not in env:
+        env["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'arranque.db')}"
+
+    corridas = [_corrida(env) for _ in range(args.corridas)]
+    importacion = statistics.median(c["import_ms"] for c in corridas)
+    primera = statistics.median(c["primera_peticion_ms"] for c in corridas)
+    print(f"import main:          {importacion:8.1f} ms (mediana de {args.corridas})")
+    print(f"hasta 1ª respuesta:   {primera:8.1f} ms (status {corridas[-1]['status']})")
+    print(f"módulos cargados:     {corridas[-1]['modulos']}")
+
+    if args.guardar:
+        nuevo = not os.path.exists(RESULTADOS)
+        with open(RESULTADOS, "a", newline="") as archivo:
+            escritor = csv.writer(archivo)
+            if nuevo:
+                escritor.writerow(["fecha", "revision", "python", "import_ms", "primera_peticion_ms", "modulos"])
+            escritor.writerow([
+                datetime.now().isoformat(timespec="seconds"), _revision(), platform.python_version(),
+                round(importacion, 1), round(primera, 1), corridas[-1]["modulos"],
+            ])
+        print(f"Resultado agregado a {RESULTADOS}")
+
+
+if __name__ == "__main__":
+    main()
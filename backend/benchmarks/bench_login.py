@@ -0,0 +1,74 @@
+"""
+Benchmark del hashing de contraseñas: verificaciones por segundo con varios
+tamaños del pool de procesos (0 = en el mismo proceso, como antes).
+
+Simula logins concurrentes desde los hilos del servidor y reporta el
+throughput, la latencia p50/p95 y cuántas peticiones se rechazaron por
+saturación (las que el endpoint respondería con 503).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_login --hilos 32 --logins 256 --pools 0,1,2,4
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils import security
+
+
+def _medir(tamano: int, cola: int, hilos: int, logins: int, hashed: str) -> dict:
+    security.configurar_pool(tamano, cola)
+    # Calentar el pool para no medir el arranque de los procesos
+    security.verify_password("benchmark", hashed)
+
+    latencias = []
+    rechazados = 0
+
+    def login(_):
+        inicio = time.perf_counter()
+        try:
+            security.verify_password("benchmark", hashed)
+        except security.PoolHashSaturado:
+            return None
+        return time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+        for resultado in ejecutor.map(login, range(logins)):
+            if resultado is None:
+                rechazados += 1
+            else:
+                latencias.append(resultado)
+    total = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        "pool": tamano,
+        "por_segundo": len(latencias) / total,
+        "p50_ms": statistics.median(latencias) * 1000 if latencias else 0,
+        "p95_ms": latencias[int(len(latencias) * 0.95) - 1] * 1000 if latencias else 0,
+        "rechazados": rechazados,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput de login según el tamaño del pool de bcrypt")
+    parser.add_argument("--hilos", type=int, default=32, help="Peticiones concurrentes")
+    parser.add_argument("--logins", type=int, default=256, help="Verificaciones totales por corrida")
+    parser.add_argument("--pools", default="0,1,2,4", help="Tamaños de pool a comparar")
+    parser.add_argument("--cola", type=int, default=0, help="Cupos de admisión (0 = sin límite práctico)")
+    args = parser.parse_args()
+
+    security.configurar_pool(0, 1)
+    hashed = security.hash_password("benchmark")
+    print(f"bcrypt rounds={security.BCRYPT_ROUNDS} hilos={args.hilos} logins={args.logins}")
+    print(f"{'pool':>5} {'login/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'503':>5}")
+    for tamano in (int(p) for p in args.pools.split(",")):
+        cola = args.cola or args.logins
+        r = _medir(tamano, cola, args.hilos, args.logins, hashed)
+        print(f"{r['pool']:>5} {r['por_segundo']:>9.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['rechazados']:>5}")
+    security.configurar_pool(0, 1)
+
+
+if __name__ == "__main__":
+    main()
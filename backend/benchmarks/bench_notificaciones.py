@@ -0,0 +1,75 @@
+"""
+Benchmark de /gmail/notifications: envía notificaciones Pub/Sub concurrentes
+a un servidor en marcha y reporta throughput y latencia.
+
+Para comparar antes/después de la capa asíncrona, levantar el servidor en
+cada versión (mismo número de workers) y correr el script contra ambos:
+
+    uvicorn main:app --workers 1 --port 8000
+    python -m benchmarks.bench_notificaciones --url http://localhost:8000 \\
+        --email cuenta@gmail.com --concurrencia 50 --total 500
+
+Con handlers que usan la Session síncrona cada consulta bloquea el event
+loop, así que las peticiones del worker se atienden prácticamente de a una;
+con AsyncSession y las llamadas a Google en hilos, se solapan.
+
+Desde la cola de utils/cola_gmail.py el endpoint solo encola (respuestas
+ENCOLADA); el avance del procesamiento se sigue en /diagnostico/cola_gmail.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import statistics
+import time
+import httpx
+
+
+def _payload(email: str, history_id: int) -> dict:
+    datos = json.dumps({"emailAddress": email, "historyId": history_id}).encode("utf-8")
+    return {
+        "message": {
+            "data": base64.urlsafe_b64encode(datos).decode("ascii"),
+            "messageId": str(history_id),
+        },
+        "subscription": "projects/benchmark/subscriptions/benchmark",
+    }
+
+
+async def _correr(url: str, email: str, concurrencia: int, total: int) -> None:
+    latencias = []
+    estados: dict[str, int] = {}
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async with httpx.AsyncClient(base_url=url, timeout=120) as cliente:
+        async def enviar(n: int):
+            async with semaforo:
+                inicio = time.perf_counter()
+                r = await cliente.post("/gmail/notifications", json=_payload(email, 1_000_000 + n))
+                latencias.append(time.perf_counter() - inicio)
+                estado = r.json().get("status", str(r.status_code)) if r.status_code == 200 else str(r.status_code)
+                estados[estado] = estados.get(estado, 0) + 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(enviar(n) for n in range(total)))
+        duracion = time.perf_counter() - inicio
+
+    latencias.sort()
+    print(f"{total} notificaciones, concurrencia {concurrencia}, {duracion:.2f}s")
+    print(f"  throughput: {total / duracion:.1f} req/s")
+    print(f"  p50: {statistics.median(latencias) * 1000:.0f} ms  p95: {latencias[int(len(latencias) * 0.95) - 1] * 1000:.0f} ms")
+    print(f"  respuestas: {estados}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput concurrente de /gmail/notifications")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email", default="benchmark@gmail.com", help="emailAddress de las notificaciones")
+    parser.add_argument("--concurrencia", type=int, default=50)
+    parser.add_argument("--total", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(_correr(args.url, args.email, args.concurrencia, args.total))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+Carga única de variables de entorno desde los archivos .env del backend.
+
+Antes cada módulo llamaba a load_dotenv con su propia ruta; ahora todos
+llaman a `cargar_entorno()` y solo la primera llamada lee los archivos.
+Se mantienen las ubicaciones anteriores (routers/.env y utils/.env) por
+compatibilidad; las variables ya definidas en el entorno tienen prioridad.
+"""
+import os
+from dotenv import load_dotenv
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARCHIVOS_ENV = [
+    os.path.join(BACKEND_DIR, ".env"),
+    os.path.join(BACKEND_DIR, "routers", ".env"),
+    os.path.join(BACKEND_DIR, "utils", ".env"),
+]
+
+_cargado = False
+
+
+def cargar_entorno() -> None:
+    global _cargado
+    if _cargado:
+        return
+    for ruta in ARCHIVOS_ENV:
+        if os.path.exists(ruta):
+            load_dotenv(ruta)
+    _cargado = True
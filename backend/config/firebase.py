@@ -1,7 +1,9 @@
-import firebase_admin
-from firebase_admin import credentials, messaging
+import asyncio
 from typing import Dict, List
 
+# firebase_admin se importa al inicializar el singleton (primer envío), no al
+# importar este módulo: cargar el SDK es lento y no todos los workers lo usan.
+
 class FirebaseAdmin:
     _instance = None
 
@@ -14,6 +16,8 @@ class FirebaseAdmin:
     def _initialize(self):
         try:
             print("🚀 Inicializando Firebase Admin SDK...")
+            import firebase_admin
+            from firebase_admin import credentials
             cred = credentials.Certificate('/Users/eduardoliriano/codigos/Chreosis/chreosis_app/backend/utils/chreosis-a4492-firebase-adminsdk-fbsvc-2d30c216cd.json')
             firebase_admin.initialize_app(cred)
             print("✅ Firebase Admin SDK inicializado correctamente")
@@ -28,6 +32,7 @@ class FirebaseAdmin:
         body: str,
         data: Dict = None
     ) -> bool:
+        from firebase_admin import messaging
         try:
             print(f"📤 Enviando notificación a token: {fcm_token}")
             print(f"📝 Título: {title}")
@@ -53,7 +58,8 @@ class FirebaseAdmin:
                 )
             )
             
-            response = messaging.send(message)
+            # El SDK es bloqueante: se ejecuta en un hilo para no frenar el event loop
+            response = await asyncio.to_thread(messaging.send, message)
             print(f"✅ Notificación enviada exitosamente. Response: {response}")
             return True
         except Exception as e:
@@ -67,6 +73,7 @@ class FirebaseAdmin:
         body: str,
         data: Dict = None
     ) -> Dict:
+        from firebase_admin import messaging
         try:
             print(f"📤 Enviando notificación multicast a {len(fcm_tokens)} tokens")
             print(f"📝 Título: {title}")
@@ -92,7 +99,7 @@ class FirebaseAdmin:
                 )
             )
             
-            response = messaging.send_multicast(message)
+            response = await asyncio.to_thread(messaging.send_multicast, message)
             print(f"✅ Notificación multicast enviada. Respuesta: {response}")
             return {
                 "success_count": response.success_count,
@@ -0,0 +1,117 @@
+"""
+Configuración común de pytest: las pruebas corren contra una base SQLite
+local creada y poblada aquí, nunca contra la base de producción.
+
+Las variables se fijan antes de que cualquier test importe `database`. Para
+correr la suite contra otro motor basta exportar DATABASE_URL (por ejemplo
+una PostgreSQL local) antes de invocar pytest.
+"""
+import os
+import tempfile
+import uuid
+
+_directorio = tempfile.mkdtemp(prefix="chreosis-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_directorio, 'tests.db')}")
+# Hashing barato y en el mismo proceso: las pruebas no miden bcrypt
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("HASH_POOL_SIZE", "0")
+
+import pytest
+from database import SessionLocal, crear_esquema
+from models import Usuario, Cuenta, Categoria
+from utils.security import hash_password
+
+USUARIO_EMAIL = "admin@admin.com"
+USUARIO_PASSWORD = "Admin12345"
+
+
+@pytest.fixture(scope="session")
+def datos_prueba():
+    """
+    Base local con un usuario, sus cuentas (ahorro 30000, ingresos 1000) y dos
+    categorías (gasto e ingreso). Retorna los ids y credenciales.
+    """
+    crear_esquema()
+    db = SessionLocal()
+    usuario = db.query(Usuario).filter(Usuario.email == USUARIO_EMAIL).first()
+    if usuario is None:
+        usuario = Usuario(name="Admin", email=USUARIO_EMAIL, password=hash_password(USUARIO_PASSWORD))
+        db.add(usuario)
+        db.flush()
+        db.add_all([
+            Cuenta(user_id=usuario.id, name="Ahorro", type="banco", amount=30000),
+            Cuenta(user_id=usuario.id, name="Ingresos", type="banco", amount=1000),
+            Categoria(user_id=usuario.id, name="Entretenimiento", type="gasto"),
+            Categoria(user_id=usuario.id, name="Pago trabajo", type="ingreso"),
+        ])
+        db.commit()
+    cuentas = {c.name: c.id for c in db.query(Cuenta).filter(Cuenta.user_id == usuario.id)}
+    categorias = {c.name: c.id for c in db.query(Categoria).filter(Categoria.user_id == usuario.id)}
+    datos = {
+        "email": USUARIO_EMAIL,
+        "password": USUARIO_PASSWORD,
+        "user_id": usuario.id,
+        "cuenta_ahorro": cuentas["Ahorro"],
+        "cuenta_ingresos": cuentas["Ingresos"],
+        "categoria_gasto": categorias["Entretenimiento"],
+        "categoria_ingreso": categorias["Pago trabajo"],
+    }
+    db.close()
+    return datos
+
+
+@pytest.fixture(scope="session")
+def cliente():
+    from fastapi.testclient import TestClient
+    from main import app
+    crear_esquema()
+    return TestClient(app)  # sin lifespan: la cola y el renovador de Gmail no arrancan
+
+
+@pytest.fixture
+def usuario_nuevo(cliente):
+    """
+    Fábrica de usuarios propios del test (aislados de los datos de los demás):
+    cada llamada crea un usuario con la cuenta "Principal" (saldo 10000) y la
+    categoría de gasto "Comida", inicia sesión y retorna los ids y el header.
+    """
+
+    def crear(saldo: float = 10000) -> dict:
+        db = SessionLocal()
+        usuario = Usuario(name="Prueba", email=f"prueba{uuid.uuid4().hex[:12]}@test.com", password=hash_password(USUARIO_PASSWORD))
+        db.add(usuario)
+        db.flush()
+        cuenta = Cuenta(user_id=usuario.id, name="Principal", type="banco", amount=saldo)
+        categoria = Categoria(user_id=usuario.id, name="Comida", type="gasto")
+        db.add_all([cuenta, categoria])
+        db.commit()
+        datos = {"user_id": usuario.id, "email": usuario.email, "cuenta": cuenta.id, "categoria": categoria.id}
+        db.close()
+        respuesta = cliente.post("/usuarios/login", data={"username": datos["email"], "password": USUARIO_PASSWORD})
+        assert respuesta.status_code == 200
+        datos["tokens"] = respuesta.json()
+        datos["headers"] = {"Authorization": f"Bearer {datos['tokens']['access_token']}"}
+        return datos
+
+    return crear
+
+
+@pytest.fixture
+def crear_transaccion(cliente):
+    """
+    Fábrica de transacciones creadas por la API para un usuario de
+    usuario_nuevo: por defecto un gasto de 10 en su cuenta y categoría, con la
+    fecha que asigna el servidor. `campos` pasa tal cual al body (note,
+    account_id, ...). Retorna el id.
+    """
+
+    def crear(usuario: dict, monto: float = 10, tipo: str = "gasto", fecha: str | None = None, **campos) -> int:
+        datos = {"account_id": usuario["cuenta"], "category_id": usuario["categoria"], "amount": monto, "type": tipo}
+        if fecha is not None:
+            datos["date"] = fecha
+        datos.update(campos)
+        respuesta = cliente.post("/transacciones/", json=datos, headers=usuario["headers"])
+        assert respuesta.status_code == 200, respuesta.text
+        return respuesta.json()["id"]
+
+    return crear
@@ -1,28 +1,33 @@
+import itertools
 import os
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
 from urllib.parse import quote_plus
+from utils.cache import CacheTTL
+from utils.metricas_pool import MetricasPool, clase_pool
+from config.entorno import cargar_entorno
 
 # Cargar variables de entorno desde .env
-# load_dotenv()
+cargar_entorno()
 
-# Ruta absoluta al archivo .env
-dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
-load_dotenv(dotenv_path)
-
-# Configuración de la conexión a la base de datos
+# Configuración de la conexión a la base de datos.
+# DATABASE_URL permite usar otro motor (p. ej. sqlite:///./local.db o
+# postgresql+psycopg2://...) para desarrollo, benchmarks y pruebas; sin ella
+# se arma la URL de SQL Server con las variables DB_*.
+DATABASE_URL = os.getenv("DATABASE_URL")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_HOST = os.getenv("DB_HOST")
-DB_PORT = 1433
+DB_PORT = int(os.getenv("DB_PORT", "1433"))
 DB_NAME = os.getenv("DB_NAME")
 DB_DRIVER = os.getenv("DB_DRIVER")
 DB_TRUST_SERVER_CERTIFICATE = os.getenv("DB_TRUST_SERVER_CERTIFICATE")
 
-encoded_password = quote_plus(DB_PASSWORD)
-
 # DB_USER = DB_USERNAME
 # DB_PASSWORD = DB_PASSWORD
 # DB_HOST = DB_SERVER
@@ -31,14 +36,59 @@ encoded_password = quote_plus(DB_PASSWORD)
 # DB_TRUST_SERVER_CERTIFICATE = "yes"
 
 
-# Construir la URL de conexión para SQL Server con pyodbc
-SQLALCHEMY_DATABASE_URL = (
-    f"mssql+pyodbc://{DB_USER}:{encoded_password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    f"?driver={DB_DRIVER.replace(' ', '+')}"
-    f"&TrustServerCertificate={DB_TRUST_SERVER_CERTIFICATE}"
+if DATABASE_URL:
+    SQLALCHEMY_DATABASE_URL = DATABASE_URL
+else:
+    # Construir la URL de conexión para SQL Server con pyodbc
+    encoded_password = quote_plus(DB_PASSWORD)
+    SQLALCHEMY_DATABASE_URL = (
+        f"mssql+pyodbc://{DB_USER}:{encoded_password}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+        f"?driver={DB_DRIVER.replace(' ', '+')}"
+        f"&TrustServerCertificate={DB_TRUST_SERVER_CERTIFICATE}"
+    )
+
+# Pool de conexiones
+# - DB_POOL_SIZE / DB_MAX_OVERFLOW: conexiones permanentes y extra bajo carga.
+# - DB_POOL_TIMEOUT: segundos esperando una conexión libre antes de fallar.
+# - DB_POOL_RECYCLE: segundos tras los que se reemplaza una conexión; debe ser
+#   menor que el tiempo en que SQL Server (o un firewall) cierra las inactivas.
+# - DB_POOL_PRE_PING: verifica la conexión antes de usarla y la reabre si murió.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+POOL_OPCIONES = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
 )
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+def opciones_engine(url, metricas: MetricasPool, asincrono: bool = False) -> dict:
+    """Argumentos de create_engine según el dialecto de la URL."""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    opciones = {}
+    if backend == "sqlite":
+        # Varios hilos comparten conexiones del pool; timeout = espera por el lock de escritura
+        opciones["connect_args"] = {"check_same_thread": False, "timeout": 30}
+        if url.database in (None, "", ":memory:"):
+            # En memoria cada conexión sería una base distinta: una sola compartida
+            opciones["poolclass"] = StaticPool
+            return opciones
+    if backend == "mssql" and not asincrono:
+        # Inserciones masivas (POST /transacciones/lote) en un solo round-trip
+        opciones["fast_executemany"] = True
+    opciones["poolclass"] = clase_pool(AsyncAdaptedQueuePool if asincrono else QueuePool, metricas)
+    opciones.update(POOL_OPCIONES)
+    return opciones
+
+metricas_pool = MetricasPool("sync")
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **opciones_engine(SQLALCHEMY_DATABASE_URL, metricas_pool))
+metricas_pool.instrumentar(engine.pool)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -47,4 +97,131 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# Réplicas de lectura
+# - DB_REPLICA_URLS: URLs separadas por coma; sin ellas todo va al primario.
+# - DB_REPLICA_STALENESS: segundos que un usuario lee del primario después de
+#   escribir (read-after-write), cubriendo el retraso de replicación tolerado.
+# - DB_REPLICA_REINTENTO: segundos que una réplica caída queda fuera de rotación.
+# El registro de escrituras es por proceso: con varios workers, un usuario que
+# cae en otro worker justo después de escribir puede leer hasta
+# DB_REPLICA_STALENESS segundos de retraso.
+DB_REPLICA_URLS = [u.strip() for u in os.getenv("DB_REPLICA_URLS", "").split(",") if u.strip()]
+DB_REPLICA_STALENESS = float(os.getenv("DB_REPLICA_STALENESS", "5"))
+DB_REPLICA_REINTENTO = float(os.getenv("DB_REPLICA_REINTENTO", "30"))
+
+class Replica:
+    def __init__(self, url: str, nombre: str):
+        self.nombre = nombre
+        self.metricas = MetricasPool(nombre)
+        self.engine = create_engine(url, **opciones_engine(url, self.metricas))
+        self.metricas.instrumentar(self.engine.pool)
+        self.sesiones = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.caida_hasta = 0.0
+
+    def disponible(self) -> bool:
+        return time.monotonic() >= self.caida_hasta
+
+    def marcar_caida(self) -> None:
+        self.caida_hasta = time.monotonic() + DB_REPLICA_REINTENTO
+
+replicas = [Replica(url, f"replica{i}") for i, url in enumerate(DB_REPLICA_URLS, start=1)]
+_turno = itertools.count()
+escrituras_recientes = CacheTTL(maximo=100_000, ttl=DB_REPLICA_STALENESS)
+
+def registrar_escritura(user_id: int) -> None:
+    """Marca que el usuario acaba de escribir: sus lecturas van al primario un rato."""
+    escrituras_recientes.set(user_id, True)
+
+def sesion_lectura(user_id: int | None = None):
+    """
+    Sesión para una petición de solo lectura: una réplica disponible (en
+    rotación) salvo que el usuario haya escrito hace menos de
+    DB_REPLICA_STALENESS segundos. Si la réplica no responde, queda fuera de
+    rotación y se usa la siguiente o, en último caso, el primario.
+    """
+    if not replicas or (user_id is not None and escrituras_recientes.get(user_id)):
+        return SessionLocal()
+    for _ in range(len(replicas)):
+        replica = replicas[next(_turno) % len(replicas)]
+        if not replica.disponible():
+            continue
+        db = replica.sesiones()
+        try:
+            # Pide la conexión ya, para detectar la caída antes de entrar al handler
+            db.connection()
+            return db
+        except DBAPIError as e:
+            db.close()
+            replica.marcar_caida()
+            print(f"⚠️ Réplica {replica.nombre} no disponible, se usa otra o el primario: {e}")
+    return SessionLocal()
+
+
+# Capa asíncrona para los handlers `async def` (Gmail, dispositivos): con una
+# AsyncSession las consultas no bloquean el event loop. Usa la misma base que el
+# engine síncrono, cambiando al driver asíncrono del dialecto. El engine se crea
+# en el primer uso para que el driver (aioodbc en SQL Server) solo sea necesario
+# si se usan esos endpoints.
+DRIVERS_ASYNC = {
+    "mssql": "mssql+aioodbc",
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+_async_engine = None
+_AsyncSessionLocal = None
+metricas_pool_async = MetricasPool("async")
+
+def get_async_engine():
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is None:
+        url = engine.url.set(drivername=DRIVERS_ASYNC[engine.url.get_backend_name()])
+        _async_engine = create_async_engine(url, **opciones_engine(url, metricas_pool_async, asincrono=True))
+        metricas_pool_async.instrumentar(_async_engine.sync_engine.pool)
+        _AsyncSessionLocal = async_sessionmaker(
+            _async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+        )
+    return _async_engine
+
+def sesion_async() -> AsyncSession:
+    """AsyncSession fuera de una petición (tareas en segundo plano)."""
+    get_async_engine()
+    return _AsyncSessionLocal()
+
+async def get_async_db():
+    async with sesion_async() as db:
+        yield db
+
+def estadisticas_pools() -> list[dict]:
+    """Métricas de los pools creados (el asíncrono solo si ya se usó)."""
+    pools = [metricas_pool.estadisticas(engine.pool)]
+    pools += [r.metricas.estadisticas(r.engine.pool) for r in replicas]
+    if _async_engine is not None:
+        pools.append(metricas_pool_async.estadisticas(_async_engine.sync_engine.pool))
+    return pools
+
+def crear_esquema() -> None:
+    """
+    Crea las tablas (y el índice de búsqueda) en SQLite y PostgreSQL, los
+    motores de desarrollo y pruebas. En SQL Server no hace nada: el esquema
+    de producción se crea y actualiza solo con las migraciones de Alembic
+    (`alembic upgrade head` desde backend/; ver migrations/versions).
+    """
+    if engine.dialect.name not in ("sqlite", "postgresql"):
+        return
+    import models  # noqa: F401  (registra las tablas en Base.metadata)
+    from utils.busqueda import crear_indice_busqueda
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conexion:
+        crear_indice_busqueda(conexion)
+
+async def cerrar_engines() -> None:
+    """Cierra los pools de conexiones (al apagar la app)."""
+    engine.dispose()
+    for replica in replicas:
+        replica.engine.dispose()
+    if _async_engine is not None:
+        await _async_engine.dispose()
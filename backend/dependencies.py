@@ -1,33 +1,114 @@
-from fastapi import Depends, HTTPException, status
+import os
+import time
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from jose import JWTError
-from database import get_db
+from database import get_db, sesion_lectura
 from models import Usuario
+from utils.cache import CacheTTL
 from utils.security import decode_access_token
 
 # Esquema estándar para extraer el token JWT del header Authorization
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/usuarios/login")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Usuario:
-    """
-    Dependencia para obtener el usuario autenticado desde el JWT.
-    - Decodifica el token, obtiene el id y busca el usuario en la BD.
-    - Lanza excepción si el token es inválido o el usuario no existe.
-    """
-    credentials_exception = HTTPException(
+# Cache token -> identidad del usuario, para no consultar la BD en cada petición.
+# Las entradas nunca viven más que el propio token. El cache es de cada proceso:
+# AUTH_CACHE_TTL es lo que un usuario borrado o editado en otro worker puede
+# seguir autenticado con los datos viejos (ver invalidar_usuario).
+AUTH_CACHE_MAX = int(os.getenv("AUTH_CACHE_MAX", "10000"))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "30"))
+usuarios_cache = CacheTTL(maximo=AUTH_CACHE_MAX, ttl=AUTH_CACHE_TTL)
+
+# Emails (separados por coma) que pueden ver /diagnostico; vacío = nadie
+DIAGNOSTICO_ADMINS = {e.strip().lower() for e in os.getenv("DIAGNOSTICO_ADMINS", "").split(",") if e.strip()}
+
+class UsuarioActual(BaseModel):
+    """Datos del usuario autenticado que guarda el cache (sin tocar la BD)."""
+    id: int
+    name: str
+    email: str
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudo validar las credenciales",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _decodificar(token: str) -> dict:
     try:
         payload = decode_access_token(token)
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
-    user = db.query(Usuario).filter(Usuario.id == int(user_id)).first()
+        raise _credentials_exception()
+    # Un refresh token solo sirve en /usuarios/refresh, nunca como token de acceso
+    if payload.get("sub") is None or payload.get("type") == "refresh":
+        raise _credentials_exception()
+    return payload
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Usuario:
+    """
+    Dependencia para obtener el usuario autenticado desde el JWT.
+    - Decodifica el token, obtiene el id y busca el usuario en la BD.
+    - Lanza excepción si el token es inválido o el usuario no existe.
+    Usar solo cuando se necesita el objeto ORM; para el id basta get_usuario_actual.
+    """
+    payload = _decodificar(token)
+    user = db.query(Usuario).filter(Usuario.id == int(payload["sub"])).first()
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     return user
+
+def get_usuario_actual(
+    request: Request, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+) -> UsuarioActual:
+    """
+    Igual que get_current_user pero devuelve una instantánea cacheada del
+    usuario. Con el token en cache no se decodifica el JWT ni se consulta la BD
+    (la sesión no llega a pedir conexión).
+    Deja el id en request.state para el middleware que registra escrituras.
+    """
+    usuario = usuarios_cache.get(token)
+    if usuario is not None:
+        request.state.usuario_id = usuario.id
+        return usuario
+    payload = _decodificar(token)
+    user = db.query(Usuario.id, Usuario.name, Usuario.email).filter(Usuario.id == int(payload["sub"])).first()
+    if user is None:
+        raise _credentials_exception()
+    usuario = UsuarioActual(id=user.id, name=user.name, email=user.email)
+    usuarios_cache.set(token, usuario, ttl=payload.get("exp", 0) - time.time())
+    request.state.usuario_id = usuario.id
+    return usuario
+
+def get_usuario_admin(current_user: UsuarioActual = Depends(get_usuario_actual)) -> UsuarioActual:
+    """
+    Usuario autenticado que además figura en DIAGNOSTICO_ADMINS. Para
+    endpoints internos que muestran datos de todo el proceso (de todos los
+    usuarios), como /diagnostico.
+    """
+    if current_user.email.lower() not in DIAGNOSTICO_ADMINS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No autorizado")
+    return current_user
+
+def get_db_lectura(current_user: UsuarioActual = Depends(get_usuario_actual)):
+    """
+    Sesión para endpoints de solo lectura (listar_*, obtener_*): una réplica
+    si hay configuradas, o el primario si el usuario escribió recientemente.
+    Nunca usar para escribir.
+    """
+    db = sesion_lectura(current_user.id)
+    try:
+        yield db
+    finally:
+        db.close()
+
+def invalidar_usuario(user_id: int) -> None:
+    """
+    Quita del cache todos los tokens del usuario (tras editarlo o borrarlo).
+    Solo afecta al proceso que atendió la petición: con varios workers de
+    uvicorn los demás lo siguen viendo, como mucho, AUTH_CACHE_TTL segundos
+    (30 por defecto), hasta que su entrada vence y se vuelve a leer de la BD.
+    """
+    usuarios_cache.delete_where(lambda _, usuario: usuario.id == user_id)
@@ -1,13 +1,48 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import asyncio
+import importlib
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from database import engine, Base, get_db
-from routers import usuario, cuenta, categoria, transaccion, serviceEmail, devices
+from database import engine, Base, get_db, crear_esquema, registrar_escritura, cerrar_engines
+from routers import usuario, cuenta, categoria, transaccion, serviceEmail, devices, sync, diagnostico
+from utils.security import cerrar_pool
+from utils.cola_gmail import cola_gmail
+from utils.renovador_gmail import renovador_gmail
 
-# Crear la base de datos si no existe
-# Base.metadata.create_all(bind=engine)
+# SDKs que los routers importan recién en el primer uso (ver serviceEmail,
+# email_processor y config/firebase). Con PRECARGAR_INTEGRACIONES=true se
+# importan en segundo plano al arrancar, sin demorar la primera petición.
+SDKS_PESADOS = ["googleapiclient.discovery", "google_auth_oauthlib.flow", "openai", "firebase_admin"]
+PRECARGAR_INTEGRACIONES = os.getenv("PRECARGAR_INTEGRACIONES", "false").lower() in ("1", "true", "yes")
+
+def _precargar_sdks() -> None:
+    for modulo in SDKS_PESADOS:
+        try:
+            importlib.import_module(modulo)
+        except ImportError as e:
+            print(f"⚠️ No se pudo precargar {modulo}: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Crear la base de datos si no existe
+    # Base.metadata.create_all(bind=engine)
+    # En SQLite/PostgreSQL (DATABASE_URL de desarrollo o pruebas) se crea al arrancar
+    crear_esquema()
+    if PRECARGAR_INTEGRACIONES:
+        asyncio.get_running_loop().run_in_executor(None, _precargar_sdks)
+    # Workers que procesan las notificaciones de Gmail encoladas (GMAIL_WORKERS)
+    cola_gmail.iniciar(serviceEmail.procesar_notificacion)
+    # Renueva tokens y watch de Gmail antes de que venzan (GMAIL_RENOVADOR)
+    renovador_gmail.iniciar()
+    yield
+    await renovador_gmail.detener()
+    await cola_gmail.detener()
+    await cerrar_engines()
+    cerrar_pool()
 
 # Instancia principal de la app
-app = FastAPI(title="Chreosis API - Control de Gastos")
+app = FastAPI(title="Chreosis API - Control de Gastos", lifespan=lifespan)
 
 #! Configuración de CORS (por ahora abierta para desarrollo) tiene que cambiar para produccion
 app.add_middleware(
@@ -18,6 +53,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Tras una escritura exitosa, las lecturas del usuario van al primario durante
+# DB_REPLICA_STALENESS segundos (ver database.sesion_lectura)
+@app.middleware("http")
+async def registrar_escrituras(request: Request, call_next):
+    response = await call_next(request)
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        usuario_id = getattr(request.state, "usuario_id", None)
+        if usuario_id is not None:
+            registrar_escritura(usuario_id)
+    return response
+
 # Incluir rutas (routers) organizados
 app.include_router(usuario.router)
 app.include_router(cuenta.router)
@@ -25,5 +71,7 @@ app.include_router(categoria.router)
 app.include_router(transaccion.router)
 app.include_router(serviceEmail.router)
 app.include_router(devices.router)
+app.include_router(sync.router)
+app.include_router(diagnostico.router)
 
 
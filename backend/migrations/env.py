@@ -0,0 +1,52 @@
+"""
+Entorno de Alembic. Usa el engine de database.py salvo que el llamador pase
+su propia conexión en `config.attributes["connection"]` (pruebas).
+"""
+from logging.config import fileConfig
+from alembic import context
+from database import Base, engine
+import models  # noqa: F401  (registra las tablas en Base.metadata)
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configurar_logging", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def _configurar(conexion) -> None:
+    context.configure(
+        connection=conexion,
+        target_metadata=target_metadata,
+        # SQLite no soporta ALTER COLUMN: las migraciones usan batch_alter_table
+        render_as_batch=conexion.dialect.name == "sqlite",
+        compare_type=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=str(engine.url),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    conexion = config.attributes.get("connection")
+    if conexion is not None:
+        _configurar(conexion)
+        return
+    with engine.connect() as conexion:
+        _configurar(conexion)
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,99 @@
+"""Esquema inicial (el que ya existe en producción)
+
+En una base de producción existente no se ejecuta: se marca como aplicada con
+`alembic stamp 0001` y a partir de ahí `alembic upgrade head`.
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-06-01
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "usuarios",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("email", sa.String(), nullable=False, unique=True),
+        sa.Column("phone_number", sa.String()),
+        sa.Column("password", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_usuarios_id", "usuarios", ["id"])
+
+    op.create_table(
+        "cuentas",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("usuarios.id"), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("type", sa.String()),
+        sa.Column("amount", sa.Float()),
+        sa.UniqueConstraint("user_id", "name"),
+    )
+    op.create_index("ix_cuentas_id", "cuentas", ["id"])
+
+    op.create_table(
+        "categorias",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("usuarios.id"), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("type", sa.String(), nullable=False),
+        sa.UniqueConstraint("user_id", "name"),
+    )
+    op.create_index("ix_categorias_id", "categorias", ["id"])
+
+    op.create_table(
+        "transacciones",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("usuarios.id"), nullable=False),
+        sa.Column("category_id", sa.Integer(), sa.ForeignKey("categorias.id"), nullable=False),
+        sa.Column("account_id", sa.Integer(), sa.ForeignKey("cuentas.id"), nullable=False),
+        sa.Column("date", sa.DateTime(), nullable=False),
+        sa.Column("amount", sa.Float(), nullable=False),
+        sa.Column("type", sa.String(), nullable=False),
+        sa.Column("note", sa.String()),
+        sa.Column("attachment", sa.String()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("lugar", sa.String()),
+        sa.Column("Tipomoneda", sa.String()),
+    )
+    op.create_index("ix_transacciones_id", "transacciones", ["id"])
+
+    op.create_table(
+        "dispositivos",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("fcm_token", sa.String(), nullable=False),
+        sa.Column("nombre_dispositivo", sa.String()),
+        sa.Column("ultimo_acceso", sa.DateTime()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_dispositivos_id", "dispositivos", ["id"])
+
+    op.create_table(
+        "gmail_tokens",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("dispositivo_id", sa.Integer(), sa.ForeignKey("dispositivos.id"), nullable=False, unique=True),
+        sa.Column("access_token", sa.String(), nullable=False),
+        sa.Column("refresh_token", sa.String(), nullable=False),
+        sa.Column("token_uri", sa.String(), nullable=False),
+        sa.Column("client_id", sa.String(), nullable=False),
+        sa.Column("client_secret", sa.String(), nullable=False),
+        sa.Column("scopes", sa.String(), nullable=False),
+        sa.Column("expiration_date", sa.DateTime()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    op.create_index("ix_gmail_tokens_id", "gmail_tokens", ["id"])
+
+
+def downgrade() -> None:
+    for tabla in ("gmail_tokens", "dispositivos", "transacciones", "categorias", "cuentas", "usuarios"):
+        op.drop_table(tabla)
@@ -0,0 +1,141 @@
+"""Columnas, tablas e índices de paginación, sincronización, resúmenes y saldos
+
+- updated_at en cuentas, categorías y transacciones (rellenado con la fecha
+  actual: el primer /sync/changes de cada cliente las trae todas una vez).
+- idempotency_key en transacciones (POST /transacciones/lote).
+- Índices compuestos por usuario de transacciones: (user_id, date, id) y sus
+  variantes por cuenta y categoría; el motor los recorre hacia atrás para
+  ORDER BY date DESC, id DESC.
+- Tablas resumenes_mensuales, saldos_diarios, eliminaciones y tokens_revocados.
+- Índice full-text de búsqueda (SQL Server / PostgreSQL).
+
+Después de aplicarla, poblar los agregados con
+`python -m utils.resumen` y `python -m utils.saldos`.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-06-20
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+IDEMPOTENCIA_WHERE = sa.text("idempotency_key IS NOT NULL")
+
+
+def upgrade() -> None:
+    for tabla in ("cuentas", "categorias", "transacciones"):
+        op.add_column(tabla, sa.Column("updated_at", sa.DateTime()))
+        op.execute(f"UPDATE {tabla} SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL")
+    op.add_column("transacciones", sa.Column("idempotency_key", sa.String(64)))
+
+    op.create_index("ix_cuentas_user_updated_at", "cuentas", ["user_id", "updated_at"])
+    op.create_index("ix_categorias_user_updated_at", "categorias", ["user_id", "updated_at"])
+    op.create_index("ix_transacciones_user_date_id", "transacciones", ["user_id", "date", "id"])
+    op.create_index(
+        "ix_transacciones_user_account_date_id", "transacciones", ["user_id", "account_id", "date", "id"]
+    )
+    op.create_index(
+        "ix_transacciones_user_category_date_id", "transacciones", ["user_id", "category_id", "date", "id"]
+    )
+    op.create_index("ix_transacciones_user_updated_at", "transacciones", ["user_id", "updated_at"])
+    op.create_index(
+        "ux_transacciones_user_idempotency_key", "transacciones", ["user_id", "idempotency_key"],
+        unique=True,
+        mssql_where=IDEMPOTENCIA_WHERE,
+        postgresql_where=IDEMPOTENCIA_WHERE,
+        sqlite_where=IDEMPOTENCIA_WHERE,
+    )
+
+    op.create_table(
+        "resumenes_mensuales",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("usuarios.id"), nullable=False),
+        sa.Column("year_month", sa.String(7), nullable=False),
+        sa.Column("category_id", sa.Integer(), sa.ForeignKey("categorias.id"), nullable=False),
+        sa.Column("account_id", sa.Integer(), sa.ForeignKey("cuentas.id"), nullable=False),
+        sa.Column("type", sa.String(20), nullable=False),
+        sa.Column("total", sa.Float(), nullable=False),
+        sa.Column("cantidad", sa.Integer(), nullable=False),
+        sa.UniqueConstraint("user_id", "year_month", "category_id", "account_id", "type"),
+    )
+    op.create_index("ix_resumenes_mensuales_id", "resumenes_mensuales", ["id"])
+
+    op.create_table(
+        "saldos_diarios",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("usuarios.id"), nullable=False),
+        sa.Column("account_id", sa.Integer(), sa.ForeignKey("cuentas.id"), nullable=False),
+        sa.Column("fecha", sa.Date(), nullable=False),
+        sa.Column("saldo", sa.Float(), nullable=False),
+        sa.Column("neto", sa.Float(), nullable=False),
+        sa.UniqueConstraint("account_id", "fecha"),
+    )
+    op.create_index("ix_saldos_diarios_id", "saldos_diarios", ["id"])
+
+    op.create_table(
+        "eliminaciones",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("usuarios.id"), nullable=False),
+        sa.Column("entidad", sa.String(20), nullable=False),
+        sa.Column("entidad_id", sa.Integer(), nullable=False),
+        sa.Column("deleted_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_eliminaciones_id", "eliminaciones", ["id"])
+    op.create_index("ix_eliminaciones_user_deleted_at", "eliminaciones", ["user_id", "deleted_at"])
+
+    op.create_table(
+        "tokens_revocados",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("jti", sa.String(36), nullable=False, unique=True),
+        sa.Column("tipo", sa.String(10), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("usuarios.id"), nullable=False),
+        sa.Column("expira", sa.DateTime(), nullable=False),
+        sa.Column("revoked_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_tokens_revocados_id", "tokens_revocados", ["id"])
+    op.create_index("ix_tokens_revocados_expira", "tokens_revocados", ["expira"])
+
+    from utils.busqueda import crear_indice_busqueda
+    if op.get_bind().dialect.name == "mssql":
+        # El DDL full-text de SQL Server no puede correr dentro de una transacción
+        with op.get_context().autocommit_block():
+            crear_indice_busqueda(op.get_bind())
+    else:
+        crear_indice_busqueda(op.get_bind())
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == "mssql":
+        with op.get_context().autocommit_block():
+            op.execute(
+                "IF EXISTS (SELECT 1 FROM sys.fulltext_indexes WHERE object_id = OBJECT_ID('transacciones')) "
+                "DROP FULLTEXT INDEX ON transacciones"
+            )
+    elif bind.dialect.name == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_transacciones_busqueda")
+
+    for tabla in ("tokens_revocados", "eliminaciones", "saldos_diarios", "resumenes_mensuales"):
+        op.drop_table(tabla)
+    for indice, tabla in (
+        ("ux_transacciones_user_idempotency_key", "transacciones"),
+        ("ix_transacciones_user_updated_at", "transacciones"),
+        ("ix_transacciones_user_category_date_id", "transacciones"),
+        ("ix_transacciones_user_account_date_id", "transacciones"),
+        ("ix_transacciones_user_date_id", "transacciones"),
+        ("ix_categorias_user_updated_at", "categorias"),
+        ("ix_cuentas_user_updated_at", "cuentas"),
+    ):
+        op.drop_index(indice, table_name=tabla)
+    with op.batch_alter_table("transacciones") as batch:
+        batch.drop_column("idempotency_key")
+        batch.drop_column("updated_at")
+    for tabla in ("categorias", "cuentas"):
+        with op.batch_alter_table(tabla) as batch:
+            batch.drop_column("updated_at")
@@ -0,0 +1,33 @@
+"""Índices de dispositivos: búsqueda por fcm_token y orden por ultimo_acceso
+
+register_device busca el dispositivo por token y /gmail/stop toma el de
+acceso más reciente; sin índice ambas recorren la tabla completa. fcm_token
+pasa a VARCHAR(255) porque SQL Server no indexa columnas VARCHAR(MAX) (los
+tokens de FCM rondan los 160 caracteres).
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-07-01
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("dispositivos") as batch:
+        batch.alter_column("fcm_token", existing_type=sa.String(), type_=sa.String(255), existing_nullable=False)
+    op.create_index("ix_dispositivos_fcm_token", "dispositivos", ["fcm_token"])
+    op.create_index("ix_dispositivos_ultimo_acceso", "dispositivos", ["ultimo_acceso"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_dispositivos_ultimo_acceso", table_name="dispositivos")
+    op.drop_index("ix_dispositivos_fcm_token", table_name="dispositivos")
+    with op.batch_alter_table("dispositivos") as batch:
+        batch.alter_column("fcm_token", existing_type=sa.String(255), type_=sa.String(), existing_nullable=False)
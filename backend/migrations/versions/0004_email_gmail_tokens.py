@@ -0,0 +1,30 @@
+"""Email de la cuenta de Gmail en gmail_tokens, indexado
+
+/gmail/notifications resuelve el emailAddress de cada push con una búsqueda
+por índice en lugar de llamar a getProfile con cada token. Los tokens
+existentes se completan con `python -m utils.gmail` (o solos, en la primera
+notificación que los identifique).
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-07-10
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("gmail_tokens", sa.Column("email", sa.String(320)))
+    op.create_index("ix_gmail_tokens_email", "gmail_tokens", ["email"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_gmail_tokens_email", table_name="gmail_tokens")
+    with op.batch_alter_table("gmail_tokens") as batch:
+        batch.drop_column("email")
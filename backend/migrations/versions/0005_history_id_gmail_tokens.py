@@ -0,0 +1,26 @@
+"""Checkpoint de historyId en gmail_tokens
+
+Cada notificación trae solo los mensajes nuevos desde el último historyId
+procesado (users.history.list) en lugar del último mensaje del INBOX.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-07-15
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("gmail_tokens", sa.Column("history_id", sa.String(32)))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("gmail_tokens") as batch:
+        batch.drop_column("history_id")
@@ -0,0 +1,57 @@
+"""Cola persistente de notificaciones de Gmail y su dead letter
+
+/gmail/notifications encola el push y responde; las tareas de
+utils/cola_gmail.py lo procesan en segundo plano.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2025-07-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "cola_notificaciones_gmail",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("email", sa.String(320)),
+        sa.Column("history_id", sa.String(32), nullable=False),
+        sa.Column("estado", sa.String(12), nullable=False),
+        sa.Column("intentos", sa.Integer, nullable=False),
+        sa.Column("disponible_en", sa.DateTime, nullable=False),
+        sa.Column("tomado_en", sa.DateTime),
+        sa.Column("ultimo_error", sa.String(1000)),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+    )
+    op.create_index("ix_cola_notificaciones_gmail_id", "cola_notificaciones_gmail", ["id"])
+    op.create_index("ix_cola_gmail_estado_disponible", "cola_notificaciones_gmail", ["estado", "disponible_en"])
+    op.create_index("ix_cola_gmail_email_id", "cola_notificaciones_gmail", ["email", "id"])
+
+    op.create_table(
+        "notificaciones_gmail_fallidas",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("notificacion_id", sa.Integer, nullable=False),
+        sa.Column("email", sa.String(320)),
+        sa.Column("history_id", sa.String(32), nullable=False),
+        sa.Column("intentos", sa.Integer, nullable=False),
+        sa.Column("error", sa.String),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+        sa.Column("failed_at", sa.DateTime, nullable=False),
+    )
+    op.create_index("ix_notificaciones_gmail_fallidas_id", "notificaciones_gmail_fallidas", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_notificaciones_gmail_fallidas_id", table_name="notificaciones_gmail_fallidas")
+    op.drop_table("notificaciones_gmail_fallidas")
+    op.drop_index("ix_cola_gmail_email_id", table_name="cola_notificaciones_gmail")
+    op.drop_index("ix_cola_gmail_estado_disponible", table_name="cola_notificaciones_gmail")
+    op.drop_index("ix_cola_notificaciones_gmail_id", table_name="cola_notificaciones_gmail")
+    op.drop_table("cola_notificaciones_gmail")
@@ -0,0 +1,35 @@
+"""Registro de mensajes de Pub/Sub y Gmail ya procesados
+
+Los duplicados (reentregas de Pub/Sub, mensajes que llegan en dos
+notificaciones) se descartan antes de llamar a Gmail u OpenAI.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2025-07-21
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "mensajes_procesados",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("clave", sa.String(400), nullable=False, unique=True),
+        sa.Column("expira", sa.DateTime, nullable=False),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+    )
+    op.create_index("ix_mensajes_procesados_id", "mensajes_procesados", ["id"])
+    op.create_index("ix_mensajes_procesados_expira", "mensajes_procesados", ["expira"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_mensajes_procesados_expira", table_name="mensajes_procesados")
+    op.drop_index("ix_mensajes_procesados_id", table_name="mensajes_procesados")
+    op.drop_table("mensajes_procesados")
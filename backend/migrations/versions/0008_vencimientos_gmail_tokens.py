@@ -0,0 +1,30 @@
+"""Vencimiento del watch de Gmail e índices de vencimiento en gmail_tokens
+
+utils/renovador_gmail.py busca por estas columnas los access tokens y los
+watch a punto de vencer para renovarlos antes de tiempo.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2025-07-24
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("gmail_tokens", sa.Column("watch_expira", sa.DateTime))
+    op.create_index("ix_gmail_tokens_expiration_date", "gmail_tokens", ["expiration_date"])
+    op.create_index("ix_gmail_tokens_watch_expira", "gmail_tokens", ["watch_expira"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_gmail_tokens_watch_expira", table_name="gmail_tokens")
+    op.drop_index("ix_gmail_tokens_expiration_date", table_name="gmail_tokens")
+    with op.batch_alter_table("gmail_tokens") as batch:
+        batch.drop_column("watch_expira")
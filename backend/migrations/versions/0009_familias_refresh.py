@@ -0,0 +1,38 @@
+"""Familias de refresh tokens con su jti vigente
+
+/usuarios/refresh rota el token con un UPDATE condicionado al jti vigente de
+la familia, en lugar de guardar en tokens_revocados cada token rotado.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2025-07-28
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "familias_refresh",
+        sa.Column("familia", sa.String(36), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("usuarios.id"), nullable=False),
+        sa.Column("jti", sa.String(36), nullable=False),
+        sa.Column("expira", sa.DateTime(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_familias_refresh_user_id", "familias_refresh", ["user_id"])
+    op.create_index("ix_familias_refresh_expira", "familias_refresh", ["expira"])
+    # Los tokens rotados ya no se guardan uno por uno
+    op.execute("DELETE FROM tokens_revocados WHERE tipo = 'token'")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_familias_refresh_expira", table_name="familias_refresh")
+    op.drop_index("ix_familias_refresh_user_id", table_name="familias_refresh")
+    op.drop_table("familias_refresh")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Date, DateTime, Float, ForeignKey, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -19,7 +19,11 @@ class Cuenta(Base):
     name = Column(String, nullable=False)
     type = Column(String)
     amount = Column(Float, default=0)
-    __table_args__ = (UniqueConstraint('user_id', 'name'),)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (
+        UniqueConstraint('user_id', 'name'),
+        Index("ix_cuentas_user_updated_at", "user_id", "updated_at"),
+    )
 
 class Categoria(Base):
     __tablename__ = "categorias"
@@ -27,7 +31,11 @@ class Categoria(Base):
     user_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
     name = Column(String, nullable=False)
     type = Column(String, nullable=False)
-    __table_args__ = (UniqueConstraint('user_id', 'name'),)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (
+        UniqueConstraint('user_id', 'name'),
+        Index("ix_categorias_user_updated_at", "user_id", "updated_at"),
+    )
 
 class Transaccion(Base):
     __tablename__ = "transacciones"
@@ -43,28 +51,168 @@ class Transaccion(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     lugar = Column(String, default="DESCONOCIDO")
     Tipomoneda = Column(String, default="DESCONOCIDO")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Clave que envía la app al subir transacciones creadas sin conexión
+    idempotency_key = Column(String(64))
+    # Índices compuestos para la paginación keyset (date, id) por usuario,
+    # con variantes para los filtros más comunes (cuenta y categoría).
+    __table_args__ = (
+        Index("ix_transacciones_user_date_id", "user_id", "date", "id"),
+        Index("ix_transacciones_user_account_date_id", "user_id", "account_id", "date", "id"),
+        Index("ix_transacciones_user_category_date_id", "user_id", "category_id", "date", "id"),
+        Index("ix_transacciones_user_updated_at", "user_id", "updated_at"),
+        # Único solo cuando hay clave (SQL Server no admite varios NULL en un UNIQUE normal)
+        Index(
+            "ux_transacciones_user_idempotency_key", "user_id", "idempotency_key",
+            unique=True,
+            mssql_where=text("idempotency_key IS NOT NULL"),
+            postgresql_where=text("idempotency_key IS NOT NULL"),
+            sqlite_where=text("idempotency_key IS NOT NULL"),
+        ),
+    )
+
+class ResumenMensual(Base):
+    """
+    Totales por usuario, mes, categoría, cuenta y tipo. Se mantiene en la misma
+    transacción que los cambios en `transacciones` (ver utils/resumen.py).
+    """
+    __tablename__ = "resumenes_mensuales"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
+    year_month = Column(String(7), nullable=False)  # Formato YYYY-MM
+    category_id = Column(Integer, ForeignKey("categorias.id"), nullable=False)
+    account_id = Column(Integer, ForeignKey("cuentas.id"), nullable=False)
+    type = Column(String(20), nullable=False)
+    total = Column(Float, nullable=False, default=0)
+    cantidad = Column(Integer, nullable=False, default=0)
+    __table_args__ = (UniqueConstraint('user_id', 'year_month', 'category_id', 'account_id', 'type'),)
+
+class SaldoDiario(Base):
+    """
+    Checkpoint diario del saldo de una cuenta: saldo al cierre del día y
+    movimiento neto de ese día. Solo existen filas para días con movimientos;
+    se mantiene desde utils/saldos.py en la misma transacción que el cambio.
+    """
+    __tablename__ = "saldos_diarios"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
+    account_id = Column(Integer, ForeignKey("cuentas.id"), nullable=False)
+    fecha = Column(Date, nullable=False)
+    saldo = Column(Float, nullable=False)
+    neto = Column(Float, nullable=False, default=0)
+    __table_args__ = (UniqueConstraint('account_id', 'fecha'),)
+
+class Eliminacion(Base):
+    """
+    Registro (tombstone) de cuentas, categorías y transacciones borradas, para
+    que la sincronización incremental pueda informar los borrados al cliente.
+    """
+    __tablename__ = "eliminaciones"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
+    entidad = Column(String(20), nullable=False)  # cuenta | categoria | transaccion
+    entidad_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    __table_args__ = (Index("ix_eliminaciones_user_deleted_at", "user_id", "deleted_at"),)
 
 class GmailToken(Base):
     __tablename__ = "gmail_tokens"
     id = Column(Integer, primary_key=True, index=True)
     dispositivo_id = Column(Integer, ForeignKey("dispositivos.id"), unique=True, nullable=False)
+    # Cuenta de Gmail del token: resuelve el emailAddress de cada notificación
+    email = Column(String(320), index=True)
+    # Último historyId de Gmail procesado (checkpoint de la ingesta incremental)
+    history_id = Column(String(32))
     access_token = Column(String, nullable=False)
     refresh_token = Column(String, nullable=False)
     token_uri = Column(String, nullable=False)
     client_id = Column(String, nullable=False)
     client_secret = Column(String, nullable=False)
     scopes = Column(String, nullable=False)
-    expiration_date = Column(DateTime)
+    # Vencimiento del access token y del watch de Gmail (ver utils/renovador_gmail.py)
+    expiration_date = Column(DateTime, index=True)
+    watch_expira = Column(DateTime, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     #QUE ES ESTO DE RELATIONSHIP?
     dispositivo = relationship("Dispositivo", back_populates="gmail_token")
 
+class NotificacionGmail(Base):
+    """
+    Cola persistente de notificaciones push de Gmail (ver utils/cola_gmail.py).
+    Una fila por push recibido; se borra al procesarse o al pasar a
+    notificaciones_gmail_fallidas.
+    """
+    __tablename__ = "cola_notificaciones_gmail"
+    id = Column(Integer, primary_key=True, index=True)
+    email = Column(String(320))
+    history_id = Column(String(32), nullable=False)
+    estado = Column(String(12), nullable=False, default="pendiente")  # pendiente | procesando
+    intentos = Column(Integer, nullable=False, default=0)
+    disponible_en = Column(DateTime, nullable=False, default=datetime.utcnow)  # backoff de reintentos
+    tomado_en = Column(DateTime)
+    ultimo_error = Column(String(1000))
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    __table_args__ = (
+        Index("ix_cola_gmail_estado_disponible", "estado", "disponible_en"),
+        Index("ix_cola_gmail_email_id", "email", "id"),
+    )
+
+class NotificacionGmailFallida(Base):
+    """Dead letter: notificaciones que agotaron los reintentos, para revisarlas a mano."""
+    __tablename__ = "notificaciones_gmail_fallidas"
+    id = Column(Integer, primary_key=True, index=True)
+    notificacion_id = Column(Integer, nullable=False)
+    email = Column(String(320))
+    history_id = Column(String(32), nullable=False)
+    intentos = Column(Integer, nullable=False)
+    error = Column(String)
+    created_at = Column(DateTime, nullable=False)
+    failed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class MensajeProcesado(Base):
+    """
+    Mensajes de Pub/Sub y de Gmail ya procesados (ver utils/deduplicacion.py).
+    Las filas dejan de servir cuando pasa `expira` y se purgan.
+    """
+    __tablename__ = "mensajes_procesados"
+    id = Column(Integer, primary_key=True, index=True)
+    clave = Column(String(400), unique=True, nullable=False)  # pubsub:<messageId> | gmail:<email>:<id>
+    expira = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
 class Dispositivo(Base):
     __tablename__ = "dispositivos"
     id = Column(Integer, primary_key=True, index=True)
-    fcm_token = Column(String, nullable=False)
+    # Longitud acotada para poder indexarla (register_device busca por token)
+    fcm_token = Column(String(255), nullable=False, index=True)
     nombre_dispositivo = Column(String)
-    ultimo_acceso = Column(DateTime)
+    ultimo_acceso = Column(DateTime, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    gmail_token = relationship("GmailToken", back_populates="dispositivo", uselist=False)
\ No newline at end of file
+    gmail_token = relationship("GmailToken", back_populates="dispositivo", uselist=False)
+
+class FamiliaRefresh(Base):
+    """
+    Familia de refresh tokens vigente (una por login de dispositivo) con el
+    único jti que todavía se puede rotar. Revocar la familia borra la fila.
+    """
+    __tablename__ = "familias_refresh"
+    familia = Column(String(36), primary_key=True)
+    user_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False, index=True)
+    jti = Column(String(36), nullable=False)
+    expira = Column(DateTime, nullable=False, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+class TokenRevocado(Base):
+    """
+    Familias de refresh tokens revocadas. Es el respaldo persistente del
+    registro en memoria de utils/revocaciones.py; las filas dejan de servir
+    cuando pasa `expira` y se purgan.
+    """
+    __tablename__ = "tokens_revocados"
+    id = Column(Integer, primary_key=True, index=True)
+    jti = Column(String(36), unique=True, nullable=False)  # id de la familia
+    tipo = Column(String(10), nullable=False)  # familia (antes también token)
+    user_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
+    expira = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, default=datetime.utcnow, nullable=False)
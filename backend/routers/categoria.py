@@ -4,7 +4,10 @@ from sqlalchemy.orm import Session
 from database import get_db
 from models import Cuenta, Categoria, Usuario
 from utils.security import hash_password, verify_password, create_access_token
-from dependencies import get_current_user
+from dependencies import get_usuario_actual, get_db_lectura, UsuarioActual
+from utils.etag import etag_coleccion
+from utils.sincronizacion import registrar_eliminacion
+from utils.resumen import borrar_resumenes
 from pydantic import BaseModel, EmailStr, Field, validator
 from typing import List, Optional
 from jose import JWTError
@@ -39,7 +42,7 @@ class Token(BaseModel):
 
 
 @router.post("/", response_model=CategoriaOut)
-def crear_categoria(categoria: CategoriaCreate, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+def crear_categoria(categoria: CategoriaCreate, db: Session = Depends(get_db), current_user: UsuarioActual = Depends(get_usuario_actual)):
     db_categoria = db.query(Categoria).filter(Categoria.name == categoria.name, Categoria.user_id == current_user.id).first()
     if db_categoria:
         raise HTTPException(status_code=400, detail="Categoría ya registrada con el mismo nombre.")
@@ -50,31 +53,33 @@ def crear_categoria(categoria: CategoriaCreate, db: Session = Depends(get_db), c
     db.refresh(nuevo)
     return nuevo
 
-@router.get("/", response_model=List[CategoriaOut])
-def listar_categorias(db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+@router.get("/", response_model=List[CategoriaOut], dependencies=[Depends(etag_coleccion(Categoria))])
+def listar_categorias(db: Session = Depends(get_db_lectura), current_user: UsuarioActual = Depends(get_usuario_actual)):
     """
     Ejemplo de endpoint protegido: solo usuarios autenticados pueden ver la lista.
     """
     return db.query(Categoria).filter(Categoria.user_id == current_user.id).all()
 
 @router.get("/{categoria_id}", response_model=CategoriaOut)
-def obtener_categoria(categoria_id: int, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+def obtener_categoria(categoria_id: int, db: Session = Depends(get_db_lectura), current_user: UsuarioActual = Depends(get_usuario_actual)):
     categoria = db.query(Categoria).filter(Categoria.id == categoria_id, Categoria.user_id == current_user.id).first()
     if not categoria:
         raise HTTPException(status_code=404, detail="Categoría no encontrada")
     return categoria
 
 @router.delete("/{categoria_id}", status_code=200)
-def eliminar_categoria(categoria_id: int, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+def eliminar_categoria(categoria_id: int, db: Session = Depends(get_db), current_user: UsuarioActual = Depends(get_usuario_actual)):
     categoria = db.query(Categoria).filter(Categoria.id == categoria_id, Categoria.user_id == current_user.id).first()
     if not categoria:
         raise HTTPException(status_code=404, detail="Categoría no encontrada")
+    registrar_eliminacion(db, current_user.id, "categoria", categoria.id)
+    borrar_resumenes(db, category_id=categoria.id)
     db.delete(categoria)
     db.commit()
     return {"detail": "Categoría eliminada exitosamente"}
 
 @router.put("/{categoria_id}", response_model=CategoriaOut)
-def actualizar_categoria(categoria_id: int, categoria_actualizada: CategoriaUpdate, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+def actualizar_categoria(categoria_id: int, categoria_actualizada: CategoriaUpdate, db: Session = Depends(get_db), current_user: UsuarioActual = Depends(get_usuario_actual)):
     """
     Actualiza una categoría existente.
 
@@ -2,11 +2,17 @@ from fastapi import APIRouter, Depends, HTTPException, status, Security
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from database import get_db
-from models import Cuenta, Usuario
+from models import Cuenta, Usuario, SaldoDiario
 from utils.security import hash_password, verify_password, create_access_token
-from dependencies import get_current_user
+from dependencies import get_usuario_actual, get_db_lectura, UsuarioActual
+from utils.etag import etag_coleccion
+from utils.sincronizacion import registrar_eliminacion
+from utils.ledger import ajustar_saldo
+from utils.saldos import registrar_saldo, saldo_en_fecha, serie_saldos
+from utils.resumen import borrar_resumenes
 from pydantic import BaseModel, EmailStr, Field, validator
 from typing import List, Optional
+from datetime import date, datetime
 from jose import JWTError
 
 
@@ -35,6 +41,10 @@ class CuentaOut(BaseModel):
     class Config:
         from_attributes = True
 
+class SaldoOut(BaseModel):
+    fecha: date
+    saldo: float
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -42,42 +52,72 @@ class Token(BaseModel):
 
 
 @router.post("/", response_model=CuentaOut)
-def crear_cuenta(cuenta: CuentaCreate, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+def crear_cuenta(cuenta: CuentaCreate, db: Session = Depends(get_db), current_user: UsuarioActual = Depends(get_usuario_actual)):
     db_cuenta = db.query(Cuenta).filter(Cuenta.name == cuenta.name, Cuenta.user_id == current_user.id).first()
     if db_cuenta:
         raise HTTPException(status_code=400, detail="Cuenta ya registrada con el mismo nombre.")
     nuevo = Cuenta(**cuenta.model_dump())
     nuevo.user_id = current_user.id
     db.add(nuevo)
+    db.flush()
+    # Primer checkpoint de saldo: el monto inicial de la cuenta
+    registrar_saldo(db, current_user.id, nuevo.id, datetime.now().date(), nuevo.amount or 0)
     db.commit()
     db.refresh(nuevo)
     return nuevo
 
-@router.get("/", response_model=List[CuentaOut])
-def listar_cuentas(db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+@router.get("/", response_model=List[CuentaOut], dependencies=[Depends(etag_coleccion(Cuenta))])
+def listar_cuentas(db: Session = Depends(get_db_lectura), current_user: UsuarioActual = Depends(get_usuario_actual)):
     """
     Ejemplo de endpoint protegido: solo usuarios autenticados pueden ver la lista.
     """
     return db.query(Cuenta).filter(Cuenta.user_id == current_user.id).all()
 
 @router.get("/{cuenta_id}", response_model=CuentaOut)
-def obtener_cuenta(cuenta_id: int, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+def obtener_cuenta(cuenta_id: int, db: Session = Depends(get_db_lectura), current_user: UsuarioActual = Depends(get_usuario_actual)):
     cuenta = db.query(Cuenta).filter(Cuenta.id == cuenta_id, Cuenta.user_id == current_user.id).first()
     if not cuenta:
         raise HTTPException(status_code=404, detail="Cuenta no encontrada")
     return cuenta
 
+@router.get("/{cuenta_id}/saldo", response_model=SaldoOut)
+def obtener_saldo_en_fecha(cuenta_id: int, fecha: date, db: Session = Depends(get_db_lectura), current_user: UsuarioActual = Depends(get_usuario_actual)):
+    """
+    Saldo de la cuenta al cierre de `fecha`, leído de un único checkpoint diario.
+    """
+    cuenta = db.query(Cuenta.id).filter(Cuenta.id == cuenta_id, Cuenta.user_id == current_user.id).first()
+    if not cuenta:
+        raise HTTPException(status_code=404, detail="Cuenta no encontrada")
+    return SaldoOut(fecha=fecha, saldo=saldo_en_fecha(db, cuenta_id, fecha))
+
+@router.get("/{cuenta_id}/saldos", response_model=List[SaldoOut])
+def historial_saldos(cuenta_id: int, desde: date, hasta: Optional[date] = None, db: Session = Depends(get_db_lectura), current_user: UsuarioActual = Depends(get_usuario_actual)):
+    """
+    Serie de saldos para gráficas: el saldo de apertura en `desde` y el cierre
+    de cada día con movimientos hasta `hasta` (hoy por defecto).
+    """
+    hasta = hasta or datetime.now().date()
+    if desde > hasta:
+        raise HTTPException(status_code=400, detail="La fecha 'desde' debe ser anterior a 'hasta'")
+    cuenta = db.query(Cuenta.id).filter(Cuenta.id == cuenta_id, Cuenta.user_id == current_user.id).first()
+    if not cuenta:
+        raise HTTPException(status_code=404, detail="Cuenta no encontrada")
+    return [SaldoOut(fecha=f, saldo=s) for f, s in serie_saldos(db, cuenta_id, desde, hasta)]
+
 @router.delete("/{cuenta_id}", status_code=200)
-def eliminar_cuenta(cuenta_id: int, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+def eliminar_cuenta(cuenta_id: int, db: Session = Depends(get_db), current_user: UsuarioActual = Depends(get_usuario_actual)):
     cuenta = db.query(Cuenta).filter(Cuenta.id == cuenta_id, Cuenta.user_id == current_user.id).first()
     if not cuenta:
         raise HTTPException(status_code=404, detail="Cuenta no encontrada")
+    registrar_eliminacion(db, current_user.id, "cuenta", cuenta.id)
+    db.query(SaldoDiario).filter(SaldoDiario.account_id == cuenta.id).delete(synchronize_session=False)
+    borrar_resumenes(db, account_id=cuenta.id)
     db.delete(cuenta)
     db.commit()
     return {"detail": "Cuenta eliminada exitosamente"}
 
 @router.put("/{cuenta_id}", response_model=CuentaOut)
-def actualizar_cuenta(cuenta_id: int, cuenta_actualizada: CuentaUpdate, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+def actualizar_cuenta(cuenta_id: int, cuenta_actualizada: CuentaUpdate, db: Session = Depends(get_db), current_user: UsuarioActual = Depends(get_usuario_actual)):
     """
     Actualiza una cuenta existente.
 
@@ -100,6 +140,12 @@ def actualizar_cuenta(cuenta_id: int, cuenta_actualizada: CuentaUpdate, db: Sess
         name_existente = db.query(Cuenta).filter(Cuenta.name == update_data["name"], Cuenta.user_id == current_user.id).first()
         if name_existente:
             raise HTTPException(status_code=400, detail="Nombre de cuenta ya registrado.")
+    # Un cambio directo del monto se registra como ajuste de hoy en el saldo
+    nuevo_monto = update_data.pop("amount", None)
+    if nuevo_monto is not None:
+        delta = nuevo_monto - (cuenta.amount or 0)
+        ajustar_saldo(db, current_user.id, cuenta.id, delta, validar_fondos=False)
+        registrar_saldo(db, current_user.id, cuenta.id, datetime.now().date(), delta)
     for key, value in update_data.items():
         setattr(cuenta, key, value)
     db.commit()
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from datetime import datetime
-from database import get_db
+from database import get_async_db
 from models import Dispositivo
 from schemas import DispositivoCreate, DispositivoResponse
 from config.firebase import FirebaseAdmin
@@ -12,19 +13,19 @@ router = APIRouter(prefix="/devices", tags=["devices"])
 @router.post("/register", response_model=DispositivoResponse)
 async def register_device(
     device: DispositivoCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
         # Verificar si el token ya existe
-        existing_device = db.query(Dispositivo).filter(
-            Dispositivo.fcm_token == device.fcm_token
-        ).first()
+        existing_device = (await db.execute(
+            select(Dispositivo).where(Dispositivo.fcm_token == device.fcm_token)
+        )).scalars().first()
 
         if existing_device:
             # Actualizar dispositivo existente
             existing_device.ultimo_acceso = datetime.utcnow()
             existing_device.nombre_dispositivo = device.nombre_dispositivo
-            db.commit()
+            await db.commit()
             return existing_device
 
         # Crear nuevo dispositivo
@@ -34,12 +35,12 @@ async def register_device(
             ultimo_acceso=datetime.utcnow()
         )
         db.add(new_device)
-        db.commit()
-        db.refresh(new_device)
+        await db.commit()
+        await db.refresh(new_device)
         return new_device
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Error registrando dispositivo: {str(e)}"
@@ -47,11 +48,13 @@ async def register_device(
 
 @router.post("/test-notification")
 async def test_notification(
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
         # Obtener el dispositivo más reciente
-        dispositivo = db.query(Dispositivo).order_by(Dispositivo.created_at.desc()).first()
+        dispositivo = (await db.execute(
+            select(Dispositivo).order_by(Dispositivo.created_at.desc()).limit(1)
+        )).scalars().first()
         if not dispositivo:
             raise HTTPException(
                 status_code=404,
@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from database import estadisticas_pools, get_db
+from dependencies import get_usuario_admin, usuarios_cache
+from utils.revocaciones import revocaciones
+from utils.cola_gmail import cola_gmail, profundidad
+from utils.deduplicacion import procesados
+from utils.gmail import clientes as clientes_gmail
+from utils.renovador_gmail import renovador_gmail
+from utils.plantillas_correo import plantillas
+
+# Métricas de todo el proceso (incluye datos de correos de todos los usuarios):
+# solo para los emails de DIAGNOSTICO_ADMINS
+router = APIRouter(prefix="/diagnostico", tags=["Diagnóstico"], dependencies=[Depends(get_usuario_admin)])
+
+@router.get("/")
+def metricas():
+    """
+    Métricas internas del proceso que atiende la petición (cada worker de
+    uvicorn tiene las suyas): pools de conexiones y caches en memoria.
+    """
+    return {
+        "pools": estadisticas_pools(),
+        "cache_usuarios": usuarios_cache.estadisticas(),
+        "revocaciones_en_memoria": len(revocaciones),
+        "cola_gmail": cola_gmail.estadisticas(),
+        "deduplicacion": procesados.estadisticas(),
+        "clientes_gmail": clientes_gmail.estadisticas(),
+        "renovador_gmail": renovador_gmail.estadisticas(),
+        "plantillas_correo": plantillas.estadisticas(),
+    }
+
+@router.get("/pool")
+def metricas_pool():
+    """Conexiones en uso, overflow, tiempos de espera y recambio de conexiones."""
+    return estadisticas_pools()
+
+@router.get("/cola_gmail")
+def metricas_cola_gmail(db: Session = Depends(get_db)):
+    """
+    Profundidad de la cola de notificaciones de Gmail (leída del primario) y
+    latencias de procesamiento de este proceso.
+    """
+    return {**profundidad(db), **cola_gmail.estadisticas()}
+
+@router.get("/plantillas_correo")
+def metricas_plantillas_correo():
+    """
+    Aciertos por plantilla, correos que fueron a GPT agrupados por forma y
+    plantillas candidatas listas para copiar a PLANTILLAS_CORREO_ARCHIVO.
+    """
+    return {**plantillas.estadisticas(), "formas_frecuentes": plantillas.formas_frecuentes()}
@@ -1,25 +1,31 @@
 from fastapi import APIRouter, Request, HTTPException, Depends
 from fastapi.responses import RedirectResponse
-from google_auth_oauthlib.flow import Flow
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+import asyncio
 import os
 import base64
 import json
-from dotenv import load_dotenv
 import time
 import requests
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager
+from database import get_async_db
 from models import Usuario, GmailToken, Dispositivo
 from utils.security import verify_password
 from utils.email_processor import process_and_save_email
+from utils.gmail import (
+    construir_servicio, servicio_para, olvidar_cliente, persistir_refresco, renovar_watch,
+    ids_nuevos, obtener_mensajes
+)
+from utils.cola_gmail import cola_gmail
+from utils.deduplicacion import procesados
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 from config.firebase import FirebaseAdmin
+from config.entorno import cargar_entorno
 
-dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
-load_dotenv(dotenv_path)
+cargar_entorno()
 
 router = APIRouter(
     prefix="/gmail",
@@ -42,6 +48,25 @@ GOOGLE_CLIENT_CONFIG = {
     }
 }
 
+# Los SDK de Google se importan en el primer uso (ver utils/gmail.py)
+def _flow():
+    """Flujo OAuth de Google configurado con el cliente de la app."""
+    from google_auth_oauthlib.flow import Flow
+    flow = Flow.from_client_config(
+        GOOGLE_CLIENT_CONFIG,
+        scopes=SCOPES
+    )
+    flow.redirect_uri = REDIRECT_URI
+    return flow
+
+def _ejecutar(peticion):
+    """Ejecuta una petición del cliente de Google (bloqueante) fuera del event loop."""
+    return asyncio.to_thread(peticion.execute)
+
+def _consulta_tokens():
+    """GmailToken con su dispositivo cargado en la misma consulta (sin lazy load)."""
+    return select(GmailToken).join(GmailToken.dispositivo).options(contains_eager(GmailToken.dispositivo))
+
 # class StopGmailRequest(BaseModel):
 #     email: str
 #     password: str
@@ -49,11 +74,7 @@ GOOGLE_CLIENT_CONFIG = {
 @router.get("/login")
 async def login():
     """Inicia el flujo de autorización de Gmail"""
-    flow = Flow.from_client_config(
-        GOOGLE_CLIENT_CONFIG,
-        scopes=SCOPES
-    )
-    flow.redirect_uri = REDIRECT_URI
+    flow = _flow()
     
     auth_url, state = flow.authorization_url(
         prompt='consent',
@@ -67,35 +88,28 @@ async def login():
 @router.get("/oauth/callback")
 async def oauth_callback(
     request: Request, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
-        flow = Flow.from_client_config(
-            GOOGLE_CLIENT_CONFIG,
-            scopes=SCOPES
-        )
-        flow.redirect_uri = REDIRECT_URI
+        flow = _flow()
 
         authorization_response = str(request.url)
-        flow.fetch_token(authorization_response=authorization_response)
+        await asyncio.to_thread(flow.fetch_token, authorization_response=authorization_response)
 
         credentials = flow.credentials
         
         # Obtener el email del usuario
-        service = build('gmail', 'v1', credentials=credentials)
-        profile = service.users().getProfile(userId='me').execute()
+        service = await asyncio.to_thread(construir_servicio, credentials)
+        profile = await _ejecutar(service.users().getProfile(userId='me'))
         email = profile['emailAddress']
 
-        # Configurar watch en Gmail
-        watch_request = {
-            'labelIds': ['INBOX'],
-            'topicName': 'projects/vast-ascent-443822-d0/topics/Chreosis',
-            'labelFilterBehavior': 'INCLUDE'
-        }
-        service.users().watch(userId='me', body=watch_request).execute()
+        # Configurar watch en Gmail (lo renueva utils/renovador_gmail.py antes de que venza)
+        watch_history_id, watch_expira = await asyncio.to_thread(renovar_watch, service)
 
         # Obtener el dispositivo más reciente
-        dispositivo = db.query(Dispositivo).order_by(Dispositivo.created_at.desc()).first()
+        dispositivo = (await db.execute(
+            select(Dispositivo).order_by(Dispositivo.created_at.desc()).limit(1)
+        )).scalars().first()
         if not dispositivo:
             raise HTTPException(
                 status_code=404,
@@ -103,7 +117,9 @@ async def oauth_callback(
             )
 
         # Crear o actualizar el token de Gmail
-        gmail_token = db.query(GmailToken).filter_by(dispositivo_id=dispositivo.id).first()
+        gmail_token = (await db.execute(
+            select(GmailToken).where(GmailToken.dispositivo_id == dispositivo.id)
+        )).scalars().first()
         
         if gmail_token:
             # Actualizar token existente
@@ -113,12 +129,20 @@ async def oauth_callback(
             gmail_token.client_id = credentials.client_id
             gmail_token.client_secret = credentials.client_secret
             gmail_token.scopes = ",".join(SCOPES)
+            gmail_token.email = email
+            gmail_token.history_id = watch_history_id
+            gmail_token.watch_expira = watch_expira
             gmail_token.expiration_date = datetime.utcnow() + timedelta(seconds=credentials.expiry.timestamp() - datetime.now().timestamp())
             gmail_token.updated_at = datetime.utcnow()
+            # El servicio cacheado usa las credenciales anteriores
+            olvidar_cliente(gmail_token.id)
         else:
             # Crear nuevo token
             gmail_token = GmailToken(
                 dispositivo_id=dispositivo.id,
+                email=email,
+                history_id=watch_history_id,
+                watch_expira=watch_expira,
                 access_token=credentials.token,
                 refresh_token=credentials.refresh_token,
                 token_uri=credentials.token_uri,
@@ -129,7 +153,7 @@ async def oauth_callback(
             )
             db.add(gmail_token)
 
-        db.commit()
+        await db.commit()
 
         return {
             "message": "Gmail conectado exitosamente", 
@@ -138,7 +162,7 @@ async def oauth_callback(
         }
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Error en callback de Gmail: {str(e)}"
@@ -147,8 +171,13 @@ async def oauth_callback(
 @router.post("/notifications")
 async def gmail_notifications(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
+    """
+    Push de Pub/Sub: encola la notificación y responde enseguida (Pub/Sub
+    reenvía los push que tardan en responder). El procesamiento lo hacen las
+    tareas de utils/cola_gmail.py con procesar_notificacion.
+    """
     try:
         data = await request.json()
         print("📥 Notificación recibida:", json.dumps(data, indent=2))
@@ -160,147 +189,220 @@ async def gmail_notifications(
         # Obtener el email del mensaje decodificado
         email_address = decoded_json.get("emailAddress")
         history_id = decoded_json.get("historyId")
+        message_id = data["message"].get("messageId") or data["message"].get("message_id")
 
         if not history_id:
             raise ValueError("No se encontró historyId en el mensaje decodificado.")
+        # Sin la cuenta no se sabe de quién es el historial: se confirma a Pub/Sub y se descarta
+        if not email_address:
+            raise ValueError("No se encontró emailAddress en el mensaje decodificado.")
+    except Exception as e:
+        print("❌ Error procesando la notificación:", str(e))
+        return {"status": "IGNORED", "reason": f"Error inesperado al procesar la notificación: {str(e)}"}
 
-        # Obtenemos todos los tokens activos
-        gmail_tokens = db.query(GmailToken).join(Dispositivo).all()
-        if not gmail_tokens:
-            print("⚠️ No hay tokens disponibles para procesar notificaciones.")
-            return {"status": "IGNORED", "reason": "No Gmail tokens available"}
-
-        # Iteramos sobre cada token hasta encontrar el correcto
-        for gmail_token in gmail_tokens:
-            try:
-                # Convertir los scopes de string a lista
-                scopes = gmail_token.scopes.split(",") if gmail_token.scopes else []
-                
-                creds = Credentials(
-                    token=gmail_token.access_token,
-                    refresh_token=gmail_token.refresh_token,
-                    token_uri=gmail_token.token_uri,
-                    client_id=gmail_token.client_id,
-                    client_secret=gmail_token.client_secret,
-                    scopes=scopes  # Ahora usamos la lista de scopes
-                )
-
-                service = build('gmail', 'v1', credentials=creds)
-                
+    # Reentrega de Pub/Sub: el messageId se guarda en el mismo commit que la fila de la cola
+    clave = f"pubsub:{message_id}" if message_id else None
+    try:
+        if clave:
+            if not await procesados.filtrar_nuevas(db, [clave]):
+                print(f"♻️ Push duplicado de Pub/Sub: {message_id}")
+                return {"status": "DUPLICADA"}
+            procesados.registrar(db, clave)
+        notificacion_id = await cola_gmail.encolar(db, email_address, history_id)
+    except IntegrityError:
+        # Otro worker encoló el mismo messageId primero
+        await db.rollback()
+        procesados.recordar([clave])
+        print(f"♻️ Push duplicado de Pub/Sub: {message_id}")
+        return {"status": "DUPLICADA"}
+    except SQLAlchemyError as e:
+        # Sin 2xx Pub/Sub vuelve a enviar el push más tarde
+        print("❌ No se pudo encolar la notificación:", str(e))
+        raise HTTPException(status_code=503, detail="No se pudo encolar la notificación")
+    if clave:
+        procesados.recordar([clave])
+    return {"status": "ENCOLADA", "id": notificacion_id}
+
+async def procesar_notificacion(db: AsyncSession, email_address: str | None, history_id: str) -> None:
+    """
+    Procesa una notificación de la cola: mensajes nuevos de la cuenta, GPT,
+    FCM y ntfy. Lanza una excepción si el token de la cuenta falló, para que
+    la cola la reintente.
+    """
+    await procesados.purgar(db)
+    if not email_address:
+        # Encolada antes de que /gmail/notifications las descartara: sin email
+        # cualquier token coincidiría y se leería el historial de otra cuenta
+        print("⚠️ Notificación sin emailAddress, se descarta.")
+        return
+    # Tokens de la cuenta de la notificación (búsqueda indexada por email)
+    gmail_tokens = (await db.execute(
+        _consulta_tokens().where(GmailToken.email == email_address)
+    )).scalars().all()
+    if not gmail_tokens:
+        # Tokens guardados antes de la columna email y aún sin respaldar
+        # (python -m utils.gmail): se identifican con getProfile
+        gmail_tokens = (await db.execute(
+            _consulta_tokens().where(GmailToken.email.is_(None))
+        )).scalars().all()
+    if not gmail_tokens:
+        print("⚠️ No hay tokens disponibles para procesar notificaciones.")
+        return
+
+    error = None
+    # Iteramos sobre cada token hasta encontrar el correcto
+    for gmail_token in gmail_tokens:
+        try:
+            service, creds = await asyncio.to_thread(servicio_para, gmail_token)
+            
+            if gmail_token.email:
+                user_email = gmail_token.email
+            else:
                 # Obtener el perfil del usuario para verificar el email
-                profile = service.users().getProfile(userId='me').execute()
+                profile = await _ejecutar(service.users().getProfile(userId='me'))
                 user_email = profile['emailAddress']
-                
-                print(f"✓ Procesando token para email: {user_email}")
-                
-                # Verificar si este token corresponde al email de la notificación
-                if email_address and user_email != email_address:
-                    print(f"⚠️ El email no coincide: {user_email} != {email_address}")
+                # Se guarda para que la próxima notificación use el índice
+                gmail_token.email = user_email
+                await db.commit()
+            
+            print(f"✓ Procesando token para email: {user_email}")
+            
+            # Verificar si este token corresponde al email de la notificación
+            if user_email != email_address:
+                print(f"⚠️ El email no coincide: {user_email} != {email_address}")
+                continue
+
+            # Si llegamos aquí, encontramos el token correcto.
+            # Mensajes nuevos del INBOX desde el último historyId procesado
+            ids, checkpoint = await asyncio.to_thread(
+                ids_nuevos, service, gmail_token.history_id, history_id
+            )
+            # La primera llamada renueva el access token si venció: se guarda ya
+            if persistir_refresco(gmail_token, creds):
+                await db.commit()
+            # Se descartan los ya procesados antes de descargarlos o pasarlos a GPT
+            claves = {msg_id: f"gmail:{user_email}:{msg_id}" for msg_id in ids}
+            nuevas = set(await procesados.filtrar_nuevas(db, list(claves.values())))
+            ids = [msg_id for msg_id in ids if claves[msg_id] in nuevas]
+            mensajes = await asyncio.to_thread(obtener_mensajes, service, ids)
+            print(f"📬 {len(mensajes)} mensajes nuevos (historyId {gmail_token.history_id} -> {checkpoint})")
+            
+            for full_message in mensajes:
+                clave = claves[full_message['id']]
+                is_unread = 'UNREAD' in full_message.get('labelIds', [])
+                headers = full_message['payload'].get('headers', [])
+                subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '(Sin asunto)')
+                remitente = next((h['value'] for h in headers if h['name'] == 'From'), None)
+
+                if not is_unread or 'Notificación de Consumo' not in subject:
+                    # Nada que extraer: se confirma con el checkpoint
+                    procesados.registrar(db, clave)
                     continue
 
-                # Si llegamos aquí, encontramos el token correcto
-                result = service.users().messages().list(userId='me', labelIds=['INBOX'], maxResults=1).execute()
-                
-                for msg in result.get('messages', []):
-                    msg_id = msg['id']
-                    full_message = service.users().messages().get(userId='me', id=msg_id, format='full').execute()
-                    is_unread = 'UNREAD' in full_message.get('labelIds', [])
-                    headers = full_message['payload'].get('headers', [])
-                    subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '(Sin asunto)')
-
-                    if not is_unread or 'Notificación de Consumo' not in subject:
-                        continue
-
-                    # Extraer el contenido del correo
-                    body = ''
-                    parts = full_message['payload'].get('parts', [])
-                    for part in parts:
-                        if part.get("mimeType") == "text/plain":
-                            body_data = part['body'].get('data')
-                            if body_data:
-                                body = base64.urlsafe_b64decode(body_data).decode("utf-8")
-                                break
-
-                    if body:
-                        # Actualizar último acceso del dispositivo
-                        gmail_token.dispositivo.ultimo_acceso = datetime.utcnow()
-                        
-                        # Procesar el correo con GPT y guardar en la base de datos
-                        result = await process_and_save_email(
-                            db=db,
-                            email_content=body,
-                            dispositivo_id=gmail_token.dispositivo_id
-                        )
-                        
-                        # Notificar el resultado usando el token FCM del dispositivo
-                        notification_message = (
-                            "✅ Transacción procesada y guardada correctamente" 
-                            if result["Status"] == "APROBADA" 
-                            else "❌ No se pudo procesar la transacción"
-                        )
-                        
-                        # Enviar notificación al dispositivo usando FCM
-                        if gmail_token.dispositivo.fcm_token:
-                            print(f"📱 Enviando notificación FCM al token: {gmail_token.dispositivo.fcm_token}")
-                            firebase_admin = FirebaseAdmin()
-                            # Convertir el resultado a string para asegurar que todos los valores sean strings
-                            transaction_data = {
-                                "type": "new_transaction",
-                                "monto": str(result.get("Monto", "0")),
-                                "categoria": str(result.get("Categoria", "")),
-                                "fecha": str(result.get("Fecha", "")),
-                                "moneda": str(result.get("Moneda", "")),
-                                "lugar": str(result.get("Lugar", "")),
-                                #! no es necesario enviar el status
-                                # "status": str(result.get("Status", "RECHAZADA"))
-                            }
-                            print(f"📦 Datos de la notificación: {transaction_data}")
-                            success = await firebase_admin.send_notification(
-                                fcm_token=gmail_token.dispositivo.fcm_token,
-                                title=f"Procesamiento de correo para {user_email}",
-                                body=notification_message,
-                                data=transaction_data
-                            )
-                            print(f"✅ Resultado del envío de notificación: {success}")
-                        else:
-                            print("⚠️ No se encontró token FCM para el dispositivo")
-
-                        # Notificación de respaldo usando ntfy
-                        requests.post(
-                            "https://ntfy.sh/Chreosis", 
-                            data=notification_message,
-                            headers={
-                                "Title": f"Procesamiento de correo para {user_email}",
-                                "Tags": "white_check_mark" if result["Status"] == "APROBADA" else "x",
-                            }
+                # Extraer el contenido del correo
+                body = ''
+                parts = full_message['payload'].get('parts', [])
+                for part in parts:
+                    if part.get("mimeType") == "text/plain":
+                        body_data = part['body'].get('data')
+                        if body_data:
+                            body = base64.urlsafe_b64decode(body_data).decode("utf-8")
+                            break
+
+                if body:
+                    # Actualizar último acceso del dispositivo
+                    gmail_token.dispositivo.ultimo_acceso = datetime.utcnow()
+                    
+                    # Procesar el correo con GPT y guardar en la base de datos.
+                    # Si OpenAI no responde lanza GPTNoDisponible: el mensaje queda
+                    # sin marcar y la cola reintenta la notificación con el mismo checkpoint
+                    result = await process_and_save_email(
+                        db=db,
+                        email_content=body,
+                        dispositivo_id=gmail_token.dispositivo_id,
+                        remitente=remitente
+                    )
+                    # Extraído o rechazado: marcado como procesado antes de notificar,
+                    # un reintento no repite GPT ni el push
+                    procesados.registrar(db, clave)
+                    await db.commit()
+                    
+                    # Notificar el resultado usando el token FCM del dispositivo
+                    notification_message = (
+                        "✅ Transacción procesada y guardada correctamente" 
+                        if result["Status"] == "APROBADA" 
+                        else "❌ No se pudo procesar la transacción"
+                    )
+                    
+                    # Enviar notificación al dispositivo usando FCM
+                    if gmail_token.dispositivo.fcm_token:
+                        print(f"📱 Enviando notificación FCM al token: {gmail_token.dispositivo.fcm_token}")
+                        firebase_admin = FirebaseAdmin()
+                        # Convertir el resultado a string para asegurar que todos los valores sean strings
+                        transaction_data = {
+                            "type": "new_transaction",
+                            "monto": str(result.get("Monto", "0")),
+                            "categoria": str(result.get("Categoria", "")),
+                            "fecha": str(result.get("Fecha", "")),
+                            "moneda": str(result.get("Moneda", "")),
+                            "lugar": str(result.get("Lugar", "")),
+                            #! no es necesario enviar el status
+                            # "status": str(result.get("Status", "RECHAZADA"))
+                        }
+                        print(f"📦 Datos de la notificación: {transaction_data}")
+                        success = await firebase_admin.send_notification(
+                            fcm_token=gmail_token.dispositivo.fcm_token,
+                            title=f"Procesamiento de correo para {user_email}",
+                            body=notification_message,
+                            data=transaction_data
                         )
+                        print(f"✅ Resultado del envío de notificación: {success}")
+                    else:
+                        print("⚠️ No se encontró token FCM para el dispositivo")
+
+                    # Notificación de respaldo usando ntfy
+                    await asyncio.to_thread(
+                        requests.post,
+                        "https://ntfy.sh/Chreosis", 
+                        data=notification_message,
+                        headers={
+                            "Title": f"Procesamiento de correo para {user_email}",
+                            "Tags": "white_check_mark" if result["Status"] == "APROBADA" else "x",
+                        }
+                    )
+                else:
+                    procesados.registrar(db, clave)
+
+            # Checkpoint después de procesar: si algo falla, el reintento
+            # vuelve a traer los mismos mensajes
+            gmail_token.history_id = checkpoint
+            persistir_refresco(gmail_token, creds)
+            await db.commit()
+            procesados.recordar([claves[m['id']] for m in mensajes])
+
+            print(f"✅ Notificación procesada: {user_email} ({gmail_token.dispositivo.nombre_dispositivo})")
+            return
 
-                return {
-                    "status": "OK", 
-                    "email": user_email,
-                    "dispositivo": gmail_token.dispositivo.nombre_dispositivo
-                }
-
-            except Exception as e:
-                print(f"Error al procesar token: {str(e)}")
-                print(f"Token info: dispositivo_id={gmail_token.dispositivo_id}, scopes={gmail_token.scopes}")
-                continue
-
-        print("⚠️ No se encontró un token válido para esta notificación.")
-        return {"status": "IGNORED", "reason": "No valid token matched"}
+        except Exception as e:
+            print(f"Error al procesar token: {str(e)}")
+            print(f"Token info: dispositivo_id={gmail_token.dispositivo_id}, scopes={gmail_token.scopes}")
+            error = e
+            continue
 
-    except Exception as e:
-        print("❌ Error procesando la notificación:", str(e))
-        return {"status": "IGNORED", "reason": f"Error inesperado al procesar la notificación: {str(e)}"}
+    if error is not None:
+        raise error
+    print("⚠️ No se encontró un token válido para esta notificación.")
 
 @router.post("/stop")
 async def stop_notifications(
     
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
         # Obtenemos el token más reciente
-        gmail_token = db.query(GmailToken).join(Dispositivo).order_by(Dispositivo.ultimo_acceso.desc()).first()
+        gmail_token = (await db.execute(
+            _consulta_tokens().order_by(Dispositivo.ultimo_acceso.desc()).limit(1)
+        )).scalars().first()
         
         if not gmail_token:
             raise HTTPException(
@@ -309,33 +411,23 @@ async def stop_notifications(
             )
 
         try:
-            # Convertir los scopes de string a lista
-            scopes = gmail_token.scopes.split(",") if gmail_token.scopes else []
-            
-            creds = Credentials(
-                token=gmail_token.access_token,
-                refresh_token=gmail_token.refresh_token,
-                token_uri=gmail_token.token_uri,
-                client_id=gmail_token.client_id,
-                client_secret=gmail_token.client_secret,
-                scopes=scopes
-            )
-
-            service = build('gmail', 'v1', credentials=creds)
+            service, _ = await asyncio.to_thread(servicio_para, gmail_token)
             
             # Obtener el email asociado al token antes de eliminarlo
-            profile = service.users().getProfile(userId='me').execute()
+            profile = await _ejecutar(service.users().getProfile(userId='me'))
             email = profile['emailAddress']
             
             # Detener las notificaciones
-            service.users().stop(userId='me').execute()
+            await _ejecutar(service.users().stop(userId='me'))
 
             # Guardar información del dispositivo para el mensaje
             dispositivo_nombre = gmail_token.dispositivo.nombre_dispositivo or "Dispositivo desconocido"
 
             # Eliminar el token
-            db.delete(gmail_token)
-            db.commit()
+            gmail_token_id = gmail_token.id
+            await db.delete(gmail_token)
+            await db.commit()
+            olvidar_cliente(gmail_token_id)
 
             return {
                 "status": "stopped", 
@@ -344,7 +436,7 @@ async def stop_notifications(
             }
 
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             print(f"Error al detener el servicio de Gmail: {str(e)}")
             raise HTTPException(
                 status_code=500, 
@@ -0,0 +1,81 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from database import get_db
+from models import Usuario, Cuenta, Categoria, Transaccion, Eliminacion
+from dependencies import get_usuario_actual, UsuarioActual
+from routers.cuenta import CuentaOut
+from routers.categoria import CategoriaOut
+from routers.transaccion import TransaccionOut
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+
+router = APIRouter(prefix="/sync", tags=["Sync"])
+
+# Margen hacia atrás al comparar con el cursor: cubre transacciones que
+# estaban en curso cuando se generó el cursor anterior. El cliente puede
+# recibir alguna fila repetida, pero nunca se pierde un cambio.
+SYNC_MARGEN = timedelta(seconds=5)
+
+class EliminadosOut(BaseModel):
+    cuentas: List[int] = []
+    categorias: List[int] = []
+    transacciones: List[int] = []
+
+class CambiosOut(BaseModel):
+    cursor: datetime
+    cuentas: List[CuentaOut]
+    categorias: List[CategoriaOut]
+    transacciones: List[TransaccionOut]
+    eliminados: EliminadosOut
+
+
+@router.get("/changes", response_model=CambiosOut)
+def obtener_cambios(
+    since: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    current_user: UsuarioActual = Depends(get_usuario_actual)
+):
+    """
+    Devuelve las cuentas, categorías y transacciones creadas o modificadas
+    desde `since`, junto con los ids borrados en ese intervalo.
+
+    - Sin `since` se devuelve el estado completo (primera sincronización).
+    - El `cursor` de la respuesta se envía como `since` en la siguiente llamada.
+    - `since` sin zona horaria se interpreta en UTC.
+    """
+    cursor = datetime.utcnow()
+
+    cuentas = db.query(Cuenta).filter(Cuenta.user_id == current_user.id)
+    categorias = db.query(Categoria).filter(Categoria.user_id == current_user.id)
+    transacciones = db.query(Transaccion).filter(Transaccion.user_id == current_user.id)
+    eliminados = EliminadosOut()
+
+    if since is not None:
+        # Las columnas guardan UTC sin zona: un `since` con offset se convierte, no se trunca
+        if since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        desde = since - SYNC_MARGEN
+        cuentas = cuentas.filter(Cuenta.updated_at > desde)
+        categorias = categorias.filter(Categoria.updated_at > desde)
+        transacciones = transacciones.filter(Transaccion.updated_at > desde)
+
+        borrados = db.query(Eliminacion.entidad, Eliminacion.entidad_id).filter(
+            Eliminacion.user_id == current_user.id,
+            Eliminacion.deleted_at > desde
+        )
+        for entidad, entidad_id in borrados:
+            if entidad == "cuenta":
+                eliminados.cuentas.append(entidad_id)
+            elif entidad == "categoria":
+                eliminados.categorias.append(entidad_id)
+            elif entidad == "transaccion":
+                eliminados.transacciones.append(entidad_id)
+
+    return CambiosOut(
+        cursor=cursor,
+        cuentas=cuentas.all(),
+        categorias=categorias.all(),
+        transacciones=transacciones.all(),
+        eliminados=eliminados
+    )
@@ -1,11 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from database import get_db
-from models import Usuario, Transaccion, Cuenta, Categoria
-from dependencies import get_current_user
-from pydantic import BaseModel
+from database import get_db, sesion_lectura
+from models import Usuario, Transaccion, Cuenta, Categoria, ResumenMensual
+from dependencies import get_usuario_actual, get_db_lectura, UsuarioActual
+from utils.etag import etag_coleccion
+from utils.resumen import sumar_transaccion, aplicar_a_resumen
+from utils.saldos import registrar_saldo
+from utils.busqueda import condicion_busqueda
+from utils.sincronizacion import registrar_eliminacion
+from utils.ledger import aplicar_movimiento, revertir_movimiento, bloquear_cuentas, ajustar_saldo, delta_transaccion
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
+from collections import defaultdict
+import base64
+import csv
+import io
+import json
 
 router = APIRouter(prefix="/transacciones", tags=["Transacciones"])
 
@@ -19,6 +33,24 @@ class TransaccionCreate(BaseModel):
     note: Optional[str] = None
     attachment: Optional[str] = None
 
+# Máximo de transacciones aceptadas por petición en /transacciones/lote
+LOTE_MAXIMO = 500
+
+class TransaccionLoteItem(TransaccionCreate):
+    idempotency_key: str = Field(..., min_length=1, max_length=64)
+
+class TransaccionLoteIn(BaseModel):
+    transacciones: List[TransaccionLoteItem] = Field(..., max_length=LOTE_MAXIMO)
+
+class ResultadoLoteItem(BaseModel):
+    idempotency_key: str
+    status: str  # creada | duplicada | rechazada
+    id: Optional[int] = None
+    detail: Optional[str] = None
+
+class TransaccionLoteOut(BaseModel):
+    resultados: List[ResultadoLoteItem]
+
 class TransaccionUpdate(BaseModel):
     category_id: Optional[int] = None
     account_id: Optional[int] = None
@@ -28,6 +60,9 @@ class TransaccionUpdate(BaseModel):
     note: Optional[str] = None
     attachment: Optional[str] = None
 
+# Columnas NOT NULL que TransaccionUpdate permite omitir pero no anular
+CAMPOS_OBLIGATORIOS = ("category_id", "account_id", "date", "amount", "type")
+
 class TransaccionDetalleOut(BaseModel):
     id: int
     account_name: str
@@ -38,6 +73,11 @@ class TransaccionDetalleOut(BaseModel):
     type: str
     note: Optional[str] = None
     attachment: Optional[str] = None
+    lugar: Optional[str] = None
+
+class TransaccionPaginaOut(BaseModel):
+    items: List[TransaccionDetalleOut]
+    next_cursor: Optional[str] = None
 
 class TransaccionOut(BaseModel):
     id: int
@@ -52,153 +92,452 @@ class TransaccionOut(BaseModel):
     class Config:
         from_attributes = True
 
+class ResumenOut(BaseModel):
+    year_month: str
+    category_id: int
+    category_name: str
+    account_id: int
+    account_name: str
+    type: str
+    total: float
+    cantidad: int
+
 class Token(BaseModel):
     access_token: str
     token_type: str
 
+class FiltrosTransaccion:
+    """
+    Filtros opcionales para listar transacciones. Todos se aplican en SQL.
+    """
+    def __init__(
+        self,
+        fecha_desde: Optional[datetime] = None,
+        fecha_hasta: Optional[datetime] = None,
+        account_id: Optional[int] = None,
+        category_id: Optional[int] = None,
+        tipo: Optional[str] = Query(None, alias="type"),
+        monto_min: Optional[float] = None,
+        monto_max: Optional[float] = None,
+    ):
+        self.fecha_desde = fecha_desde
+        self.fecha_hasta = fecha_hasta
+        self.account_id = account_id
+        self.category_id = category_id
+        self.tipo = tipo
+        self.monto_min = monto_min
+        self.monto_max = monto_max
 
+    def aplicar(self, query):
+        if self.fecha_desde is not None:
+            query = query.filter(Transaccion.date >= self.fecha_desde)
+        if self.fecha_hasta is not None:
+            query = query.filter(Transaccion.date <= self.fecha_hasta)
+        if self.account_id is not None:
+            query = query.filter(Transaccion.account_id == self.account_id)
+        if self.category_id is not None:
+            query = query.filter(Transaccion.category_id == self.category_id)
+        if self.tipo is not None:
+            query = query.filter(Transaccion.type == self.tipo)
+        if self.monto_min is not None:
+            query = query.filter(Transaccion.amount >= self.monto_min)
+        if self.monto_max is not None:
+            query = query.filter(Transaccion.amount <= self.monto_max)
+        return query
 
-@router.post("/", response_model=TransaccionOut)
-def crear_transaccion(transaccion: TransaccionCreate, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
-    # Buscar la cuenta asociada
-    cuenta = db.query(Cuenta).filter(Cuenta.id == transaccion.account_id, Cuenta.user_id == current_user.id).first()
-    if not cuenta:
-        raise HTTPException(status_code=404, detail="Cuenta no encontrada")
-    # Actualizar el balance según el tipo de transacción
-    if transaccion.type == "gasto":
-        if cuenta.amount < transaccion.amount:
-            raise HTTPException(status_code=400, detail="Fondos insuficientes")
-        cuenta.amount -= transaccion.amount
-    elif transaccion.type == "ingreso":
-        cuenta.amount += transaccion.amount
+def _codificar_cursor(fecha: datetime, transaccion_id: int) -> str:
+    """Cursor opaco con la última posición (date, id) entregada."""
+    crudo = f"{fecha.isoformat()}|{transaccion_id}"
+    return base64.urlsafe_b64encode(crudo.encode("utf-8")).decode("ascii")
+
+def _decodificar_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        crudo = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        fecha, transaccion_id = crudo.rsplit("|", 1)
+        return datetime.fromisoformat(fecha), int(transaccion_id)
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def _paginar(query, cursor: Optional[str], limit: int, current_user: UsuarioActual) -> TransaccionPaginaOut:
+    """Aplica el cursor keyset (date, id) y arma la página de resultados."""
+    if cursor:
+        fecha, transaccion_id = _decodificar_cursor(cursor)
+        query = query.filter(or_(
+            Transaccion.date < fecha,
+            and_(Transaccion.date == fecha, Transaccion.id < transaccion_id)
+        ))
+    # Se pide una fila extra para saber si existe una página siguiente
+    filas = query.order_by(Transaccion.date.desc(), Transaccion.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(filas) > limit:
+        filas = filas[:limit]
+        next_cursor = _codificar_cursor(filas[-1].date, filas[-1].id)
+
+    items = [TransaccionDetalleOut(**t._asdict(), user_name=current_user.name) for t in filas]
+    return TransaccionPaginaOut(items=items, next_cursor=next_cursor)
 
+def _consulta_detalle(db: Session, user_id: int):
+    """Transacciones del usuario con los nombres de cuenta y categoría."""
+    return (
+        db.query(
+            Transaccion.id,
+            Cuenta.name.label("account_name"),
+            Categoria.name.label("category_name"),
+            Transaccion.date,
+            Transaccion.amount,
+            Transaccion.type,
+            Transaccion.note,
+            Transaccion.attachment,
+            Transaccion.lugar
+        )
+        .join(Cuenta, Transaccion.account_id == Cuenta.id)
+        .join(Categoria, Transaccion.category_id == Categoria.id)
+        .filter(Transaccion.user_id == user_id)
+    )
+
+
+@router.post("/", response_model=TransaccionOut)
+def crear_transaccion(transaccion: TransaccionCreate, db: Session = Depends(get_db), current_user: UsuarioActual = Depends(get_usuario_actual)):
     #Asingar fecha actual si no se envio en la peticion
     transaccion_data = transaccion.model_dump()
     if not transaccion_data.get("date"):
         transaccion_data["date"] = datetime.now()
 
+    # Actualizar el balance según el tipo de transacción (valida cuenta y fondos)
+    aplicar_movimiento(db, current_user.id, transaccion.account_id, transaccion.type, transaccion.amount, transaccion_data["date"])
+
     # Guardar la transacción
     nueva_transaccion = Transaccion(**transaccion_data)
     nueva_transaccion.user_id = current_user.id
     db.add(nueva_transaccion)
+    sumar_transaccion(db, nueva_transaccion)
     db.commit()
     db.refresh(nueva_transaccion)
-    db.refresh(cuenta)  # Para obtener el nuevo balance actualizado
 
     return nueva_transaccion
 
+@router.post("/lote", response_model=TransaccionLoteOut)
+def crear_transacciones_lote(lote: TransaccionLoteIn, db: Session = Depends(get_db), current_user: UsuarioActual = Depends(get_usuario_actual)):
+    """
+    Sube en una sola petición las transacciones creadas sin conexión en la app.
+
+    - Cuentas, categorías y claves ya usadas se validan con consultas por conjunto.
+    - Se aplica un único ajuste de saldo neto por cuenta; si una cuenta no tiene
+      fondos para el neto, se rechazan todas sus transacciones del lote.
+    - Las filas se insertan en bloque y todo ocurre en una sola transacción.
+    - Cada item lleva un `idempotency_key`: al reintentar, los ya guardados se
+      devuelven como `duplicada` con su id, sin volver a aplicarse.
+    """
+    items = lote.transacciones
+    resultados: dict[int, ResultadoLoteItem] = {}
+
+    claves = {item.idempotency_key for item in items}
+    existentes = dict(
+        db.query(Transaccion.idempotency_key, Transaccion.id)
+        .filter(Transaccion.user_id == current_user.id, Transaccion.idempotency_key.in_(claves))
+        .all()
+    ) if claves else {}
+    cuentas_validas = {
+        c for (c,) in db.query(Cuenta.id).filter(
+            Cuenta.user_id == current_user.id,
+            Cuenta.id.in_({item.account_id for item in items})
+        )
+    } if items else set()
+    categorias_validas = {
+        c for (c,) in db.query(Categoria.id).filter(
+            Categoria.user_id == current_user.id,
+            Categoria.id.in_({item.category_id for item in items})
+        )
+    } if items else set()
+
+    # Primer paso: duplicados y referencias inválidas
+    pendientes: dict[int, TransaccionLoteItem] = {}
+    vistas: set[str] = set()
+    for i, item in enumerate(items):
+        clave = item.idempotency_key
+        if clave in existentes:
+            resultados[i] = ResultadoLoteItem(idempotency_key=clave, status="duplicada", id=existentes[clave])
+        elif clave in vistas:
+            resultados[i] = ResultadoLoteItem(idempotency_key=clave, status="duplicada", detail="Clave repetida en el lote")
+        elif item.account_id not in cuentas_validas:
+            resultados[i] = ResultadoLoteItem(idempotency_key=clave, status="rechazada", detail="Cuenta no encontrada")
+        elif item.category_id not in categorias_validas:
+            resultados[i] = ResultadoLoteItem(idempotency_key=clave, status="rechazada", detail="Categoría no encontrada")
+        else:
+            pendientes[i] = item
+        vistas.add(clave)
+
+    # Segundo paso: un ajuste neto por cuenta, en orden de id para evitar interbloqueos,
+    # y luego los checkpoints diarios de saldo agregados por día
+    ahora = datetime.now()
+    netos: dict[int, float] = defaultdict(float)
+    por_dia: dict[int, dict] = defaultdict(lambda: defaultdict(float))
+    for item in pendientes.values():
+        delta = delta_transaccion(item.type, item.amount)
+        netos[item.account_id] += delta
+        por_dia[item.account_id][(item.date or ahora).date()] += delta
+    for account_id in sorted(netos):
+        try:
+            ajustar_saldo(db, current_user.id, account_id, netos[account_id])
+        except HTTPException as e:
+            for i, item in list(pendientes.items()):
+                if item.account_id == account_id:
+                    resultados[i] = ResultadoLoteItem(idempotency_key=item.idempotency_key, status="rechazada", detail=e.detail)
+                    del pendientes[i]
+            continue
+        pendiente = netos[account_id]
+        for dia, delta in por_dia[account_id].items():
+            registrar_saldo(db, current_user.id, account_id, dia, delta, pendiente=pendiente)
+            pendiente -= delta
+
+    # Tercer paso: inserción en bloque y resumen mensual agregado por clave
+    nuevas: dict[int, Transaccion] = {}
+    resumen: dict[tuple, list] = {}
+    for i, item in pendientes.items():
+        datos = item.model_dump()
+        datos["date"] = datos.get("date") or ahora
+        datos["user_id"] = current_user.id
+        nuevas[i] = Transaccion(**datos)
+        acumulado = resumen.setdefault(
+            (datos["date"].strftime("%Y-%m"), item.category_id, item.account_id, item.type),
+            [datos["date"], 0.0, 0]
+        )
+        acumulado[1] += item.amount
+        acumulado[2] += 1
+    for (_, category_id, account_id, tipo), (fecha, total, cantidad) in resumen.items():
+        aplicar_a_resumen(db, current_user.id, fecha, category_id, account_id, tipo, total, cantidad)
+
+    try:
+        db.add_all(nuevas.values())
+        db.flush()
+        for i, transaccion in nuevas.items():
+            resultados[i] = ResultadoLoteItem(idempotency_key=transaccion.idempotency_key, status="creada", id=transaccion.id)
+        db.commit()
+    except IntegrityError:
+        # Un reintento concurrente guardó alguna de las mismas claves
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Lote en conflicto con otra petición, reintentar")
+
+    return TransaccionLoteOut(resultados=[resultados[i] for i in range(len(items))])
+
 # @router.get("/", response_model=List[TransaccionOut])
-# def listar_transacciones(db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+# def listar_transacciones(db: Session = Depends(get_db), current_user: UsuarioActual = Depends(get_usuario_actual)):
 #     """
 #     Ejemplo de endpoint protegido: solo usuarios autenticados pueden ver la lista.
 #     """
 #     return db.query(Transaccion).filter(Transaccion.user_id == current_user.id).all()
 
-@router.get("/", response_model=List[TransaccionDetalleOut])
-def listar_transacciones_detalle(db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
-    transacciones = (
+@router.get("/", response_model=TransaccionPaginaOut, dependencies=[Depends(etag_coleccion(Transaccion, Cuenta, Categoria))])
+def listar_transacciones_detalle(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    filtros: FiltrosTransaccion = Depends(),
+    db: Session = Depends(get_db_lectura),
+    current_user: UsuarioActual = Depends(get_usuario_actual)
+):
+    """
+    Lista las transacciones del usuario de la más reciente a la más antigua.
+
+    Usa paginación keyset sobre (date, id): cada página es un seek sobre el
+    índice ix_transacciones_user_date_id en lugar de recorrer todo el historial.
+    Para pedir la siguiente página se envía el `next_cursor` de la respuesta.
+    """
+    query = filtros.aplicar(_consulta_detalle(db, current_user.id))
+    return _paginar(query, cursor, limit, current_user)
+
+@router.get("/buscar", response_model=TransaccionPaginaOut)
+def buscar_transacciones(
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    filtros: FiltrosTransaccion = Depends(),
+    db: Session = Depends(get_db_lectura),
+    current_user: UsuarioActual = Depends(get_usuario_actual)
+):
+    """
+    Busca por comercio (`lugar`) y nota. Cada término coincide por prefijo y
+    sin distinguir acentos ("cafe" encuentra "Cafetería"). Los resultados se
+    ordenan por fecha, de la más reciente a la más antigua, con la misma
+    paginación por cursor que el listado.
+    """
+    condicion = condicion_busqueda(db, current_user.id, q)
+    if condicion is None:
+        raise HTTPException(status_code=400, detail="La búsqueda no contiene términos válidos")
+    query = filtros.aplicar(_consulta_detalle(db, current_user.id)).filter(condicion)
+    return _paginar(query, cursor, limit, current_user)
+
+# Filas que se leen del cursor del servidor y se serializan por bloque
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_COLUMNAS = [
+    "id", "date", "amount", "type", "account_name", "category_name",
+    "note", "attachment", "lugar", "Tipomoneda"
+]
+
+def _exportar_filas(user_id: int, filtros: FiltrosTransaccion, formato: str):
+    """
+    Generador que recorre el historial con un cursor del servidor
+    (stream_results + yield_per) y emite bloques ya serializados, de modo que
+    la memoria no depende del número de transacciones. Abre su propia sesión
+    de lectura (réplica si hay) porque se consume cuando la respuesta ya se
+    está enviando.
+    """
+    db = sesion_lectura(user_id)
+    try:
+        query = (
+            filtros.aplicar(_consulta_detalle(db, user_id))
+            .add_columns(Transaccion.Tipomoneda)
+            .order_by(Transaccion.date.desc(), Transaccion.id.desc())
+            .execution_options(stream_results=True)
+            .yield_per(EXPORT_BATCH_SIZE)
+        )
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if formato == "csv":
+            writer.writerow(EXPORT_COLUMNAS)
+        pendientes = 0
+        for fila in query:
+            datos = fila._asdict()
+            datos["date"] = datos["date"].isoformat()
+            if formato == "csv":
+                writer.writerow([datos[c] for c in EXPORT_COLUMNAS])
+            else:
+                buffer.write(json.dumps({c: datos[c] for c in EXPORT_COLUMNAS}, ensure_ascii=False))
+                buffer.write("\n")
+            pendientes += 1
+            if pendientes >= EXPORT_BATCH_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pendientes = 0
+        if buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        db.close()
+
+@router.get("/exportar")
+def exportar_transacciones(
+    formato: str = Query("csv", pattern="^(csv|ndjson)$"),
+    filtros: FiltrosTransaccion = Depends(),
+    current_user: UsuarioActual = Depends(get_usuario_actual)
+):
+    """
+    Exporta el historial completo del usuario como CSV o NDJSON en streaming.
+    Acepta los mismos filtros que el listado.
+    """
+    if formato == "csv":
+        media_type = "text/csv; charset=utf-8"
+    else:
+        media_type = "application/x-ndjson"
+    nombre = f"transacciones_{datetime.now():%Y%m%d}.{formato}"
+    return StreamingResponse(
+        _exportar_filas(current_user.id, filtros, formato),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{nombre}"'}
+    )
+
+@router.get("/resumen", response_model=List[ResumenOut])
+def resumen_transacciones(
+    desde: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    hasta: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    tipo: Optional[str] = Query(None, alias="type"),
+    db: Session = Depends(get_db_lectura),
+    current_user: UsuarioActual = Depends(get_usuario_actual)
+):
+    """
+    Totales por mes, categoría y cuenta leídos de `resumenes_mensuales`.
+    El costo depende de meses × categorías, no del número de transacciones.
+    `desde` y `hasta` usan el formato YYYY-MM y son inclusivos.
+    """
+    query = (
         db.query(
-            Transaccion.id,
-            Cuenta.name.label("account_name"),
+            ResumenMensual.year_month,
+            ResumenMensual.category_id,
             Categoria.name.label("category_name"),
-            Usuario.name.label("user_name"),
-            Transaccion.date,
-            Transaccion.amount,
-            Transaccion.type,
-            Transaccion.note,
-            Transaccion.attachment
+            ResumenMensual.account_id,
+            Cuenta.name.label("account_name"),
+            ResumenMensual.type,
+            ResumenMensual.total,
+            ResumenMensual.cantidad
         )
-        .join(Cuenta, Transaccion.account_id == Cuenta.id)
-        .join(Categoria, Transaccion.category_id == Categoria.id)
-        .join(Usuario, Transaccion.user_id == Usuario.id)
-        .filter(Transaccion.user_id == current_user.id)
-        .all()
+        .join(Cuenta, ResumenMensual.account_id == Cuenta.id)
+        .join(Categoria, ResumenMensual.category_id == Categoria.id)
+        .filter(ResumenMensual.user_id == current_user.id, ResumenMensual.cantidad > 0)
     )
-    # Convertir resultados a dicts para Pydantic
-    return [TransaccionDetalleOut(**t._asdict()) for t in transacciones]
+    if desde:
+        query = query.filter(ResumenMensual.year_month >= desde)
+    if hasta:
+        query = query.filter(ResumenMensual.year_month <= hasta)
+    if tipo:
+        query = query.filter(ResumenMensual.type == tipo)
+    filas = query.order_by(ResumenMensual.year_month, Categoria.name).all()
+    return [ResumenOut(**f._asdict()) for f in filas]
 
 @router.get("/{transaccion_id}", response_model=TransaccionOut)
-def obtener_transaccion(transaccion_id: int, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+def obtener_transaccion(transaccion_id: int, db: Session = Depends(get_db_lectura), current_user: UsuarioActual = Depends(get_usuario_actual)):
     transaccion = db.query(Transaccion).filter(Transaccion.id == transaccion_id, Transaccion.user_id == current_user.id).first()
     if not transaccion:
         raise HTTPException(status_code=404, detail="Transacción no encontrada")
     return transaccion
 
 @router.delete("/{transaccion_id}", status_code=200)
-def eliminar_transaccion(transaccion_id: int, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+def eliminar_transaccion(transaccion_id: int, db: Session = Depends(get_db), current_user: UsuarioActual = Depends(get_usuario_actual)):
+    # Se bloquea la fila para que dos borrados simultáneos no reviertan dos veces
     transaccion = db.query(Transaccion).filter(
         Transaccion.id == transaccion_id,
         Transaccion.user_id == current_user.id
-    ).first()
+    ).with_for_update().first()
     if not transaccion:
         raise HTTPException(status_code=404, detail="Transacción no encontrada")
 
-    cuenta = db.query(Cuenta).filter(
-        Cuenta.id == transaccion.account_id,
-        Cuenta.user_id == current_user.id
-    ).first()
-    if not cuenta:
-        raise HTTPException(status_code=404, detail="Cuenta no encontrada")
-
     # Revertir el efecto de la transacción
-    if transaccion.type == "gasto":
-        cuenta.amount += transaccion.amount
-    elif transaccion.type == "ingreso":
-        cuenta.amount -= transaccion.amount
+    revertir_movimiento(db, current_user.id, transaccion.account_id, transaccion.type, transaccion.amount, transaccion.date)
 
+    sumar_transaccion(db, transaccion, -1)
+    registrar_eliminacion(db, current_user.id, "transaccion", transaccion.id)
     db.delete(transaccion)
     db.commit()
     return {"detail": "Transacción eliminada exitosamente"}
 
 @router.put("/{transaccion_id}", response_model=TransaccionOut)
-def actualizar_transaccion(transaccion_id: int, transaccion_actualizada: TransaccionUpdate, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+def actualizar_transaccion(transaccion_id: int, transaccion_actualizada: TransaccionUpdate, db: Session = Depends(get_db), current_user: UsuarioActual = Depends(get_usuario_actual)):
     transaccion = db.query(Transaccion).filter(
         Transaccion.id == transaccion_id,
         Transaccion.user_id == current_user.id
-    ).first()
+    ).with_for_update().first()
     if not transaccion:
         raise HTTPException(status_code=404, detail="Transacción no encontrada")
 
-    cuenta = db.query(Cuenta).filter(
-        Cuenta.id == transaccion.account_id,
-        Cuenta.user_id == current_user.id
-    ).first()
-    if not cuenta:
-        raise HTTPException(status_code=404, detail="Cuenta no encontrada")
-
-    # Revertir el efecto anterior
-    if transaccion.type == "gasto":
-        cuenta.amount += transaccion.amount
-    elif transaccion.type == "ingreso":
-        cuenta.amount -= transaccion.amount
-
     update_data = transaccion_actualizada.model_dump(exclude_unset=True)
+    # Omitir un campo lo deja igual; un null explícito no puede vaciar una columna obligatoria
+    nulos = [c for c in CAMPOS_OBLIGATORIOS if c in update_data and update_data[c] is None]
+    if nulos:
+        raise HTTPException(status_code=422, detail=f"Campos que no pueden ser null: {', '.join(nulos)}")
 
-    # Si se cambia la cuenta, debes revertir en la cuenta vieja y aplicar en la nueva (lógica adicional)
-    nueva_cuenta = cuenta
-    if "account_id" in update_data and update_data["account_id"] != transaccion.account_id:
-        nueva_cuenta = db.query(Cuenta).filter(
+    # Si se cambia la cuenta, se revierte en la cuenta vieja y se aplica en la nueva
+    cuenta_anterior = transaccion.account_id
+    if "account_id" in update_data and update_data["account_id"] != cuenta_anterior:
+        nueva_cuenta = db.query(Cuenta.id).filter(
             Cuenta.id == update_data["account_id"],
             Cuenta.user_id == current_user.id
         ).first()
         if not nueva_cuenta:
             raise HTTPException(status_code=404, detail="Nueva cuenta no encontrada")
+        bloquear_cuentas(db, current_user.id, [cuenta_anterior, update_data["account_id"]])
+
+    # Revertir el efecto anterior
+    revertir_movimiento(db, current_user.id, transaccion.account_id, transaccion.type, transaccion.amount, transaccion.date)
 
-    # Actualizar los campos de la transacción
+    # Actualizar los campos de la transacción (y su aporte al resumen mensual)
+    sumar_transaccion(db, transaccion, -1)
     for key, value in update_data.items():
         setattr(transaccion, key, value)
+    sumar_transaccion(db, transaccion)
 
     # Aplicar el nuevo efecto
-    tipo = update_data.get("type", transaccion.type)
-    monto = update_data.get("amount", transaccion.amount)
-    if tipo == "gasto":
-        if nueva_cuenta.amount < monto:
-            raise HTTPException(status_code=400, detail="Fondos insuficientes")
-        nueva_cuenta.amount -= monto
-    elif tipo == "ingreso":
-        nueva_cuenta.amount += monto
+    aplicar_movimiento(db, current_user.id, transaccion.account_id, transaccion.type, transaccion.amount, transaccion.date)
 
     db.commit()
     db.refresh(transaccion)
-    db.refresh(nueva_cuenta)
     return transaccion
\ No newline at end of file
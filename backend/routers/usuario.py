@@ -2,9 +2,14 @@ from fastapi import APIRouter, Depends, HTTPException, status, Security
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from database import get_db
-from models import Usuario
-from utils.security import hash_password, verify_password, create_access_token
-from dependencies import get_current_user
+from models import Usuario, FamiliaRefresh
+from datetime import datetime, timedelta
+from utils.security import (
+    hash_password, verify_and_update_password, create_access_token, create_refresh_token,
+    decode_access_token, PoolHashSaturado, REFRESH_TOKEN_EXPIRE_DAYS
+)
+from utils.revocaciones import revocaciones
+from dependencies import get_usuario_actual, get_db_lectura, UsuarioActual, invalidar_usuario
 from pydantic import BaseModel, EmailStr, Field, validator
 from typing import List, Optional
 from jose import JWTError
@@ -41,16 +46,30 @@ class UsuarioOut(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: str | None = None
 
+class RefreshIn(BaseModel):
+    refresh_token: str
 
 
+def _servicio_ocupado() -> HTTPException:
+    """Respuesta rápida cuando el pool de hashing está saturado."""
+    return HTTPException(
+        status_code=503,
+        detail="Servicio ocupado, intenta de nuevo en unos segundos",
+        headers={"Retry-After": "1"}
+    )
+
 @router.post("/", response_model=UsuarioOut)
 def crear_usuario(usuario: UsuarioCreate, db: Session = Depends(get_db)):
     db_user = db.query(Usuario).filter(Usuario.email == usuario.email).first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email ya registrado")
     nuevo = Usuario(**usuario.model_dump())
-    nuevo.password = hash_password(nuevo.password)
+    try:
+        nuevo.password = hash_password(nuevo.password)
+    except PoolHashSaturado:
+        raise _servicio_ocupado()
     db.add(nuevo)
     db.commit()
     db.refresh(nuevo)
@@ -65,37 +84,111 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
     - Si son correctas, retorna un JWT.
     """
     user = db.query(Usuario).filter(Usuario.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password):
+    if not user:
+        raise HTTPException(status_code=401, detail="Credenciales incorrectas")
+    try:
+        valida, nuevo_hash = verify_and_update_password(form_data.password, user.password)
+    except PoolHashSaturado:
+        raise _servicio_ocupado()
+    if not valida:
         raise HTTPException(status_code=401, detail="Credenciales incorrectas")
+    # El hash usaba otros parámetros de costo: se guarda el recalculado
+    if nuevo_hash:
+        user.password = nuevo_hash
+        db.commit()
     # Creamos el JWT con el id y email del usuario
     access_token = create_access_token({"sub": str(user.id), "email": user.email})
-    return {"access_token": access_token, "token_type": "bearer"}
+    refresh_token, nuevo = _nuevo_refresh(user.id)
+    revocaciones.abrir_familia(db, nuevo["fam"], nuevo["jti"], user.id, _expiracion(nuevo))
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+def _refresh_invalido() -> HTTPException:
+    return HTTPException(status_code=401, detail="Refresh token inválido")
+
+def _fin_familia() -> datetime:
+    """Ningún token de la familia puede vivir más allá de esto (cada rotación dura lo mismo)."""
+    return datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+
+def _expiracion(payload: dict) -> datetime:
+    return datetime.utcfromtimestamp(payload["exp"])
+
+def _nuevo_refresh(user_id: int, familia: str | None = None) -> tuple[str, dict]:
+    """Refresh token nuevo y sus datos (jti, fam, exp) para registrarlo."""
+    token = create_refresh_token(user_id, familia=familia)
+    return token, decode_access_token(token)
+
+def _decodificar_refresh(token: str) -> dict:
+    try:
+        payload = decode_access_token(token)
+    except JWTError:
+        raise _refresh_invalido()
+    if payload.get("type") != "refresh" or not all(payload.get(c) for c in ("sub", "jti", "fam", "exp")):
+        raise _refresh_invalido()
+    return payload
+
+@router.post("/refresh", response_model=Token)
+def refresh(datos: RefreshIn, db: Session = Depends(get_db)):
+    """
+    Emite un nuevo token de acceso a partir de un refresh token, sin verificar
+    la contraseña. El refresh token es de un solo uso: se entrega otro de la
+    misma familia, que pasa a ser el único vigente. Si llega un token ya rotado
+    (posible robo), se revoca la familia completa y el dispositivo debe volver
+    a hacer login.
+    """
+    payload = _decodificar_refresh(datos.refresh_token)
+    user_id = int(payload["sub"])
+
+    revocaciones.sincronizar(db)
+    # Familia revocada conocida: se rechaza sin escribir en la BD
+    if revocaciones.esta_revocado(payload["fam"]):
+        raise _refresh_invalido()
+    user = db.query(Usuario.id, Usuario.email).filter(Usuario.id == user_id).first()
+    if not user:
+        raise _refresh_invalido()
+    refresh_token, nuevo = _nuevo_refresh(user.id, familia=payload["fam"])
+    # Solo el jti vigente de la familia rota; la fila no existe si se revocó en cualquier worker
+    if not revocaciones.rotar(db, payload["fam"], payload["jti"], nuevo["jti"], _expiracion(nuevo)):
+        # Token ya rotado (posible robo), o familia revocada o vencida: se corta la cadena
+        revocaciones.revocar(db, payload["fam"], user_id, _fin_familia())
+        raise _refresh_invalido()
+    access_token = create_access_token({"sub": str(user.id), "email": user.email})
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@router.post("/logout", status_code=200)
+def logout(datos: RefreshIn, db: Session = Depends(get_db)):
+    """Revoca la familia del refresh token (cierra la sesión del dispositivo)."""
+    payload = _decodificar_refresh(datos.refresh_token)
+    revocaciones.revocar(db, payload["fam"], int(payload["sub"]), _fin_familia())
+    return {"detail": "Sesión cerrada"}
 
 @router.get("/", response_model=List[UsuarioOut])
-def listar_usuarios(db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+def listar_usuarios(db: Session = Depends(get_db_lectura), current_user: UsuarioActual = Depends(get_usuario_actual)):
     """
     Ejemplo de endpoint protegido: solo usuarios autenticados pueden ver la lista.
     """
     return db.query(Usuario).all()
 
 @router.get("/{usuario_id}", response_model=UsuarioOut)
-def obtener_usuario(usuario_id: int, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+def obtener_usuario(usuario_id: int, db: Session = Depends(get_db_lectura), current_user: UsuarioActual = Depends(get_usuario_actual)):
     usuario = db.query(Usuario).filter(Usuario.id == usuario_id).first()
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     return usuario
 
 @router.delete("/{usuario_id}", status_code=200)
-def eliminar_usuario(usuario_id: int, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+def eliminar_usuario(usuario_id: int, db: Session = Depends(get_db), current_user: UsuarioActual = Depends(get_usuario_actual)):
     usuario = db.query(Usuario).filter(Usuario.id == usuario_id).first()
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    # Sus sesiones dejan de poder renovarse
+    db.query(FamiliaRefresh).filter(FamiliaRefresh.user_id == usuario_id).delete(synchronize_session=False)
     db.delete(usuario)
     db.commit()
+    invalidar_usuario(usuario_id)
     return {"detail": "Usuario eliminado exitosamente"}
 
 @router.put("/{usuario_id}", response_model=UsuarioOut)
-def actualizar_usuario(usuario_id: int, usuario_actualizado: UsuarioUpdate, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+def actualizar_usuario(usuario_id: int, usuario_actualizado: UsuarioUpdate, db: Session = Depends(get_db), current_user: UsuarioActual = Depends(get_usuario_actual)):
     """
     Actualiza un usuario existente.
 
@@ -121,5 +214,6 @@ def actualizar_usuario(usuario_id: int, usuario_actualizado: UsuarioUpdate, db:
     for key, value in update_data.items():
         setattr(usuario, key, value)
     db.commit()
+    invalidar_usuario(usuario_id)
     db.refresh(usuario)
     return usuario
\ No newline at end of file
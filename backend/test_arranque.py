@@ -0,0 +1,26 @@
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_importar_main_no_carga_sdks_pesados():
+    """
+    Importar la app no debe cargar los SDK de Google, OpenAI ni Firebase:
+    se importan en el primer uso (ver benchmarks/bench_arranque.py).
+    """
+    codigo = (
+        "import json, sys, main; "
+        "print(json.dumps([m for m in main.SDKS_PESADOS + ['googleapiclient', 'google_auth_oauthlib', "
+        "'firebase_admin', 'openai'] if m in sys.modules]))"
+    )
+    resultado = subprocess.run(
+        [sys.executable, "-c", codigo],
+        cwd=BACKEND_DIR, env=dict(os.environ), capture_output=True, text=True, timeout=120
+    )
+    assert resultado.returncode == 0, resultado.stderr
+    cargados = json.loads(resultado.stdout.strip().splitlines()[-1])
+    print(f"SDKs cargados al importar main: {cargados}")
+    assert cargados == []
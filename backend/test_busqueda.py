@@ -0,0 +1,70 @@
+import logging
+from datetime import datetime
+from database import SessionLocal
+from models import Transaccion
+from utils import busqueda
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _buscar(cliente, usuario, q: str) -> list[int]:
+    respuesta = cliente.get("/transacciones/buscar", params={"q": q}, headers=usuario["headers"])
+    assert respuesta.status_code == 200
+    return [t["id"] for t in respuesta.json()["items"]]
+
+
+def test_busqueda_sin_acentos_ni_mayusculas(cliente, usuario_nuevo, crear_transaccion):
+    usuario = usuario_nuevo()
+    cena = crear_transaccion(usuario, note="Cena en el Café Él")
+    almuerzo = crear_transaccion(usuario, note="almuerzo CAFETERÍA central")
+    # `lugar` lo completa el procesamiento de correos, no la API
+    db = SessionLocal()
+    panaderia = Transaccion(user_id=usuario["user_id"], account_id=usuario["cuenta"], category_id=usuario["categoria"],
+                            amount=5, type="gasto", date=datetime(2030, 8, 1), lugar="Panadería Núñez")
+    db.add(panaderia)
+    db.commit()
+    panaderia_id = panaderia.id
+    db.close()
+
+    resultados = {q: _buscar(cliente, usuario, q) for q in ["CAFE", "café él", "cafeteria", "NUÑEZ pan", "cena central"]}
+    logger.info("Resultados: %s", resultados)
+    print(f"Resultados: {resultados}")
+    assert sorted(resultados["CAFE"]) == sorted([cena, almuerzo])
+    assert resultados["café él"] == [cena]
+    assert resultados["cafeteria"] == [almuerzo]
+    assert resultados["NUÑEZ pan"] == [panaderia_id]
+    # Todos los términos deben aparecer
+    assert resultados["cena central"] == []
+
+    respuesta = cliente.get("/transacciones/buscar", params={"q": "¡¿!"}, headers=usuario["headers"])
+    assert respuesta.status_code == 400
+
+
+def test_indice_se_reconstruye_tras_escribir(cliente, usuario_nuevo, crear_transaccion):
+    usuario = usuario_nuevo()
+    crear_transaccion(usuario, note="supermercado")
+    assert _buscar(cliente, usuario, "gimnasio") == []
+    version = busqueda._indices[usuario["user_id"]][0]
+
+    gimnasio = crear_transaccion(usuario, note="Gimnasio mensual")
+    assert _buscar(cliente, usuario, "gimnasio") == [gimnasio]
+    assert busqueda._indices[usuario["user_id"]][0] != version
+
+    cliente.put(f"/transacciones/{gimnasio}", json={"note": "Piscina mensual"}, headers=usuario["headers"])
+    assert _buscar(cliente, usuario, "gimnasio") == []
+    assert _buscar(cliente, usuario, "piscina") == [gimnasio]
+
+    cliente.delete(f"/transacciones/{gimnasio}", headers=usuario["headers"])
+    assert _buscar(cliente, usuario, "piscina") == []
+
+
+def test_busqueda_solo_ve_las_transacciones_del_usuario(cliente, usuario_nuevo, crear_transaccion):
+    uno, otro = usuario_nuevo(), usuario_nuevo()
+    propia = crear_transaccion(uno, note="Farmacia Carol")
+    ajena = crear_transaccion(otro, note="Farmacia Carol")
+
+    assert _buscar(cliente, uno, "farmacia") == [propia]
+    assert _buscar(cliente, otro, "farmacia") == [ajena]
+    # Cada usuario tiene su propio índice
+    assert ajena not in busqueda._indices[uno["user_id"]][1].buscar(["farmacia"])
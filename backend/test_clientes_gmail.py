@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+import pytest
+from models import GmailToken
+from utils import gmail
+
+pytest.importorskip("googleapiclient")
+
+
+def _token(**cambios) -> GmailToken:
+    datos = dict(
+        id=901, dispositivo_id=1, email="cache@gmail.com", access_token="acceso-1", refresh_token="refresh-1",
+        token_uri="https://oauth2.googleapis.com/token", client_id="cliente", client_secret="secreto",
+        scopes="https://www.googleapis.com/auth/gmail.readonly",
+        expiration_date=datetime.utcnow() + timedelta(minutes=30),
+    )
+    datos.update(cambios)
+    return GmailToken(**datos)
+
+
+def test_servicio_desde_discovery_local_y_reutilizado():
+    gmail.olvidar_cliente(901)
+    servicio, creds = gmail.servicio_para(_token())
+    peticion = servicio.users().messages().list(userId="me", maxResults=1)
+    print(f"URI: {peticion.uri}")
+    assert peticion.uri.startswith("https://gmail.googleapis.com/gmail/v1/users/me/messages")
+    assert gmail._discovery() is not None
+    # Con el token guardado vigente no hace falta renovarlo
+    assert creds.valid
+
+    # Misma cuenta: mismo servicio; si cambia el refresh token (Gmail reconectado), uno nuevo
+    assert gmail.servicio_para(_token())[0] is servicio
+    otro, _ = gmail.servicio_para(_token(refresh_token="refresh-2"))
+    assert otro is not servicio
+    gmail.olvidar_cliente(901)
+    assert gmail.servicio_para(_token(refresh_token="refresh-2"))[0] is not otro
+
+
+def test_token_renovado_se_copia_al_registro():
+    token = _token()
+    _, creds = gmail.servicio_para(token)
+    assert not gmail.persistir_refresco(token, creds)
+
+    # Lo que hace google-auth al renovar: token y expiración nuevos en las credenciales
+    creds.token = "acceso-2"
+    creds.expiry = datetime.utcnow() + timedelta(hours=1)
+    assert gmail.persistir_refresco(token, creds)
+    assert token.access_token == "acceso-2"
+    assert token.expiration_date == creds.expiry
+    gmail.olvidar_cliente(901)
+
+
+class _ServicioBatch:
+    """Servicio de Gmail falso: cada mensaje responde según `fallos[id]` (códigos HTTP por intento)."""
+
+    def __init__(self, fallos: dict[str, list[int]]):
+        self.fallos = fallos
+        self.pedidos: list[list[str]] = []
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def get(self, userId, id, format):
+        return id
+
+    def new_batch_http_request(self, callback):
+        from googleapiclient.errors import HttpError
+        from httplib2 import Response
+        servicio, ids = self, []
+
+        class Lote:
+            def add(self, peticion, request_id):
+                ids.append(request_id)
+
+            def execute(self):
+                servicio.pedidos.append(list(ids))
+                for msg_id in ids:
+                    codigos = servicio.fallos.get(msg_id, [])
+                    if codigos:
+                        codigo = codigos.pop(0)
+                        callback(msg_id, None, HttpError(Response({"status": codigo}), b"{}"))
+                    else:
+                        callback(msg_id, {"id": msg_id}, None)
+
+        return Lote()
+
+
+def test_batch_reintenta_los_mensajes_con_429_o_5xx(monkeypatch):
+    monkeypatch.setattr(gmail, "GMAIL_LOTE_ESPERA", 0)
+    servicio = _ServicioBatch({"m2": [429], "m3": [503, 500], "m4": [404]})
+    mensajes = gmail.obtener_mensajes(servicio, ["m1", "m2", "m3", "m4"])
+    print(f"Pedidos: {servicio.pedidos}")
+    # Solo se vuelven a pedir los que fallaron; el borrado (404) se omite
+    assert servicio.pedidos == [["m1", "m2", "m3", "m4"], ["m2", "m3"], ["m3"]]
+    assert [m["id"] for m in mensajes] == ["m1", "m2", "m3"]
+
+
+def test_batch_con_mensajes_sin_descargar_no_deja_avanzar_el_checkpoint(monkeypatch):
+    monkeypatch.setattr(gmail, "GMAIL_LOTE_ESPERA", 0)
+    monkeypatch.setattr(gmail, "GMAIL_LOTE_REINTENTOS", 2)
+    servicio = _ServicioBatch({"m2": [500, 500, 500]})
+    with pytest.raises(gmail.MensajesNoObtenidos, match="m2"):
+        gmail.obtener_mensajes(servicio, ["m1", "m2"])
+    assert len(servicio.pedidos) == 3
+
+    # Un error que no se arregla reintentando (p. ej. 403) se reporta sin reintentar
+    servicio = _ServicioBatch({"m1": [403]})
+    with pytest.raises(gmail.MensajesNoObtenidos):
+        gmail.obtener_mensajes(servicio, ["m1"])
+    assert servicio.pedidos == [["m1"]]
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import pytest
+from database import SessionLocal, crear_esquema, get_async_engine, sesion_async
+from models import NotificacionGmail, NotificacionGmailFallida
+from utils import cola_gmail as modulo
+from utils.cola_gmail import ColaGmail, profundidad
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture(autouse=True)
+def cola_vacia(monkeypatch):
+    crear_esquema()
+    monkeypatch.setattr(modulo, "GMAIL_POLL_INTERVALO", 0.05)
+    monkeypatch.setattr(modulo, "GMAIL_BACKOFF_BASE", 0.01)
+    db = SessionLocal()
+    db.query(NotificacionGmail).delete()
+    db.query(NotificacionGmailFallida).delete()
+    db.commit()
+    db.close()
+
+
+async def _correr(cola: ColaGmail, procesar, encolados, hasta, limite=5.0):
+    """Encola las notificaciones, arranca la cola y espera a que se cumpla `hasta()`."""
+    async with sesion_async() as db:
+        for email, history_id in encolados:
+            await cola.encolar(db, email, history_id)
+    cola.iniciar(procesar)
+    inicio = asyncio.get_running_loop().time()
+    while not hasta() and asyncio.get_running_loop().time() - inicio < limite:
+        await asyncio.sleep(0.02)
+    await cola.detener()
+    await get_async_engine().dispose()
+
+
+def test_orden_por_email_y_notificaciones_cubiertas():
+    """
+    Una sola notificación por email a la vez, la más vieja primero; las que se
+    encolaron antes de empezar quedan cubiertas por ese procesamiento.
+    """
+    llamadas = []
+    en_curso = set()
+
+    async def procesar(db, email, history_id):
+        assert email not in en_curso, "dos notificaciones del mismo email a la vez"
+        en_curso.add(email)
+        llamadas.append((email, history_id))
+        await asyncio.sleep(0.05)
+        en_curso.discard(email)
+
+    cola = ColaGmail(workers=4)
+    encolados = [("a@gmail.com", "1"), ("a@gmail.com", "2"), ("b@gmail.com", "1"), ("a@gmail.com", "3")]
+    asyncio.run(_correr(cola, procesar, encolados, lambda: cola.procesadas >= 2))
+
+    logger.info("Llamadas: %s", llamadas)
+    print(f"Llamadas: {llamadas}")
+    assert sorted(llamadas) == [("a@gmail.com", "1"), ("b@gmail.com", "1")]
+    db = SessionLocal()
+    assert profundidad(db)["pendientes"] == 0
+    db.close()
+    assert cola.estadisticas()["latencia_total"]["n"] == 2
+
+
+def test_reintentos_y_dead_letter(monkeypatch):
+    monkeypatch.setattr(modulo, "GMAIL_MAX_INTENTOS", 3)
+    intentos = []
+
+    async def procesar(db, email, history_id):
+        intentos.append(history_id)
+        raise RuntimeError("Gmail no responde")
+
+    cola = ColaGmail(workers=2)
+    asyncio.run(_correr(cola, procesar, [("c@gmail.com", "7")], lambda: cola.fallidas >= 1))
+
+    print(f"Intentos: {len(intentos)}, reintentos: {cola.reintentos}, fallidas: {cola.fallidas}")
+    assert len(intentos) == 3
+    assert cola.reintentos == 2
+    db = SessionLocal()
+    fallida = db.query(NotificacionGmailFallida).one()
+    assert (fallida.email, fallida.history_id, fallida.intentos) == ("c@gmail.com", "7", 3)
+    assert "Gmail no responde" in fallida.error
+    assert db.query(NotificacionGmail).count() == 0
+    db.close()
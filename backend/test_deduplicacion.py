@@ -0,0 +1,301 @@
+import asyncio
+import base64
+import json
+import logging
+import sys
+import pytest
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
+from database import SessionLocal, crear_esquema, get_async_engine, sesion_async
+from models import Dispositivo, GmailToken, MensajeProcesado, NotificacionGmail
+from routers import serviceEmail
+from utils import email_processor
+from utils.deduplicacion import procesados
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EMAIL = "dedup@gmail.com"
+
+
+@pytest.fixture(scope="module", autouse=True)
+def esquema():
+    crear_esquema()
+    db = SessionLocal()
+    db.query(NotificacionGmail).delete()
+    db.query(MensajeProcesado).delete()
+    db.commit()
+    db.close()
+
+
+def _push(message_id: str, history_id: int) -> dict:
+    datos = json.dumps({"emailAddress": EMAIL, "historyId": history_id}).encode("utf-8")
+    return {"message": {"data": base64.urlsafe_b64encode(datos).decode("ascii"), "messageId": message_id}}
+
+
+def test_reentrega_de_pubsub_no_se_encola_dos_veces():
+    from main import app
+    cliente = TestClient(app)  # sin lifespan: los workers no arrancan
+    primera = cliente.post("/gmail/notifications", json=_push("pubsub-1", 100)).json()
+    # Segunda entrega del mismo messageId, sin el cache (como si llegara a otro worker)
+    procesados.cache.delete("pubsub:pubsub-1")
+    segunda = cliente.post("/gmail/notifications", json=_push("pubsub-1", 100)).json()
+    tercera = cliente.post("/gmail/notifications", json=_push("pubsub-1", 100)).json()
+    logger.info("Respuestas: %s %s %s", primera, segunda, tercera)
+    print(f"Respuestas: {primera} {segunda} {tercera}")
+    assert primera["status"] == "ENCOLADA"
+    assert segunda["status"] == tercera["status"] == "DUPLICADA"
+    db = SessionLocal()
+    assert db.query(NotificacionGmail).filter(NotificacionGmail.history_id == "100").count() == 1
+    db.close()
+
+
+def test_mensajes_de_gmail_ya_procesados_no_se_descargan(monkeypatch):
+    db = SessionLocal()
+    dispositivo = Dispositivo(fcm_token="fcm-dedup", nombre_dispositivo="Pixel")
+    db.add(dispositivo)
+    db.flush()
+    db.add(GmailToken(
+        dispositivo_id=dispositivo.id, email=EMAIL, access_token="a", refresh_token="r",
+        token_uri="https://oauth2.googleapis.com/token", client_id="c", client_secret="s", scopes="gmail"
+    ))
+    db.commit()
+    db.close()
+
+    descargados, enviados_a_gpt = [], []
+
+    def obtener_mensajes(servicio, ids):
+        descargados.append(list(ids))
+        cuerpo = base64.urlsafe_b64encode(b"Consumo por RD$ 500").decode("ascii")
+        return [{
+            "id": msg_id,
+            "labelIds": ["UNREAD", "INBOX"],
+            "payload": {
+                "headers": [{"name": "Subject", "value": "Notificación de Consumo"}],
+                "parts": [{"mimeType": "text/plain", "body": {"data": cuerpo}}],
+            },
+        } for msg_id in ids]
+
+    async def process_and_save_email(db, email_content, dispositivo_id, remitente=None):
+        enviados_a_gpt.append(email_content)
+        return {"Status": "APROBADA", "Monto": 500}
+
+    class FirebaseFalso:
+        async def send_notification(self, **kwargs):
+            return True
+
+    monkeypatch.setattr(serviceEmail, "servicio_para", lambda token: (object(), SimpleNamespace(token=None)))
+    monkeypatch.setattr(serviceEmail, "ids_nuevos", lambda servicio, checkpoint, history_id: (["m1", "m2"], "200"))
+    monkeypatch.setattr(serviceEmail, "obtener_mensajes", obtener_mensajes)
+    monkeypatch.setattr(serviceEmail, "process_and_save_email", process_and_save_email)
+    monkeypatch.setattr(serviceEmail, "FirebaseAdmin", FirebaseFalso)
+    monkeypatch.setattr(serviceEmail.requests, "post", lambda *a, **k: None)
+
+    async def dos_notificaciones():
+        for _ in range(2):
+            async with sesion_async() as sesion:
+                await serviceEmail.procesar_notificacion(sesion, EMAIL, "200")
+            # La segunda vez se consulta la BD, no el cache del proceso
+            procesados.cache.clear()
+        await get_async_engine().dispose()
+
+    asyncio.run(dos_notificaciones())
+    print(f"Descargados: {descargados}, enviados a GPT: {len(enviados_a_gpt)}")
+    assert descargados == [["m1", "m2"], []]
+    assert len(enviados_a_gpt) == 2
+
+
+def test_fallo_al_guardar_no_deshace_la_sesion_del_worker(monkeypatch):
+    """
+    Una respuesta de GPT que no se puede guardar (fecha en otro formato) deja
+    la transacción RECHAZADA, pero el mensaje queda procesado y el checkpoint
+    avanza: la notificación no se reintenta ni vuelve a pasar por GPT.
+    """
+    email = "fallo@gmail.com"
+    db = SessionLocal()
+    dispositivo = Dispositivo(fcm_token="fcm-fallo", nombre_dispositivo="Pixel")
+    db.add(dispositivo)
+    db.flush()
+    token = GmailToken(
+        dispositivo_id=dispositivo.id, email=email, history_id="300", access_token="a", refresh_token="r",
+        token_uri="https://oauth2.googleapis.com/token", client_id="c", client_secret="s", scopes="gmail"
+    )
+    db.add(token)
+    db.commit()
+    token_id = token.id
+    db.close()
+
+    llamadas_gpt, notificaciones = [], []
+
+    def obtener_mensajes(servicio, ids):
+        cuerpo = base64.urlsafe_b64encode(b"Su compra fue registrada.").decode("ascii")
+        return [{
+            "id": msg_id,
+            "labelIds": ["UNREAD", "INBOX"],
+            "payload": {
+                "headers": [{"name": "Subject", "value": "Notificación de Consumo"}],
+                "parts": [{"mimeType": "text/plain", "body": {"data": cuerpo}}],
+            },
+        } for msg_id in ids]
+
+    async def gpt(email_content):
+        llamadas_gpt.append(email_content)
+        return {
+            "Monto": 100, "Fecha": "20/03/2024", "Categoria": "Casa",
+            "Moneda": "DOP", "Lugar": "Colmado", "Status": "APROBADA"
+        }
+
+    class FirebaseFalso:
+        async def send_notification(self, **kwargs):
+            notificaciones.append(kwargs)
+            return True
+
+    monkeypatch.setattr(serviceEmail, "servicio_para", lambda token: (object(), SimpleNamespace(token=None)))
+    monkeypatch.setattr(serviceEmail, "ids_nuevos", lambda servicio, checkpoint, history_id: (["f1"], "301"))
+    monkeypatch.setattr(serviceEmail, "obtener_mensajes", obtener_mensajes)
+    monkeypatch.setattr(email_processor, "process_email_with_gpt", gpt)
+    monkeypatch.setattr(serviceEmail, "FirebaseAdmin", FirebaseFalso)
+    monkeypatch.setattr(serviceEmail.requests, "post", lambda *a, **k: None)
+
+    async def dos_notificaciones():
+        for history_id in ("301", "301"):
+            async with sesion_async() as sesion:
+                await serviceEmail.procesar_notificacion(sesion, email, history_id)
+            procesados.cache.clear()
+        await get_async_engine().dispose()
+
+    asyncio.run(dos_notificaciones())
+    print(f"Llamadas a GPT: {len(llamadas_gpt)}, notificaciones: {notificaciones}")
+    assert len(llamadas_gpt) == 1
+    assert notificaciones[0]["fcm_token"] == "fcm-fallo"
+    assert notificaciones[0]["body"] == "❌ No se pudo procesar la transacción"
+    db = SessionLocal()
+    assert db.get(GmailToken, token_id).history_id == "301"
+    assert db.query(MensajeProcesado).filter(MensajeProcesado.clave == f"gmail:{email}:f1").count() == 1
+    db.close()
+
+
+def test_caida_de_openai_reintenta_la_notificacion_sin_marcar_el_mensaje(monkeypatch):
+    """
+    Un 503 de OpenAI no rechaza el correo: la notificación falla (la cola la
+    reintenta), el mensaje no queda procesado ni el checkpoint avanza, y no se
+    notifica al dispositivo. Un 400 en el reintento sí rechaza el correo.
+    """
+    email = "caida@gmail.com"
+    db = SessionLocal()
+    dispositivo = Dispositivo(fcm_token="fcm-caida", nombre_dispositivo="Pixel")
+    db.add(dispositivo)
+    db.flush()
+    token = GmailToken(
+        dispositivo_id=dispositivo.id, email=email, history_id="400", access_token="a", refresh_token="r",
+        token_uri="https://oauth2.googleapis.com/token", client_id="c", client_secret="s", scopes="gmail"
+    )
+    db.add(token)
+    db.commit()
+    token_id = token.id
+    db.close()
+
+    # Excepciones con la jerarquía del SDK de OpenAI
+    class APIConnectionError(Exception):
+        pass
+
+    class APIStatusError(Exception):
+        def __init__(self, status_code):
+            super().__init__(f"Error code: {status_code}")
+            self.status_code = status_code
+
+    respuestas = [APIStatusError(503), APIStatusError(400)]
+
+    async def create(**kwargs):
+        raise respuestas.pop(0)
+
+    notificaciones = []
+
+    def obtener_mensajes(servicio, ids):
+        cuerpo = base64.urlsafe_b64encode(b"Su compra fue registrada.").decode("ascii")
+        return [{
+            "id": msg_id,
+            "labelIds": ["UNREAD", "INBOX"],
+            "payload": {
+                "headers": [{"name": "Subject", "value": "Notificación de Consumo"}],
+                "parts": [{"mimeType": "text/plain", "body": {"data": cuerpo}}],
+            },
+        } for msg_id in ids]
+
+    class FirebaseFalso:
+        async def send_notification(self, **kwargs):
+            notificaciones.append(kwargs["body"])
+            return True
+
+    monkeypatch.setitem(sys.modules, "openai", SimpleNamespace(APIConnectionError=APIConnectionError, APIStatusError=APIStatusError))
+    monkeypatch.setattr(email_processor, "_client", SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    monkeypatch.setattr(serviceEmail, "servicio_para", lambda token: (object(), SimpleNamespace(token=None)))
+    monkeypatch.setattr(serviceEmail, "ids_nuevos", lambda servicio, checkpoint, history_id: (["c1"], "401"))
+    monkeypatch.setattr(serviceEmail, "obtener_mensajes", obtener_mensajes)
+    monkeypatch.setattr(serviceEmail, "FirebaseAdmin", FirebaseFalso)
+    monkeypatch.setattr(serviceEmail.requests, "post", lambda *a, **k: None)
+
+    clave = f"gmail:{email}:c1"
+
+    def estado():
+        db = SessionLocal()
+        try:
+            return db.get(GmailToken, token_id).history_id, db.query(MensajeProcesado).filter(MensajeProcesado.clave == clave).count()
+        finally:
+            db.close()
+
+    async def procesar():
+        try:
+            async with sesion_async() as sesion:
+                await serviceEmail.procesar_notificacion(sesion, email, "401")
+        finally:
+            procesados.cache.clear()
+            await get_async_engine().dispose()
+
+    with pytest.raises(email_processor.GPTNoDisponible):
+        asyncio.run(procesar())
+    assert estado() == ("400", 0)
+    assert notificaciones == []
+
+    # Un 400 sí es un rechazo definitivo: se marca y se avisa
+    asyncio.run(procesar())
+    print(f"Notificaciones: {notificaciones}")
+    assert estado() == ("401", 1)
+    assert notificaciones == ["❌ No se pudo procesar la transacción"]
+
+
+def test_notificacion_sin_email_no_toma_el_token_de_otra_cuenta(monkeypatch):
+    from main import app
+    datos = json.dumps({"historyId": 500}).encode("utf-8")
+    push = {"message": {"data": base64.urlsafe_b64encode(datos).decode("ascii"), "messageId": "sin-email"}}
+    respuesta = TestClient(app).post("/gmail/notifications", json=push)
+    assert respuesta.status_code == 200
+    assert respuesta.json()["status"] == "IGNORED"
+    db = SessionLocal()
+    assert db.query(NotificacionGmail).filter(NotificacionGmail.history_id == "500").count() == 0
+    # Un token sin email respaldado todavía: antes lo tomaba cualquier notificación sin email
+    dispositivo = Dispositivo(fcm_token="fcm-sin-email", nombre_dispositivo="Pixel")
+    db.add(dispositivo)
+    db.flush()
+    sin_email = GmailToken(
+        dispositivo_id=dispositivo.id, access_token="a", refresh_token="r",
+        token_uri="https://oauth2.googleapis.com/token", client_id="c", client_secret="s", scopes="gmail"
+    )
+    db.add(sin_email)
+    db.commit()
+
+    usados = []
+    monkeypatch.setattr(serviceEmail, "servicio_para", lambda token: usados.append(token.id))
+
+    async def notificacion_encolada_sin_email():
+        async with sesion_async() as sesion:
+            await serviceEmail.procesar_notificacion(sesion, None, "500")
+        await get_async_engine().dispose()
+
+    asyncio.run(notificacion_encolada_sin_email())
+    # No queda para las demás pruebas (las de otra cuenta lo identificarían con getProfile)
+    db.delete(sin_email)
+    db.delete(dispositivo)
+    db.commit()
+    db.close()
+    assert usados == []
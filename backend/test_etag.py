@@ -0,0 +1,81 @@
+import logging
+import pytest
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _etag(cliente, usuario, ruta: str, **params) -> str:
+    respuesta = cliente.get(ruta, params=params, headers=usuario["headers"])
+    assert respuesta.status_code == 200
+    return respuesta.headers["ETag"]
+
+
+@pytest.mark.parametrize("ruta", ["/transacciones/", "/cuentas/", "/categorias/"])
+def test_if_none_match_responde_304(cliente, usuario_nuevo, ruta):
+    usuario = usuario_nuevo()
+    etag = _etag(cliente, usuario, ruta)
+    respuesta = cliente.get(ruta, headers={**usuario["headers"], "If-None-Match": etag})
+    logger.info("%s con If-None-Match: %s", ruta, respuesta.status_code)
+    print(f"{ruta} con If-None-Match: {respuesta.status_code}")
+    assert respuesta.status_code == 304
+    assert respuesta.headers["ETag"] == etag
+    assert respuesta.content == b""
+
+    # Débil, en lista, o con otro valor
+    assert cliente.get(ruta, headers={**usuario["headers"], "If-None-Match": f'"x", W/{etag}'}).status_code == 304
+    assert cliente.get(ruta, headers={**usuario["headers"], "If-None-Match": '"otro"'}).status_code == 200
+
+
+def test_etag_cambia_con_alta_edicion_y_baja(cliente, usuario_nuevo, crear_transaccion):
+    usuario = usuario_nuevo()
+    vistos = [_etag(cliente, usuario, "/transacciones/")]
+
+    transaccion = crear_transaccion(usuario, 30)
+    vistos.append(_etag(cliente, usuario, "/transacciones/"))
+
+    cliente.put(f"/transacciones/{transaccion}", json={"amount": 45}, headers=usuario["headers"])
+    vistos.append(_etag(cliente, usuario, "/transacciones/"))
+
+    # El listado muestra el nombre de la categoría: renombrarla también cambia el ETag
+    cliente.put(f"/categorias/{usuario['categoria']}", json={"name": "Supermercado"}, headers=usuario["headers"])
+    vistos.append(_etag(cliente, usuario, "/transacciones/"))
+
+    cliente.delete(f"/transacciones/{transaccion}", headers=usuario["headers"])
+    vistos.append(_etag(cliente, usuario, "/transacciones/"))
+
+    print(f"ETags: {vistos}")
+    assert len(set(vistos)) == len(vistos)
+    # Sin cambios el ETag se mantiene, y el anterior ya no produce 304
+    assert _etag(cliente, usuario, "/transacciones/") == vistos[-1]
+    anterior = cliente.get("/transacciones/", headers={**usuario["headers"], "If-None-Match": vistos[-2]})
+    assert anterior.status_code == 200
+
+
+def test_etag_de_cuentas_y_categorias_sigue_los_cambios(cliente, usuario_nuevo):
+    usuario = usuario_nuevo()
+    inicial = _etag(cliente, usuario, "/cuentas/")
+    cuenta = cliente.post("/cuentas/", json={"name": "Tarjeta", "type": "credito", "amount": 0},
+                          headers=usuario["headers"]).json()
+    tras_alta = _etag(cliente, usuario, "/cuentas/")
+    cliente.put(f"/cuentas/{cuenta['id']}", json={"name": "Tarjeta oro"}, headers=usuario["headers"])
+    tras_edicion = _etag(cliente, usuario, "/cuentas/")
+    cliente.delete(f"/cuentas/{cuenta['id']}", headers=usuario["headers"])
+    tras_baja = _etag(cliente, usuario, "/cuentas/")
+    assert len({inicial, tras_alta, tras_edicion}) == 3
+    assert tras_baja != tras_edicion
+    # Tras la baja el listado vuelve a ser el inicial, y su ETag también
+    assert tras_baja == inicial
+
+    categoria = cliente.post("/categorias/", json={"name": "Viajes", "type": "gasto"}, headers=usuario["headers"]).json()
+    tras_alta = _etag(cliente, usuario, "/categorias/")
+    cliente.put(f"/categorias/{usuario['categoria']}", json={"name": "Almuerzos"}, headers=usuario["headers"])
+    tras_edicion = _etag(cliente, usuario, "/categorias/")
+    cliente.delete(f"/categorias/{categoria['id']}", headers=usuario["headers"])
+    assert len({tras_alta, tras_edicion, _etag(cliente, usuario, "/categorias/")}) == 3
+
+
+def test_etag_depende_del_usuario_y_de_los_filtros(cliente, usuario_nuevo):
+    uno, otro = usuario_nuevo(), usuario_nuevo()
+    assert _etag(cliente, uno, "/cuentas/") != _etag(cliente, otro, "/cuentas/")
+    assert _etag(cliente, uno, "/transacciones/") != _etag(cliente, uno, "/transacciones/", limit=5)
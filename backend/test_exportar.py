@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+import logging
+from sqlalchemy import event
+from database import SessionLocal
+from routers import transaccion as modulo
+from routers.transaccion import EXPORT_COLUMNAS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _csv(cliente, usuario, **params) -> list[list[str]]:
+    respuesta = cliente.get("/transacciones/exportar", params=params, headers=usuario["headers"])
+    assert respuesta.status_code == 200
+    assert respuesta.headers["content-type"].startswith("text/csv")
+    assert respuesta.headers["content-disposition"].startswith('attachment; filename="transacciones_')
+    return list(csv.reader(io.StringIO(respuesta.text)))
+
+
+def test_exportar_csv_solo_del_usuario(cliente, usuario_nuevo, crear_transaccion, monkeypatch):
+    monkeypatch.setattr(modulo, "EXPORT_BATCH_SIZE", 2)  # varios bloques en el stream
+    usuario, otro = usuario_nuevo(), usuario_nuevo()
+    ids = [
+        crear_transaccion(usuario, 12.5, "gasto", "2030-09-01T10:00:00", note='Cena, "especial"'),
+        crear_transaccion(usuario, 300, "ingreso", "2030-09-03T10:00:00"),
+        crear_transaccion(usuario, 7, "gasto", "2030-09-02T10:00:00", note="Café"),
+    ]
+    ajena = crear_transaccion(otro, 99, "gasto", "2030-09-02T10:00:00", note="ajena")
+
+    filas = _csv(cliente, usuario)
+    logger.info("CSV: %s", filas)
+    print(f"CSV: {filas}")
+    assert filas[0] == EXPORT_COLUMNAS
+    # Más reciente primero, sin filas de otros usuarios
+    assert [int(f[0]) for f in filas[1:]] == [ids[1], ids[2], ids[0]]
+    cena = dict(zip(EXPORT_COLUMNAS, filas[3]))
+    assert cena["date"] == "2030-09-01T10:00:00"
+    assert (cena["amount"], cena["type"], cena["note"]) == ("12.5", "gasto", 'Cena, "especial"')
+    assert (cena["account_name"], cena["category_name"]) == ("Principal", "Comida")
+
+    assert [int(f[0]) for f in _csv(cliente, otro)[1:]] == [ajena]
+
+
+def test_exportar_aplica_los_filtros(cliente, usuario_nuevo, crear_transaccion):
+    usuario = usuario_nuevo()
+    gasto_chico = crear_transaccion(usuario, 5, "gasto", "2030-10-01T10:00:00")
+    gasto_grande = crear_transaccion(usuario, 500, "gasto", "2030-10-05T10:00:00")
+    ingreso = crear_transaccion(usuario, 50, "ingreso", "2030-10-10T10:00:00")
+    crear_transaccion(usuario, 60, "gasto", "2030-11-01T10:00:00")
+
+    def ids(**params):
+        return [int(f[0]) for f in _csv(cliente, usuario, **params)[1:]]
+
+    assert ids(type="gasto", fecha_hasta="2030-10-31T23:59:59") == [gasto_grande, gasto_chico]
+    assert ids(fecha_desde="2030-10-02T00:00:00", fecha_hasta="2030-10-31T23:59:59") == [ingreso, gasto_grande]
+    assert ids(monto_min=10, monto_max=100, fecha_hasta="2030-10-31T23:59:59") == [ingreso]
+    assert ids(type="transferencia") == []
+    # Con filtros que no dejan nada igual se envía la cabecera
+    assert _csv(cliente, usuario, type="transferencia") == [EXPORT_COLUMNAS]
+
+    respuesta = cliente.get("/transacciones/exportar", params={"formato": "ndjson", "type": "ingreso"},
+                            headers=usuario["headers"])
+    assert respuesta.headers["content-type"] == "application/x-ndjson"
+    lineas = [json.loads(linea) for linea in respuesta.text.splitlines()]
+    assert [(l["id"], l["amount"], l["type"]) for l in lineas] == [(ingreso, 50, "ingreso")]
+    assert cliente.get("/transacciones/exportar", params={"formato": "xml"}, headers=usuario["headers"]).status_code == 422
+
+
+def test_exportar_lee_de_la_sesion_de_lectura(cliente, usuario_nuevo, crear_transaccion, monkeypatch):
+    usuario = usuario_nuevo()
+    crear_transaccion(usuario, 20, "gasto", "2030-12-01T10:00:00")
+    pedidas, opciones = [], []
+
+    def sesion_lectura(user_id=None):
+        pedidas.append(user_id)
+        db = SessionLocal()
+        event.listen(db, "do_orm_execute", lambda estado: opciones.append(estado.execution_options))
+        return db
+
+    monkeypatch.setattr(modulo, "sesion_lectura", sesion_lectura)
+    assert len(_csv(cliente, usuario)) == 2
+    assert pedidas == [usuario["user_id"]]
+    # Cursor del servidor en los motores que lo soportan, no el resultado completo en memoria
+    assert opciones[0]["stream_results"] is True
@@ -0,0 +1,54 @@
+import logging
+from datetime import datetime
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, select, text
+from models import Transaccion, Cuenta, Categoria, Dispositivo, GmailToken
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Consultas calientes de los routers; cada una debe resolverse con un índice
+# (búsqueda por índice, sin ordenar en una tabla temporal).
+CONSULTAS = {
+    "listar_transacciones": select(Transaccion).where(Transaccion.user_id == 1)
+        .order_by(Transaccion.date.desc(), Transaccion.id.desc()).limit(21),
+    "transacciones_por_cuenta": select(Transaccion).where(Transaccion.user_id == 1, Transaccion.account_id == 2)
+        .order_by(Transaccion.date.desc(), Transaccion.id.desc()).limit(21),
+    "transacciones_por_categoria": select(Transaccion).where(Transaccion.user_id == 1, Transaccion.category_id == 3)
+        .order_by(Transaccion.date.desc(), Transaccion.id.desc()).limit(21),
+    "sync_transacciones": select(Transaccion).where(
+        Transaccion.user_id == 1, Transaccion.updated_at > datetime(2025, 1, 1)
+    ),
+    "listar_cuentas": select(Cuenta).where(Cuenta.user_id == 1),
+    "listar_categorias": select(Categoria).where(Categoria.user_id == 1),
+    "register_device": select(Dispositivo).where(Dispositivo.fcm_token == "token"),
+    "gmail_notifications": select(GmailToken).where(GmailToken.email == "cuenta@gmail.com"),
+    "gmail_stop": select(Dispositivo).order_by(Dispositivo.ultimo_acceso.desc()).limit(1),
+}
+
+
+@pytest.fixture(scope="module")
+def engine_migrado(tmp_path_factory):
+    """Base SQLite creada solo con las migraciones (no con create_all)."""
+    ruta = tmp_path_factory.mktemp("migraciones") / "indices.db"
+    engine = create_engine(f"sqlite:///{ruta}")
+    config = Config("alembic.ini")
+    config.attributes["configurar_logging"] = False
+    with engine.begin() as conexion:
+        config.attributes["connection"] = conexion
+        command.upgrade(config, "head")
+    yield engine
+    engine.dispose()
+
+
+@pytest.mark.parametrize("nombre", sorted(CONSULTAS))
+def test_consultas_calientes_usan_indice(engine_migrado, nombre):
+    sql = str(CONSULTAS[nombre].compile(engine_migrado, compile_kwargs={"literal_binds": True}))
+    with engine_migrado.connect() as conexion:
+        plan = " | ".join(fila[-1] for fila in conexion.execute(text("EXPLAIN QUERY PLAN " + sql)))
+    logger.info("%s: %s", nombre, plan)
+    print(f"{nombre}: {plan}")
+    assert "USING INDEX" in plan or "USING COVERING INDEX" in plan
+    assert "TEMP B-TREE" not in plan
@@ -0,0 +1,154 @@
+import logging
+import threading
+import uuid
+from datetime import datetime
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base, SessionLocal, crear_esquema, engine as engine_principal
+from models import Usuario, Cuenta
+from utils.ledger import aplicar_movimiento, revertir_movimiento
+from utils.saldos import saldo_en_fecha
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ESCRITORES = 16
+OPERACIONES_POR_ESCRITOR = 25
+
+
+@pytest.fixture(params=["sqlite", "servidor"])
+def sesiones(request, tmp_path):
+    """
+    Fábrica de sesiones; cada hilo abre su propia conexión.
+    - sqlite: base en archivo propia del test. SQLite bloquea la base entera al
+      escribir, así que aquí solo se verifica que no se pierdan actualizaciones.
+    - servidor: el motor de DATABASE_URL si es PostgreSQL o SQL Server, donde
+      el UPDATE condicional bloquea solo la fila. Se omite con otro motor.
+    """
+    if request.param == "servidor":
+        if engine_principal.dialect.name not in ("postgresql", "mssql"):
+            pytest.skip("DATABASE_URL no apunta a PostgreSQL ni a SQL Server")
+        crear_esquema()
+        yield SessionLocal
+        return
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'ledger.db'}",
+        connect_args={"check_same_thread": False, "timeout": 30}
+    )
+    Base.metadata.create_all(engine)
+    fabrica = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    yield fabrica
+    engine.dispose()
+
+
+def _crear_cuenta(fabrica, saldo: float) -> tuple[int, int]:
+    db = fabrica()
+    usuario = Usuario(name="Concurrencia", email=f"concurrencia{uuid.uuid4().hex[:12]}@test.com", password="x")
+    db.add(usuario)
+    db.flush()
+    cuenta = Cuenta(user_id=usuario.id, name="Principal", type="banco", amount=saldo)
+    db.add(cuenta)
+    db.commit()
+    ids = (usuario.id, cuenta.id)
+    db.close()
+    return ids
+
+
+def _saldo(fabrica, account_id: int) -> float:
+    db = fabrica()
+    saldo = db.query(Cuenta.amount).filter(Cuenta.id == account_id).scalar()
+    db.close()
+    return saldo
+
+
+def _en_paralelo(trabajo, hilos: int):
+    errores = []
+
+    def ejecutar(indice):
+        try:
+            trabajo(indice)
+        except Exception as e:
+            errores.append(e)
+
+    threads = [threading.Thread(target=ejecutar, args=(i,)) for i in range(hilos)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errores, errores
+
+
+def test_escritores_paralelos_saldo_final_correcto(sesiones):
+    user_id, account_id = _crear_cuenta(sesiones, 1000)
+
+    def escritor(indice):
+        for n in range(OPERACIONES_POR_ESCRITOR):
+            db = sesiones()
+            try:
+                # Pares: ingreso de 3, impares: gasto de 1; además se revierte un gasto
+                if (indice + n) % 2 == 0:
+                    aplicar_movimiento(db, user_id, account_id, "ingreso", 3, datetime.now())
+                else:
+                    aplicar_movimiento(db, user_id, account_id, "gasto", 1, datetime.now())
+                    revertir_movimiento(db, user_id, account_id, "gasto", 1, datetime.now())
+                    aplicar_movimiento(db, user_id, account_id, "gasto", 1, datetime.now())
+                db.commit()
+            finally:
+                db.close()
+
+    _en_paralelo(escritor, ESCRITORES)
+
+    ingresos = sum(
+        1 for i in range(ESCRITORES) for n in range(OPERACIONES_POR_ESCRITOR) if (i + n) % 2 == 0
+    )
+    gastos = ESCRITORES * OPERACIONES_POR_ESCRITOR - ingresos
+    esperado = 1000 + 3 * ingresos - gastos
+    saldo = _saldo(sesiones, account_id)
+    logger.info("Saldo final: %s (esperado %s)", saldo, esperado)
+    print(f"Saldo final: {saldo} (esperado {esperado})")
+    assert saldo == esperado
+
+    # El checkpoint del día debe coincidir con el saldo de la cuenta
+    db = sesiones()
+    assert saldo_en_fecha(db, account_id, datetime.now().date()) == esperado
+    db.close()
+
+
+def test_fondos_insuficientes_bajo_concurrencia(sesiones):
+    user_id, account_id = _crear_cuenta(sesiones, 1000)
+    aprobados = []
+    rechazados = []
+    lock = threading.Lock()
+
+    def escritor(indice):
+        db = sesiones()
+        try:
+            aplicar_movimiento(db, user_id, account_id, "gasto", 100, datetime.now())
+            db.commit()
+            with lock:
+                aprobados.append(indice)
+        except HTTPException as e:
+            db.rollback()
+            assert e.status_code == 400
+            with lock:
+                rechazados.append(indice)
+        finally:
+            db.close()
+
+    _en_paralelo(escritor, 40)
+
+    # Solo caben 10 gastos de 100 en un saldo de 1000; nunca debe quedar negativo
+    assert len(aprobados) == 10
+    assert len(rechazados) == 30
+    assert _saldo(sesiones, account_id) == 0
+
+
+def test_cuenta_inexistente(sesiones):
+    user_id, _ = _crear_cuenta(sesiones, 10)
+    db = sesiones()
+    with pytest.raises(HTTPException) as exc:
+        aplicar_movimiento(db, user_id, 9999, "gasto", 1, datetime.now())
+    db.close()
+    assert exc.value.status_code == 404
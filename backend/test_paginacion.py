@@ -0,0 +1,74 @@
+import base64
+import logging
+import pytest
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Varias transacciones con la misma fecha: el cursor desempata por id
+FECHAS = [
+    "2030-07-03T09:00:00", "2030-07-02T18:30:00", "2030-07-02T18:30:00", "2030-07-02T18:30:00",
+    "2030-07-01T08:00:00", "2030-07-01T08:00:00", "2030-06-30T23:59:59",
+]
+
+
+def _crear(crear_transaccion, usuario) -> list[tuple[str, int]]:
+    return [
+        (fecha, crear_transaccion(usuario, 10 + i, "ingreso" if i % 2 else "gasto", fecha))
+        for i, fecha in enumerate(FECHAS)
+    ]
+
+
+def _recorrer(cliente, usuario, limit: int, **params) -> tuple[list[int], int]:
+    ids, paginas, cursor = [], 0, None
+    while True:
+        pagina_params = {**params, "limit": limit}
+        if cursor:
+            pagina_params["cursor"] = cursor
+        respuesta = cliente.get("/transacciones/", params=pagina_params, headers=usuario["headers"])
+        assert respuesta.status_code == 200
+        pagina = respuesta.json()
+        paginas += 1
+        assert len(pagina["items"]) <= limit
+        ids += [t["id"] for t in pagina["items"]]
+        cursor = pagina["next_cursor"]
+        if cursor is None:
+            return ids, paginas
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 7])
+def test_cursor_recorre_todo_sin_repetir_ni_saltear(cliente, usuario_nuevo, crear_transaccion, limit):
+    usuario = usuario_nuevo()
+    creadas = _crear(crear_transaccion, usuario)
+    esperados = [i for _, i in sorted(creadas, key=lambda c: (c[0], c[1]), reverse=True)]
+
+    ids, paginas = _recorrer(cliente, usuario, limit)
+    logger.info("limit=%s: %s páginas, ids %s", limit, paginas, ids)
+    print(f"limit={limit}: {paginas} páginas, ids {ids}")
+    assert ids == esperados
+    assert paginas == -(-len(FECHAS) // limit)
+
+
+def test_cursor_con_filtros(cliente, usuario_nuevo, crear_transaccion):
+    usuario = usuario_nuevo()
+    creadas = _crear(crear_transaccion, usuario)
+    ingresos = [i for n, (_, i) in enumerate(creadas) if n % 2]
+    esperados = [i for f, i in sorted(creadas, reverse=True) if i in ingresos and f <= "2030-07-02T18:30:00"]
+
+    ids, _ = _recorrer(cliente, usuario, 1, type="ingreso", fecha_hasta="2030-07-02T18:30:00")
+    assert ids == esperados
+
+
+@pytest.mark.parametrize("cursor", [
+    "no-es-base64!!",
+    "ñandú",
+    base64.urlsafe_b64encode(b"sin separador").decode(),
+    base64.urlsafe_b64encode(b"2030-07-01T08:00:00|no-es-id").decode(),
+    base64.urlsafe_b64encode(b"no-es-fecha|12").decode(),
+    base64.urlsafe_b64encode(b"\xff\xfe|1").decode(),
+])
+def test_cursor_malformado_responde_400(cliente, usuario_nuevo, cursor):
+    usuario = usuario_nuevo()
+    respuesta = cliente.get("/transacciones/", params={"cursor": cursor}, headers=usuario["headers"])
+    assert respuesta.status_code == 400
+    assert respuesta.json()["detail"] == "Cursor inválido"
@@ -0,0 +1,121 @@
+import asyncio
+import json
+import logging
+from utils import email_processor, plantillas_correo
+from utils.plantillas_correo import Plantilla, RegistroPlantillas, PLANTILLAS_BASE
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CONSUMO = (
+    "Estimado cliente, le informamos que se ha realizado un consumo con su tarjeta terminada en 1234 "
+    "por RD$ 1,250.00 en SUPERMERCADO NACIONAL el 20/03/2024 a las 14:35."
+)
+CONSUMO_ETIQUETAS = "Notificación de Consumo\nMonto: US$ 45.99\nComercio: AMAZON.COM\nFecha: 21/03/2024\n"
+
+
+def _correo_nuevo_banco(monto: str, lugar: str, fecha: str) -> str:
+    return f"Hola, tu compra fue aprobada. Total {monto} EUR. Tienda: {lugar}. Día {fecha}."
+
+
+def test_plantilla_base_extrae_sin_gpt():
+    registro = RegistroPlantillas([Plantilla(p.nombre, p.campos, reconocer=p.reconocer) for p in PLANTILLAS_BASE])
+    primero = registro.extraer(CONSUMO, "alertas@banco.com.do")
+    segundo = registro.extraer(CONSUMO_ETIQUETAS)
+    desconocido = registro.extraer("Su estado de cuenta de marzo ya está disponible.")
+    logger.info("Extraídos: %s | %s", primero, segundo)
+    print(f"Extraídos: {primero} | {segundo}")
+
+    assert (primero["Monto"], primero["Moneda"], primero["Lugar"], primero["Fecha"]) == (
+        1250.0, "DOP", "SUPERMERCADO NACIONAL", "2024-03-20"
+    )
+    assert (segundo["Monto"], segundo["Moneda"], segundo["Lugar"], segundo["Fecha"]) == (
+        45.99, "USD", "AMAZON.COM", "2024-03-21"
+    )
+    assert primero["Status"] == "APROBADA"
+    assert desconocido is None
+    estadisticas = registro.estadisticas()
+    assert (estadisticas["correos"], estadisticas["fallbacks_gpt"]) == (3, 1)
+    assert estadisticas["plantillas"][0]["aciertos"] == 2
+
+
+def test_plantilla_base_no_acepta_otros_correos_ni_inventa_la_fecha():
+    registro = RegistroPlantillas([Plantilla(p.nombre, p.campos, reconocer=p.reconocer) for p in PLANTILLAS_BASE])
+    # Un monto y un "en ..." no bastan si el correo no es un consumo con tarjeta
+    oferta = "Aproveche: préstamos por RD$ 50,000.00 en SUCURSALES SELECCIONADAS el 20/03/2024."
+    assert registro.extraer(oferta, "marketing@tienda.com") is None
+    # Consumo sin fecha: lo resuelve GPT en lugar de fecharlo hoy
+    assert registro.extraer(CONSUMO.replace(" el 20/03/2024", ""), "alertas@banco.com.do") is None
+    assert registro.estadisticas()["fallbacks_gpt"] == 2
+
+
+def test_forma_frecuente_se_promueve_a_plantilla(monkeypatch):
+    monkeypatch.setattr(plantillas_correo, "PLANTILLAS_PROMOVER_MINIMO", 3)
+    monkeypatch.setattr(plantillas_correo, "PLANTILLAS_AUTOPROMOVER", True)
+    registro = RegistroPlantillas()
+    remitente = "Alertas <alertas@banco.es>"
+    # Respuestas de GPT para tres correos del mismo molde con distinto comercio
+    for monto, valor, lugar, fecha, iso in [
+        ("3.450,75", 3450.75, "Zara Madrid", "05-04-2024", "2024-04-05"),
+        ("12,00", 12.0, "Mercadona", "06-04-2024", "2024-04-06"),
+        ("1.020,10", 1020.1, "El Corte Inglés", "07-04-2024", "2024-04-07"),
+    ]:
+        correo = _correo_nuevo_banco(monto, lugar, fecha)
+        assert registro.extraer(correo, remitente) is None
+        registro.registrar_fallback(correo, remitente, {
+            "Monto": valor, "Fecha": iso, "Moneda": "EUR", "Lugar": lugar, "Status": "APROBADA"
+        })
+
+    formas = registro.formas_frecuentes()
+    print(f"Formas: {formas}")
+    assert formas[0]["veces"] == 3
+    assert formas[0]["candidata"]["remitentes"] == ["banco.es"]
+
+    nuevo = registro.extraer(_correo_nuevo_banco("99,10", "FNAC Callao", "08-04-2024"), remitente)
+    assert (nuevo["Monto"], nuevo["Moneda"], nuevo["Lugar"], nuevo["Fecha"]) == (99.1, "EUR", "FNAC Callao", "2024-04-08")
+    # Solo aplica al remitente del que salió
+    assert registro.extraer(_correo_nuevo_banco("5,00", "Otro", "08-04-2024"), "otro@banco.com") is None
+
+
+def test_plantillas_desde_archivo(tmp_path):
+    candidata = plantillas_correo.sugerir_plantilla(
+        "banco_es", "alertas@banco.es", _correo_nuevo_banco("12,00", "Mercadona", "06-04-2024"),
+        {"Monto": 12.0, "Fecha": "2024-04-06", "Moneda": "EUR", "Lugar": "Mercadona", "Status": "APROBADA"},
+    )
+    ruta = tmp_path / "plantillas_correo.json"
+    ruta.write_text(json.dumps([candidata.a_config()]), encoding="utf-8")
+
+    registro = RegistroPlantillas()
+    assert registro.cargar_archivo(str(ruta)) == 1
+    resultado = registro.extraer(_correo_nuevo_banco("7,50", "Lidl", "09-04-2024"), "alertas@banco.es")
+    assert resultado["Origen"] == "plantilla:banco_es"
+    assert resultado["Monto"] == 7.5
+
+
+def test_email_processor_no_llama_a_gpt_si_hay_plantilla(monkeypatch):
+    async def gpt(email_content):
+        raise AssertionError("no debería llamarse a GPT")
+
+    monkeypatch.setattr(email_processor, "process_email_with_gpt", gpt)
+    resultado = asyncio.run(email_processor.extraer_transaccion(CONSUMO, "alertas@banco.com.do"))
+    assert resultado["Origen"] == "plantilla:consumo_tarjeta"
+    assert resultado["Monto"] == 1250.0
+
+
+def test_diagnostico_de_plantillas_solo_para_admins(cliente, usuario_nuevo, monkeypatch):
+    import dependencies
+    remitente = "alertas@banco.es"
+    correo = _correo_nuevo_banco("12,00", "Mercadona", "06-04-2024")
+    plantillas_correo.plantillas.registrar_fallback(correo, remitente, {
+        "Monto": 12.0, "Fecha": "2024-04-06", "Moneda": "EUR", "Lugar": "Mercadona", "Status": "APROBADA"
+    })
+    usuario, admin = usuario_nuevo(), usuario_nuevo()
+    monkeypatch.setattr(dependencies, "DIAGNOSTICO_ADMINS", {admin["email"]})
+
+    for ruta in ["/diagnostico/", "/diagnostico/plantillas_correo", "/diagnostico/pool"]:
+        assert cliente.get(ruta, headers=usuario["headers"]).status_code == 403
+    respuesta = cliente.get("/diagnostico/plantillas_correo", headers=admin["headers"])
+    assert respuesta.status_code == 200
+    # Ni el texto del correo ni su forma salen del proceso
+    assert "tu compra" not in respuesta.text
+    assert any(f["remitente"] == remitente for f in respuesta.json()["formas_frecuentes"])
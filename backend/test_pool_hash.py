@@ -0,0 +1,60 @@
+import logging
+import threading
+import time
+import pytest
+from utils import security
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def pool_chico(monkeypatch):
+    """Pool real de un proceso con dos cupos (la suite usa HASH_POOL_SIZE=0)."""
+    tamano, cola = security.HASH_POOL_SIZE, security.HASH_POOL_QUEUE
+    security.configurar_pool(1, 2)
+    monkeypatch.setattr(security, "HASH_POOL_TIMEOUT", 0.3)
+    security._ejecutar(time.sleep, 0)  # arranca el proceso del pool
+    yield
+    security.configurar_pool(tamano, cola)
+
+
+def test_pool_saturado_responde_503_sin_esperar(pool_chico, cliente, datos_prueba):
+    errores = []
+
+    def trabajo_largo():
+        # Supera HASH_POOL_TIMEOUT: el error se revisa en el hilo principal
+        try:
+            security._ejecutar(time.sleep, 1.5)
+        except Exception as e:
+            errores.append(e)
+
+    ocupado = threading.Thread(target=trabajo_largo)
+    ocupado.start()
+    time.sleep(0.2)
+
+    # Segundo trabajo: espera HASH_POOL_TIMEOUT detrás del primero y se abandona,
+    # pero sigue en el pool, así que conserva su cupo hasta terminar
+    with pytest.raises(security.PoolHashSaturado):
+        security._ejecutar(time.sleep, 0)
+
+    credenciales = {"username": datos_prueba["email"], "password": datos_prueba["password"]}
+    inicio = time.monotonic()
+    respuesta = cliente.post("/usuarios/login", data=credenciales)
+    demora = time.monotonic() - inicio
+    logger.info("Login con el pool saturado: %s en %.3fs", respuesta.status_code, demora)
+    print(f"Login con el pool saturado: {respuesta.status_code} en {demora:.3f}s")
+    assert respuesta.status_code == 503
+    assert respuesta.headers["Retry-After"] == "1"
+    assert demora < security.HASH_POOL_TIMEOUT
+
+    # Al terminar los trabajos se liberan sus cupos
+    ocupado.join()
+    assert [type(e) for e in errores] == [security.PoolHashSaturado]
+    limite = time.monotonic() + 5
+    while time.monotonic() < limite:
+        respuesta = cliente.post("/usuarios/login", data=credenciales)
+        if respuesta.status_code != 503:
+            break
+        time.sleep(0.1)
+    assert respuesta.status_code == 200
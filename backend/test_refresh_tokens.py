@@ -0,0 +1,126 @@
+import logging
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from database import Base, SessionLocal
+from models import FamiliaRefresh, TokenRevocado, Usuario
+from utils.revocaciones import RegistroRevocaciones
+from utils.security import decode_access_token
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'revocaciones.db'}")
+    Base.metadata.create_all(engine)
+    sesion = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    usuario = Usuario(name="Refresh", email="refresh@test.com", password="x")
+    sesion.add(usuario)
+    sesion.commit()
+    sesion.user_id = usuario.id
+    yield sesion
+    sesion.close()
+    engine.dispose()
+
+
+def test_rotacion_una_sola_vez(db):
+    expira = datetime.utcnow() + timedelta(days=1)
+    worker_a = RegistroRevocaciones(intervalo=0)
+    worker_b = RegistroRevocaciones(intervalo=0)
+    worker_a.abrir_familia(db, "fam-1", "jti-1", db.user_id, expira)
+
+    assert worker_a.rotar(db, "fam-1", "jti-1", "jti-2", expira)
+    # Otro worker con el mismo token ya no puede rotarlo; con el vigente sí
+    assert not worker_b.rotar(db, "fam-1", "jti-1", "jti-3", expira)
+    assert worker_b.rotar(db, "fam-1", "jti-2", "jti-3", expira)
+    # Las rotaciones no agregan filas ni entradas en memoria
+    assert db.query(FamiliaRefresh).count() == 1
+    assert db.query(TokenRevocado).count() == 0
+    assert len(worker_a) == len(worker_b) == 0
+
+
+def test_familia_revocada_no_rota_y_se_sincroniza(db):
+    vigente = datetime.utcnow() + timedelta(days=1)
+    vencida = datetime.utcnow() - timedelta(seconds=1)
+    escritor = RegistroRevocaciones(intervalo=0)
+    escritor.abrir_familia(db, "fam-1", "jti-1", db.user_id, vigente)
+    assert escritor.revocar(db, "fam-1", db.user_id, vigente)
+    assert not escritor.revocar(db, "fam-1", db.user_id, vigente)
+    escritor.revocar(db, "fam-vieja", db.user_id, vencida)
+    assert not escritor.rotar(db, "fam-1", "jti-1", "jti-2", vigente)
+    assert db.query(FamiliaRefresh).count() == 0
+
+    lector = RegistroRevocaciones(intervalo=0)
+    lector.sincronizar(db)
+    logger.info("Revocaciones en memoria: %s", len(lector))
+    print(f"Revocaciones en memoria: {len(lector)}")
+    assert lector.esta_revocado("otro", "fam-1")
+    # Las revocaciones expiradas no ocupan memoria
+    assert not lector.esta_revocado("fam-vieja")
+    assert len(lector) == 1
+
+    escritor.revocar(db, "fam-2", db.user_id, vigente)
+    lector.sincronizar(db)
+    assert lector.esta_revocado("fam-2")
+
+
+def _refrescar(cliente, refresh_token: str):
+    return cliente.post("/usuarios/refresh", json={"refresh_token": refresh_token})
+
+
+def test_endpoint_rota_y_la_reutilizacion_revoca_la_familia(cliente, usuario_nuevo):
+    usuario = usuario_nuevo()
+    original = usuario["tokens"]["refresh_token"]
+
+    respuesta = _refrescar(cliente, original)
+    assert respuesta.status_code == 200
+    par = respuesta.json()
+    assert par["refresh_token"] != original
+    nuevo_acceso = {"Authorization": f"Bearer {par['access_token']}"}
+    assert cliente.get("/cuentas/", headers=nuevo_acceso).status_code == 200
+    for _ in range(3):
+        par = _refrescar(cliente, par["refresh_token"]).json()
+    # Una fila por familia, ninguna por rotación
+    db = SessionLocal()
+    assert db.query(FamiliaRefresh).filter(FamiliaRefresh.user_id == usuario["user_id"]).count() == 1
+    assert db.query(TokenRevocado).filter(TokenRevocado.user_id == usuario["user_id"]).count() == 0
+    db.close()
+
+    # El token ya rotado vuelve a aparecer (posible robo): se corta la familia completa
+    assert _refrescar(cliente, original).status_code == 401
+    respuesta = _refrescar(cliente, par["refresh_token"])
+    logger.info("Refresh tras la reutilización: %s", respuesta.json())
+    print(f"Refresh tras la reutilización: {respuesta.json()}")
+    assert respuesta.status_code == 401
+
+
+def test_endpoint_logout_cierra_la_sesion(cliente, usuario_nuevo):
+    usuario = usuario_nuevo()
+    refresh_token = usuario["tokens"]["refresh_token"]
+    assert cliente.post("/usuarios/logout", json={"refresh_token": refresh_token}).status_code == 200
+    assert _refrescar(cliente, refresh_token).status_code == 401
+
+
+def test_endpoint_respeta_la_revocacion_de_otro_worker(cliente, usuario_nuevo):
+    usuario = usuario_nuevo()
+    # Este refresh deja sincronizado el registro del proceso
+    par = _refrescar(cliente, usuario["tokens"]["refresh_token"]).json()
+
+    # Logout atendido por otro worker: solo llega a la BD, no a la memoria de este
+    otro_worker = RegistroRevocaciones()
+    db = SessionLocal()
+    otro_worker.revocar(db, decode_access_token(par["refresh_token"])["fam"], usuario["user_id"],
+                        datetime.utcnow() + timedelta(days=1))
+    db.close()
+    assert _refrescar(cliente, par["refresh_token"]).status_code == 401
+
+
+def test_refresh_token_no_sirve_como_token_de_acceso(cliente, usuario_nuevo):
+    usuario = usuario_nuevo()
+    como_acceso = {"Authorization": f"Bearer {usuario['tokens']['refresh_token']}"}
+    assert cliente.get("/cuentas/", headers=como_acceso).status_code == 401
+    # Y un token de acceso no sirve para renovar
+    assert _refrescar(cliente, usuario["tokens"]["access_token"]).status_code == 401
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs
+import pytest
+from database import SessionLocal, crear_esquema, get_async_engine
+from models import Dispositivo, GmailToken
+from utils import gmail, renovador_gmail as modulo
+from utils.renovador_gmail import RenovadorGmail
+
+pytest.importorskip("google.auth")
+
+
+class _EndpointToken(BaseHTTPRequestHandler):
+    """Reemplazo local de https://oauth2.googleapis.com/token."""
+    pedidos: list[str] = []
+
+    def do_POST(self):
+        datos = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+        refresh_token = datos["refresh_token"][0]
+        _EndpointToken.pedidos.append(refresh_token)
+        if refresh_token == "revocado":
+            codigo, cuerpo = 400, {"error": "invalid_grant", "error_description": "Token has been expired or revoked."}
+        else:
+            codigo, cuerpo = 200, {"access_token": f"nuevo-{refresh_token}", "expires_in": 3600, "token_type": "Bearer"}
+        contenido = json.dumps(cuerpo).encode()
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(contenido)))
+        self.end_headers()
+        self.wfile.write(contenido)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def token_uri():
+    servidor = HTTPServer(("127.0.0.1", 0), _EndpointToken)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    _EndpointToken.pedidos = []
+    yield f"http://127.0.0.1:{servidor.server_port}/token"
+    servidor.shutdown()
+
+
+def test_renueva_tokens_y_watch_por_vencer(token_uri, monkeypatch):
+    crear_esquema()
+    ahora = datetime.utcnow()
+    db = SessionLocal()
+    db.query(GmailToken).delete()
+    tokens = {}
+    for nombre, vence, watch_vence in [
+        ("por-vencer", ahora + timedelta(minutes=2), ahora + timedelta(days=5)),
+        ("vigente", ahora + timedelta(minutes=50), ahora + timedelta(hours=2)),
+        ("revocado", ahora - timedelta(minutes=1), ahora + timedelta(days=5)),
+    ]:
+        dispositivo = Dispositivo(fcm_token=f"fcm-{nombre}")
+        db.add(dispositivo)
+        db.flush()
+        token = GmailToken(
+            dispositivo_id=dispositivo.id, email=f"{nombre}@gmail.com", history_id="50", access_token="viejo",
+            refresh_token=nombre, token_uri=token_uri, client_id="cliente", client_secret="secreto",
+            scopes="https://www.googleapis.com/auth/gmail.readonly", expiration_date=vence, watch_expira=watch_vence,
+        )
+        db.add(token)
+        db.flush()
+        tokens[nombre] = token.id
+        gmail.olvidar_cliente(token.id)
+    db.commit()
+    # Servicio cacheado que un worker de la cola podría estar usando
+    servicio_worker, creds_worker = gmail.servicio_para(db.get(GmailToken, tokens["por-vencer"]))
+    db.close()
+
+    watches = []
+
+    def renovar_watch(servicio):
+        watches.append(servicio)
+        return "999", ahora + timedelta(days=7)
+
+    monkeypatch.setattr(modulo, "renovar_watch", renovar_watch)
+    monkeypatch.setattr(modulo, "GMAIL_RENOVAR_LOTE", 2)  # fuerza más de un lote
+
+    renovador = RenovadorGmail(concurrencia=2)
+
+    async def dos_ciclos():
+        await renovador.ciclo()
+        await renovador.ciclo()
+        await get_async_engine().dispose()
+
+    asyncio.run(dos_ciclos())
+    estadisticas = renovador.estadisticas()
+    print(f"Pedidos al endpoint: {_EndpointToken.pedidos}")
+    print(f"Estadísticas: {estadisticas}")
+
+    db = SessionLocal()
+    por_vencer = db.get(GmailToken, tokens["por-vencer"])
+    vigente = db.get(GmailToken, tokens["vigente"])
+    revocado = db.get(GmailToken, tokens["revocado"])
+    # Solo se pidió token para los que vencían; el revocado no se reintenta en el segundo ciclo
+    assert sorted(_EndpointToken.pedidos) == ["por-vencer", "revocado"]
+    assert por_vencer.access_token == "nuevo-por-vencer"
+    assert por_vencer.expiration_date > ahora + timedelta(minutes=50)
+    # El watch del vigente vencía en 2 horas: se renovó sin tocar el checkpoint
+    assert vigente.access_token == "viejo"
+    assert vigente.watch_expira > ahora + timedelta(days=6)
+    assert vigente.history_id == "50"
+    assert revocado.access_token == "viejo"
+    # El renovador no tocó las credenciales del worker; este reconstruye su servicio con el token nuevo
+    assert creds_worker.token == "viejo"
+    assert servicio_worker not in watches
+    servicio, creds = gmail.servicio_para(por_vencer)
+    assert servicio is not servicio_worker and creds.token == "nuevo-por-vencer"
+    assert gmail.servicio_para(por_vencer)[0] is servicio
+    db.close()
+
+    assert estadisticas["tokens_renovados"] == 1
+    assert estadisticas["tokens_fallidos"] == 1
+    assert estadisticas["watches_renovados"] == 1
+    assert estadisticas["en_espera"] == 1
+    assert estadisticas["errores_recientes"][0]["gmail_token_id"] == tokens["revocado"]
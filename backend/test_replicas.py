@@ -0,0 +1,79 @@
+import logging
+import pytest
+from fastapi.testclient import TestClient
+import database
+from database import Base, Replica
+from main import app
+from models import Usuario, Cuenta
+
+client = TestClient(app)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SALDO_REPLICA = 123.0
+
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch, datos_prueba):
+    """
+    Segunda base SQLite como réplica, con el usuario y la cuenta del primario
+    pero un saldo distinto, para saber de qué base viene cada lectura.
+    """
+    replica = Replica(f"sqlite:///{tmp_path / 'replica.db'}", "replica-test")
+    Base.metadata.create_all(replica.engine)
+    primario = database.SessionLocal()
+    usuario = primario.get(Usuario, datos_prueba["user_id"])
+    cuenta = primario.get(Cuenta, datos_prueba["cuenta_ahorro"])
+    db = replica.sesiones()
+    db.add(Usuario(id=usuario.id, name=usuario.name, email=usuario.email, password=usuario.password))
+    db.add(Cuenta(id=cuenta.id, user_id=cuenta.user_id, name=cuenta.name, type=cuenta.type, amount=SALDO_REPLICA))
+    db.commit()
+    db.close()
+    primario.close()
+    monkeypatch.setattr(database, "replicas", [replica])
+    database.escrituras_recientes.clear()
+    yield replica
+    replica.engine.dispose()
+
+
+@pytest.fixture
+def auth_header(datos_prueba):
+    response = client.post(
+        "/usuarios/login",
+        data={"username": datos_prueba["email"], "password": datos_prueba["password"]}
+    )
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def _saldo(auth_header, cuenta_id):
+    response = client.get(f"/cuentas/{cuenta_id}", headers=auth_header)
+    assert response.status_code == 200
+    return response.json()["amount"]
+
+
+def test_lecturas_van_a_la_replica(replica, auth_header, datos_prueba):
+    assert _saldo(auth_header, datos_prueba["cuenta_ahorro"]) == SALDO_REPLICA
+
+
+def test_lectura_despues_de_escribir_usa_primario(replica, auth_header, datos_prueba):
+    cuenta_id = datos_prueba["cuenta_ahorro"]
+    response = client.put(f"/cuentas/{cuenta_id}", json={"type": "banco"}, headers=auth_header)
+    assert response.status_code == 200
+    saldo = _saldo(auth_header, cuenta_id)
+    logger.info("Saldo leído tras escribir: %s", saldo)
+    print(f"Saldo leído tras escribir: {saldo}")
+    assert saldo != SALDO_REPLICA
+
+    # Vencida la ventana de staleness, vuelve a leer de la réplica
+    database.escrituras_recientes.clear()
+    assert _saldo(auth_header, cuenta_id) == SALDO_REPLICA
+
+
+def test_replica_caida_usa_primario(tmp_path, monkeypatch, auth_header, datos_prueba):
+    caida = Replica(f"sqlite:///{tmp_path / 'no-existe' / 'replica.db'}", "replica-caida")
+    monkeypatch.setattr(database, "replicas", [caida])
+    database.escrituras_recientes.clear()
+    assert _saldo(auth_header, datos_prueba["cuenta_ahorro"]) != SALDO_REPLICA
+    assert not caida.disponible()
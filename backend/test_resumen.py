@@ -0,0 +1,90 @@
+import logging
+import pytest
+from sqlalchemy import event
+from database import SessionLocal, engine
+from models import ResumenMensual
+from utils.resumen import reconstruir_resumenes
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def claves_foraneas():
+    """SQLite no valida las FOREIGN KEY salvo que se active en cada conexión."""
+    if engine.dialect.name != "sqlite":
+        yield
+        return
+
+    def activar(conexion, _):
+        conexion.execute("PRAGMA foreign_keys=ON")
+
+    event.listen(engine, "connect", activar)
+    engine.dispose()
+    yield
+    event.remove(engine, "connect", activar)
+    engine.dispose()
+
+
+def _resumen(cliente, usuario, **params) -> list[dict]:
+    respuesta = cliente.get("/transacciones/resumen", params=params, headers=usuario["headers"])
+    assert respuesta.status_code == 200
+    return respuesta.json()
+
+
+def _filas_resumen(**filtro) -> int:
+    db = SessionLocal()
+    total = db.query(ResumenMensual).filter_by(**filtro).count()
+    db.close()
+    return total
+
+
+def test_resumen_sigue_altas_cambios_y_bajas(cliente, usuario_nuevo, crear_transaccion):
+    usuario = usuario_nuevo()
+    ids = [
+        crear_transaccion(usuario, monto, fecha=fecha)
+        for monto, fecha in [(100, "2030-01-05T10:00:00"), (50, "2030-01-20T10:00:00"), (70, "2030-02-03T10:00:00")]
+    ]
+    resumen = _resumen(cliente, usuario)
+    print(f"Resumen inicial: {resumen}")
+    assert [(r["year_month"], r["total"], r["cantidad"]) for r in resumen] == [("2030-01", 150, 2), ("2030-02", 70, 1)]
+    assert resumen[0]["category_name"] == "Comida" and resumen[0]["account_name"] == "Principal"
+
+    # Mover una transacción de mes traslada su aporte
+    cliente.put(f"/transacciones/{ids[1]}", json={"date": "2030-02-10T10:00:00", "amount": 30}, headers=usuario["headers"])
+    resumen = _resumen(cliente, usuario, desde="2030-02", hasta="2030-02")
+    assert [(r["year_month"], r["total"], r["cantidad"]) for r in resumen] == [("2030-02", 100, 2)]
+
+    # Al quedar sin transacciones la fila del mes se borra, no queda en cantidad 0
+    cliente.delete(f"/transacciones/{ids[0]}", headers=usuario["headers"])
+    assert _filas_resumen(user_id=usuario["user_id"], year_month="2030-01") == 0
+    assert [r["year_month"] for r in _resumen(cliente, usuario)] == ["2030-02"]
+    assert _resumen(cliente, usuario, type="ingreso") == []
+
+
+def test_reconstruir_resumenes_coincide_con_el_incremental(cliente, usuario_nuevo, crear_transaccion):
+    usuario = usuario_nuevo()
+    for monto, fecha in [(10, "2030-03-01T08:00:00"), (20, "2030-03-15T08:00:00"), (5, "2030-04-01T08:00:00")]:
+        crear_transaccion(usuario, monto, fecha=fecha)
+    incremental = _resumen(cliente, usuario)
+
+    db = SessionLocal()
+    assert reconstruir_resumenes(db, user_id=usuario["user_id"]) == 2
+    db.close()
+    assert _resumen(cliente, usuario) == incremental
+
+
+@pytest.mark.parametrize("recurso", ["categorias", "cuentas"])
+def test_eliminar_categoria_o_cuenta_tras_borrar_sus_transacciones(
+    cliente, usuario_nuevo, crear_transaccion, claves_foraneas, recurso
+):
+    usuario = usuario_nuevo()
+    transaccion = crear_transaccion(usuario, 25)
+    assert cliente.delete(f"/transacciones/{transaccion}", headers=usuario["headers"]).status_code == 200
+
+    recurso_id = usuario["categoria"] if recurso == "categorias" else usuario["cuenta"]
+    respuesta = cliente.delete(f"/{recurso}/{recurso_id}", headers=usuario["headers"])
+    logger.info("Eliminar %s: %s", recurso, respuesta.json())
+    print(f"Eliminar {recurso}: {respuesta.json()}")
+    assert respuesta.status_code == 200
+    assert _filas_resumen(user_id=usuario["user_id"]) == 0
@@ -0,0 +1,99 @@
+import logging
+from datetime import date
+from database import SessionLocal
+from models import Cuenta
+from utils.saldos import reconstruir_saldos, saldo_en_fecha
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SALDO_INICIAL = 1000
+DIAS = [date(2024, 1, d) for d in (1, 4, 5, 8, 10, 15, 20, 31)] + [date.today()]
+
+
+def _esperado(movimientos: dict[int, tuple[date, float]], dia: date) -> float:
+    """Saldo al cierre de `dia` calculado a mano desde los movimientos vigentes."""
+    return SALDO_INICIAL + sum(delta for fecha, delta in movimientos.values() if fecha <= dia)
+
+
+def _saldo(cliente, usuario, dia: date) -> float:
+    respuesta = cliente.get(f"/cuentas/{usuario['cuenta']}/saldo", params={"fecha": dia.isoformat()},
+                            headers=usuario["headers"])
+    assert respuesta.status_code == 200
+    return respuesta.json()["saldo"]
+
+
+def _verificar(cliente, usuario, movimientos):
+    obtenidos = {dia: _saldo(cliente, usuario, dia) for dia in DIAS}
+    esperados = {dia: _esperado(movimientos, dia) for dia in DIAS}
+    logger.info("Saldos: %s", obtenidos)
+    assert obtenidos == esperados
+    assert cliente.get(f"/cuentas/{usuario['cuenta']}", headers=usuario["headers"]).json()["amount"] == esperados[date.today()]
+
+
+def _al_mediodia(dia: date) -> str:
+    return f"{dia.isoformat()}T12:00:00"
+
+
+def test_saldo_en_fecha_con_altas_ediciones_y_bajas_con_fecha_pasada(cliente, usuario_nuevo, crear_transaccion):
+    # Cuenta sin checkpoints previos (como las creadas antes de la tabla)
+    usuario = usuario_nuevo(saldo=SALDO_INICIAL)
+    movimientos = {}
+    gasto = crear_transaccion(usuario, 100, "gasto", _al_mediodia(date(2024, 1, 10)))
+    movimientos[gasto] = (date(2024, 1, 10), -100)
+    ingreso = crear_transaccion(usuario, 500, "ingreso", _al_mediodia(date(2024, 1, 20)))
+    movimientos[ingreso] = (date(2024, 1, 20), 500)
+    # Anterior a todos los checkpoints existentes
+    viejo = crear_transaccion(usuario, 50, "gasto", _al_mediodia(date(2024, 1, 5)))
+    movimientos[viejo] = (date(2024, 1, 5), -50)
+    _verificar(cliente, usuario, movimientos)
+
+    # Mover el ingreso a una fecha anterior y cambiar el monto
+    cliente.put(f"/transacciones/{ingreso}", json={"date": "2024-01-08T09:00:00", "amount": 300},
+                headers=usuario["headers"])
+    movimientos[ingreso] = (date(2024, 1, 8), 300)
+    _verificar(cliente, usuario, movimientos)
+
+    cliente.delete(f"/transacciones/{viejo}", headers=usuario["headers"])
+    del movimientos[viejo]
+    _verificar(cliente, usuario, movimientos)
+
+    serie = cliente.get(f"/cuentas/{usuario['cuenta']}/saldos", params={"desde": "2024-01-01", "hasta": "2024-01-31"},
+                        headers=usuario["headers"]).json()
+    print(f"Serie: {serie}")
+    assert serie[0] == {"fecha": "2024-01-01", "saldo": SALDO_INICIAL}
+    puntos = {p["fecha"]: p["saldo"] for p in serie}
+    assert puntos["2024-01-08"] == 1300
+    assert puntos["2024-01-10"] == 1200
+    assert all(p["saldo"] == _esperado(movimientos, date.fromisoformat(p["fecha"])) for p in serie)
+
+    assert cliente.get(f"/cuentas/{usuario['cuenta']}/saldos", params={"desde": "2024-02-01", "hasta": "2024-01-01"},
+                       headers=usuario["headers"]).status_code == 400
+
+
+def test_reconstruir_saldos_coincide_con_el_incremental(cliente, usuario_nuevo, crear_transaccion):
+    usuario = usuario_nuevo(saldo=SALDO_INICIAL)
+    movimientos = {}
+    for tipo, monto, dia in [("gasto", 80, date(2024, 1, 4)), ("ingreso", 40, date(2024, 1, 15)),
+                             ("gasto", 30, date(2024, 1, 15)), ("gasto", 5, date.today())]:
+        movimientos[crear_transaccion(usuario, monto, tipo, _al_mediodia(dia))] = (dia, monto if tipo == "ingreso" else -monto)
+    incremental = {dia: _saldo(cliente, usuario, dia) for dia in DIAS}
+
+    db = SessionLocal()
+    assert reconstruir_saldos(db, account_id=usuario["cuenta"]) == 3
+    reconstruido = {dia: saldo_en_fecha(db, usuario["cuenta"], dia) for dia in DIAS}
+    actual = db.get(Cuenta, usuario["cuenta"]).amount
+    db.close()
+    print(f"Incremental: {incremental}\nReconstruido: {reconstruido}")
+    assert reconstruido == incremental
+    assert reconstruido[date.today()] == actual == _esperado(movimientos, date.today())
+
+
+def test_null_explicito_en_campos_obligatorios_responde_422(cliente, usuario_nuevo, crear_transaccion):
+    usuario = usuario_nuevo(saldo=SALDO_INICIAL)
+    gasto = crear_transaccion(usuario, 100, "gasto", _al_mediodia(date(2024, 1, 10)))
+    for campo in ("date", "amount", "account_id"):
+        respuesta = cliente.put(f"/transacciones/{gasto}", json={campo: None, "note": "x"}, headers=usuario["headers"])
+        assert respuesta.status_code == 422, respuesta.text
+    # Nada cambió: ni la transacción, ni el saldo, ni los checkpoints
+    _verificar(cliente, usuario, {gasto: (date(2024, 1, 10), -100)})
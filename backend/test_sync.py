@@ -0,0 +1,70 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from database import SessionLocal
+from models import Transaccion
+from routers import sync
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _cambios(cliente, usuario, since: str | None = None) -> dict:
+    params = {"since": since} if since else {}
+    respuesta = cliente.get("/sync/changes", params=params, headers=usuario["headers"])
+    assert respuesta.status_code == 200
+    return respuesta.json()
+
+
+def test_sync_delta_con_tombstones(cliente, usuario_nuevo, crear_transaccion, monkeypatch):
+    monkeypatch.setattr(sync, "SYNC_MARGEN", timedelta(0))
+    usuario = usuario_nuevo()
+    borrada = crear_transaccion(usuario, 10)
+    editada = crear_transaccion(usuario, 20)
+
+    completo = _cambios(cliente, usuario)
+    assert sorted(t["id"] for t in completo["transacciones"]) == sorted([borrada, editada])
+    assert [c["id"] for c in completo["cuentas"]] == [usuario["cuenta"]]
+    assert completo["eliminados"] == {"cuentas": [], "categorias": [], "transacciones": []}
+
+    # Cambios posteriores al cursor: edición, alta y bajas (transacción y categoría)
+    cliente.put(f"/transacciones/{editada}", json={"amount": 25}, headers=usuario["headers"])
+    nueva = crear_transaccion(usuario, 30)
+    cliente.delete(f"/transacciones/{borrada}", headers=usuario["headers"])
+    categoria = cliente.post("/categorias/", json={"name": "Temporal", "type": "gasto"}, headers=usuario["headers"]).json()
+    cliente.delete(f"/categorias/{categoria['id']}", headers=usuario["headers"])
+
+    delta = _cambios(cliente, usuario, completo["cursor"])
+    logger.info("Delta: %s", delta)
+    print(f"Delta: {delta}")
+    assert sorted(t["id"] for t in delta["transacciones"]) == sorted([editada, nueva])
+    assert delta["eliminados"]["transacciones"] == [borrada]
+    assert delta["eliminados"]["categorias"] == [categoria["id"]]
+    assert delta["categorias"] == []
+
+    # Nada nuevo desde el último cursor
+    vacio = _cambios(cliente, usuario, delta["cursor"])
+    assert vacio["transacciones"] == [] and vacio["cuentas"] == []
+    assert vacio["eliminados"] == {"cuentas": [], "categorias": [], "transacciones": []}
+
+
+def test_sync_since_con_offset_se_convierte_a_utc(cliente, usuario_nuevo, crear_transaccion, monkeypatch):
+    monkeypatch.setattr(sync, "SYNC_MARGEN", timedelta(0))
+    usuario = usuario_nuevo()
+    transaccion = crear_transaccion(usuario, 10)
+    db = SessionLocal()
+    modificada = db.get(Transaccion, transaccion).updated_at  # UTC sin zona
+    db.close()
+
+    # El mismo instante, un minuto antes del cambio, expresado en UTC-4 y en UTC+5:30
+    antes = (modificada - timedelta(minutes=1)).replace(tzinfo=timezone.utc)
+    for zona in (timezone(timedelta(hours=-4)), timezone(timedelta(hours=5, minutes=30))):
+        since = antes.astimezone(zona).isoformat()
+        ids = [t["id"] for t in _cambios(cliente, usuario, since)["transacciones"]]
+        print(f"since={since}: {ids}")
+        assert ids == [transaccion]
+
+    # Un minuto después del cambio, con offset: ya no aparece
+    despues = (modificada + timedelta(minutes=1)).replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=-4)))
+    assert _cambios(cliente, usuario, despues.isoformat())["transacciones"] == []
+    # Sin zona se interpreta en UTC
+    assert [t["id"] for t in _cambios(cliente, usuario, antes.replace(tzinfo=None).isoformat())["transacciones"]] == [transaccion]
@@ -0,0 +1,120 @@
+import logging
+from contextlib import contextmanager
+from sqlalchemy import event
+from database import SessionLocal, engine
+from models import Transaccion
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def _updates_de_saldo():
+    """Cuenta los UPDATE sobre `cuentas` que ejecuta el engine mientras dura el bloque."""
+    sentencias = []
+
+    def registrar(conexion, cursor, sql, parametros, contexto, multiples):
+        if sql.lstrip().upper().startswith("UPDATE CUENTAS"):
+            sentencias.append(sql)
+
+    event.listen(engine, "before_cursor_execute", registrar)
+    try:
+        yield sentencias
+    finally:
+        event.remove(engine, "before_cursor_execute", registrar)
+
+
+def _saldo(cliente, usuario, cuenta_id) -> float:
+    return cliente.get(f"/cuentas/{cuenta_id}", headers=usuario["headers"]).json()["amount"]
+
+
+def _lote(cliente, usuario, items):
+    respuesta = cliente.post("/transacciones/lote", json={"transacciones": items}, headers=usuario["headers"])
+    assert respuesta.status_code == 200
+    return respuesta.json()["resultados"]
+
+
+def _item(usuario, clave, monto, tipo="gasto", cuenta=None, categoria=None, fecha="2030-06-01T12:00:00"):
+    return {
+        "idempotency_key": clave, "account_id": cuenta or usuario["cuenta"],
+        "category_id": categoria or usuario["categoria"], "amount": monto, "type": tipo, "date": fecha,
+    }
+
+
+def test_lote_un_solo_ajuste_neto_por_cuenta(cliente, usuario_nuevo):
+    usuario = usuario_nuevo(saldo=1000)
+    otra = cliente.post("/cuentas/", json={"name": "Efectivo", "type": "efectivo", "amount": 500},
+                        headers=usuario["headers"]).json()["id"]
+    items = [
+        _item(usuario, "a1", 100),
+        _item(usuario, "a2", 40, fecha="2030-06-02T12:00:00"),
+        _item(usuario, "a3", 300, tipo="ingreso"),
+        _item(usuario, "b1", 50, cuenta=otra),
+        _item(usuario, "b2", 25, cuenta=otra),
+    ]
+    with _updates_de_saldo() as updates:
+        resultados = _lote(cliente, usuario, items)
+    logger.info("Resultados: %s", resultados)
+    print(f"Resultados: {resultados}, UPDATE de saldo: {len(updates)}")
+
+    assert [r["status"] for r in resultados] == ["creada"] * 5
+    assert len(updates) == 2  # uno por cuenta, no uno por transacción
+    assert _saldo(cliente, usuario, usuario["cuenta"]) == 1000 - 100 - 40 + 300
+    assert _saldo(cliente, usuario, otra) == 500 - 75
+
+
+def test_lote_repetido_no_vuelve_a_escribir(cliente, usuario_nuevo):
+    usuario = usuario_nuevo(saldo=1000)
+    items = [_item(usuario, "r1", 100), _item(usuario, "r2", 200)]
+    primero = _lote(cliente, usuario, items)
+
+    # La app reintenta el mismo lote (p. ej. se perdió la respuesta)
+    with _updates_de_saldo() as updates:
+        segundo = _lote(cliente, usuario, items)
+    print(f"Primero: {primero}, segundo: {segundo}")
+
+    assert [r["status"] for r in segundo] == ["duplicada", "duplicada"]
+    assert [r["id"] for r in segundo] == [r["id"] for r in primero]
+    assert updates == []
+    assert _saldo(cliente, usuario, usuario["cuenta"]) == 700
+    db = SessionLocal()
+    assert db.query(Transaccion).filter(Transaccion.user_id == usuario["user_id"]).count() == 2
+    db.close()
+
+    # Una clave repetida dentro del mismo lote se guarda una sola vez
+    resultados = _lote(cliente, usuario, [_item(usuario, "r3", 10), _item(usuario, "r3", 10)])
+    assert [r["status"] for r in resultados] == ["creada", "duplicada"]
+    assert _saldo(cliente, usuario, usuario["cuenta"]) == 690
+
+
+def test_lote_rechaza_items_invalidos_y_aplica_el_resto(cliente, usuario_nuevo):
+    usuario = usuario_nuevo(saldo=1000)
+    ajeno = usuario_nuevo(saldo=1000)
+    pobre = cliente.post("/cuentas/", json={"name": "Sin fondos", "type": "banco", "amount": 10},
+                         headers=usuario["headers"]).json()["id"]
+    items = [
+        _item(usuario, "ok1", 100),
+        _item(usuario, "cuenta-ajena", 100, cuenta=ajeno["cuenta"]),
+        _item(usuario, "categoria-ajena", 100, categoria=ajeno["categoria"]),
+        _item(usuario, "sin-fondos-1", 8, cuenta=pobre),
+        _item(usuario, "sin-fondos-2", 8, cuenta=pobre),
+        _item(usuario, "ok2", 50, tipo="ingreso"),
+    ]
+    resultados = _lote(cliente, usuario, items)
+    logger.info("Resultados: %s", resultados)
+    print(f"Resultados: {resultados}")
+
+    estados = {r["idempotency_key"]: (r["status"], r["detail"]) for r in resultados}
+    assert estados["ok1"][0] == estados["ok2"][0] == "creada"
+    assert estados["cuenta-ajena"] == ("rechazada", "Cuenta no encontrada")
+    assert estados["categoria-ajena"] == ("rechazada", "Categoría no encontrada")
+    # El neto de la cuenta no alcanza: se rechazan todas sus transacciones del lote
+    assert estados["sin-fondos-1"] == estados["sin-fondos-2"] == ("rechazada", "Fondos insuficientes")
+
+    assert _saldo(cliente, usuario, usuario["cuenta"]) == 1000 - 100 + 50
+    assert _saldo(cliente, usuario, pobre) == 10
+    assert _saldo(cliente, ajeno, ajeno["cuenta"]) == 1000
+    db = SessionLocal()
+    guardadas = {t.idempotency_key for t in db.query(Transaccion).filter(Transaccion.user_id == usuario["user_id"])}
+    db.close()
+    assert guardadas == {"ok1", "ok2"}
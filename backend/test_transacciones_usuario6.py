@@ -9,21 +9,17 @@ client = TestClient(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-USER_EMAIL = "admin@admin.com"  # Cambia por el email real del user_id=6
-USER_PASSWORD = "Admin12345"    # Cambia por la contraseña real
-
-CUENTA_ID = 1  # Cuenta de ahorro, user_id=6
-CUENTA_INGRESOS_ID = 4  # Cuenta ingresos, user_id=6
-CATEGORIA_ENTRETENIMIENTO = 3  # Gasto
-CATEGORIA_PAGO_TRABAJO = 4     # Ingreso
-
+# Usuario, cuentas y categorías vienen de la base local sembrada en conftest.py
 @pytest.fixture
-def auth_header():
-    response = client.post("/usuarios/login", data={"username": USER_EMAIL, "password": USER_PASSWORD})
+def auth_header(datos_prueba):
+    response = client.post(
+        "/usuarios/login",
+        data={"username": datos_prueba["email"], "password": datos_prueba["password"]}
+    )
     assert response.status_code == 200
     token = response.json()["access_token"]
-    logger.info("Login exitoso para usuario %s", USER_EMAIL)
-    print(f"Login exitoso para usuario {USER_EMAIL}")
+    logger.info("Login exitoso para usuario %s", datos_prueba["email"])
+    print(f"Login exitoso para usuario {datos_prueba['email']}")
     return {"Authorization": f"Bearer {token}"}
 
 # def test_gasto_y_actualizacion(auth_header):
@@ -147,9 +143,12 @@ def auth_header():
 #     logger.info("FIN: Test de fondos insuficientes")
 #     print("FIN: Test de fondos insuficientes")
 
-def test_cambio_de_cuenta(auth_header):
+def test_cambio_de_cuenta(auth_header, datos_prueba):
     logger.info("INICIO: Test de cambio de cuenta")
     print("INICIO: Test de cambio de cuenta")
+    CUENTA_ID = datos_prueba["cuenta_ahorro"]
+    CUENTA_INGRESOS_ID = datos_prueba["cuenta_ingresos"]
+    CATEGORIA_ENTRETENIMIENTO = datos_prueba["categoria_gasto"]
 
     # Obtener saldos iniciales
     cuenta_ahorro = client.get(f"/cuentas/{CUENTA_ID}", headers=auth_header).json()
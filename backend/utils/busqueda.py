@@ -0,0 +1,149 @@
+"""
+Búsqueda de texto sobre `Transaccion.note` y `Transaccion.lugar`.
+
+Según el motor de base de datos:
+  - SQL Server: CONTAINS sobre el índice full-text (catálogo sin acentos).
+  - PostgreSQL: to_tsvector/to_tsquery sobre un índice GIN con unaccent.
+  - Otros (SQLite en pruebas): índice invertido en memoria por usuario,
+    reconstruido cuando cambia la versión de sus transacciones.
+
+En los tres casos la búsqueda es por prefijo de cada término (todos deben
+aparecer) y no distingue mayúsculas ni acentos. `crear_indice_busqueda` crea
+los índices del motor correspondiente.
+"""
+import bisect
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from models import Transaccion
+from utils.etag import version_coleccion
+
+# Usuarios cuyo índice en memoria se conserva a la vez
+INDICE_MAXIMO_USUARIOS = 64
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin acentos: 'Café Él' -> 'cafe el'."""
+    descompuesto = unicodedata.normalize("NFKD", texto or "")
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def tokenizar(texto: str) -> list[str]:
+    return re.findall(r"\w+", normalizar(texto))
+
+
+class IndiceInvertido:
+    """Índice término -> ids de transacciones, con búsqueda por prefijo."""
+
+    def __init__(self, filas):
+        self.postings: dict[str, set[int]] = {}
+        for transaccion_id, note, lugar in filas:
+            for termino in set(tokenizar(f"{note or ''} {lugar or ''}")):
+                self.postings.setdefault(termino, set()).add(transaccion_id)
+        self.terminos = sorted(self.postings)
+
+    def _por_prefijo(self, prefijo: str) -> set[int]:
+        ids: set[int] = set()
+        inicio = bisect.bisect_left(self.terminos, prefijo)
+        for termino in self.terminos[inicio:]:
+            if not termino.startswith(prefijo):
+                break
+            ids |= self.postings[termino]
+        return ids
+
+    def buscar(self, terminos: list[str]) -> set[int]:
+        resultado: set[int] | None = None
+        for termino in terminos:
+            ids = self._por_prefijo(termino)
+            resultado = ids if resultado is None else resultado & ids
+            if not resultado:
+                return set()
+        return resultado or set()
+
+
+_indices: "OrderedDict[int, tuple[str, IndiceInvertido]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _indice_usuario(db: Session, user_id: int) -> IndiceInvertido:
+    version = version_coleccion(db, Transaccion, user_id)
+    with _lock:
+        guardado = _indices.get(user_id)
+        if guardado and guardado[0] == version:
+            _indices.move_to_end(user_id)
+            return guardado[1]
+    filas = db.query(Transaccion.id, Transaccion.note, Transaccion.lugar).filter(
+        Transaccion.user_id == user_id
+    ).yield_per(1000)
+    indice = IndiceInvertido(filas)
+    with _lock:
+        _indices[user_id] = (version, indice)
+        _indices.move_to_end(user_id)
+        while len(_indices) > INDICE_MAXIMO_USUARIOS:
+            _indices.popitem(last=False)
+    return indice
+
+
+def condicion_busqueda(db: Session, user_id: int, consulta: str):
+    """
+    Condición SQL que limita `transacciones` a las que coinciden con la
+    consulta. Retorna None si la consulta no tiene términos.
+    """
+    terminos = tokenizar(consulta)
+    if not terminos:
+        return None
+
+    dialecto = db.get_bind().dialect.name
+    if dialecto == "mssql":
+        expresion = " AND ".join(f'"{t}*"' for t in terminos)
+        return text("CONTAINS((transacciones.note, transacciones.lugar), :consulta_fts)").bindparams(
+            consulta_fts=expresion
+        )
+    if dialecto == "postgresql":
+        expresion = " & ".join(f"{t}:*" for t in terminos)
+        return text(
+            "to_tsvector('simple', f_unaccent(coalesce(transacciones.note, '') || ' ' || "
+            "coalesce(transacciones.lugar, ''))) @@ to_tsquery('simple', :consulta_fts)"
+        ).bindparams(consulta_fts=expresion)
+
+    ids = _indice_usuario(db, user_id).buscar(terminos)
+    return Transaccion.id.in_(ids)
+
+
+def crear_indice_busqueda(conexion) -> None:
+    """
+    Crea el índice full-text del motor actual (no aplica a SQLite).
+    En SQL Server la conexión debe estar en autocommit: el DDL full-text no
+    se puede ejecutar dentro de una transacción.
+    """
+    dialecto = conexion.dialect.name
+    if dialecto == "mssql":
+        conexion.execute(text(
+            "IF NOT EXISTS (SELECT 1 FROM sys.fulltext_catalogs WHERE name = 'ft_chreosis') "
+            "CREATE FULLTEXT CATALOG ft_chreosis WITH ACCENT_SENSITIVITY = OFF"
+        ))
+        conexion.execute(text(
+            "IF NOT EXISTS (SELECT 1 FROM sys.fulltext_indexes WHERE object_id = OBJECT_ID('transacciones')) "
+            "CREATE FULLTEXT INDEX ON transacciones (note LANGUAGE 3082, lugar LANGUAGE 3082) "
+            "KEY INDEX " + _nombre_pk_mssql(conexion) + " ON ft_chreosis WITH CHANGE_TRACKING AUTO"
+        ))
+    elif dialecto == "postgresql":
+        conexion.execute(text("CREATE EXTENSION IF NOT EXISTS unaccent"))
+        conexion.execute(text(
+            "CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS "
+            "$$ SELECT public.unaccent('public.unaccent', $1) $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT"
+        ))
+        conexion.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_transacciones_busqueda ON transacciones USING GIN ("
+            "to_tsvector('simple', f_unaccent(coalesce(note, '') || ' ' || coalesce(lugar, ''))))"
+        ))
+
+
+def _nombre_pk_mssql(conexion) -> str:
+    return conexion.execute(text(
+        "SELECT name FROM sys.key_constraints "
+        "WHERE type = 'PK' AND parent_object_id = OBJECT_ID('transacciones')"
+    )).scalar_one()
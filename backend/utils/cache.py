@@ -0,0 +1,75 @@
+"""
+Cache en memoria acotado (LRU) con expiración por entrada (TTL).
+Es por proceso: cada worker de uvicorn tiene el suyo.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class CacheTTL:
+    def __init__(self, maximo: int, ttl: float):
+        """
+        - maximo: número máximo de entradas; al superarlo se descarta la menos usada.
+        - ttl: segundos de vida por defecto de cada entrada.
+        """
+        self.maximo = maximo
+        self.ttl = ttl
+        self._datos: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, clave: Hashable) -> Optional[Any]:
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None or entrada[0] <= ahora:
+                if entrada is not None:
+                    del self._datos[clave]
+                self.misses += 1
+                return None
+            self._datos.move_to_end(clave)
+            self.hits += 1
+            return entrada[1]
+
+    def set(self, clave: Hashable, valor: Any, ttl: Optional[float] = None) -> None:
+        vida = self.ttl if ttl is None else min(ttl, self.ttl)
+        if vida <= 0:
+            return
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + vida, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, clave: Hashable) -> None:
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def delete_where(self, condicion: Callable[[Hashable, Any], bool]) -> int:
+        """Elimina las entradas que cumplen `condicion(clave, valor)`. Retorna cuántas."""
+        with self._lock:
+            claves = [c for c, (_, v) in self._datos.items() if condicion(c, v)]
+            for clave in claves:
+                del self._datos[clave]
+        return len(claves)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._datos.clear()
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._datos),
+                "max_size": self.maximo,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
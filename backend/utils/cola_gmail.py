@@ -0,0 +1,277 @@
+"""
+Cola persistente (en la base de datos) de las notificaciones push de Gmail.
+
+/gmail/notifications solo encola el push y responde; las tareas de este
+módulo, iniciadas en el lifespan de la app, procesan la cola en segundo plano:
+- GMAIL_WORKERS notificaciones a la vez como máximo (0 = este proceso no procesa).
+- En orden por cuenta de Gmail: solo se toma la notificación más vieja de cada
+  email y nunca dos del mismo email a la vez, tampoco entre procesos.
+- Reintentos con backoff exponencial; tras GMAIL_MAX_INTENTOS la notificación
+  pasa a notificaciones_gmail_fallidas (dead letter).
+- Una notificación tomada por un proceso que murió vuelve a la cola pasados
+  GMAIL_VISIBILIDAD segundos.
+"""
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from contextlib import suppress
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from sqlalchemy import delete, exists, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
+
+from database import sesion_async
+from models import NotificacionGmail, NotificacionGmailFallida
+
+GMAIL_WORKERS = int(os.getenv("GMAIL_WORKERS", "4"))
+GMAIL_MAX_INTENTOS = int(os.getenv("GMAIL_MAX_INTENTOS", "5"))
+GMAIL_BACKOFF_BASE = float(os.getenv("GMAIL_BACKOFF_BASE", "2"))
+GMAIL_BACKOFF_MAXIMO = float(os.getenv("GMAIL_BACKOFF_MAXIMO", "300"))
+GMAIL_POLL_INTERVALO = float(os.getenv("GMAIL_POLL_INTERVALO", "1"))
+GMAIL_VISIBILIDAD = float(os.getenv("GMAIL_VISIBILIDAD", "300"))
+
+# procesar(db, email, history_id): lanza una excepción si hay que reintentar
+Procesador = Callable[[AsyncSession, str | None, str], Awaitable[None]]
+
+
+@dataclass
+class _Tomada:
+    id: int
+    email: str | None
+    history_id: str
+    intentos: int
+    created_at: datetime
+
+
+def _resumen(valores) -> dict:
+    """Cantidad, promedio, p50, p95 y máximo (en segundos) de una muestra."""
+    if not valores:
+        return {"n": 0}
+    orden = sorted(valores)
+    return {
+        "n": len(orden),
+        "promedio": round(sum(orden) / len(orden), 3),
+        "p50": round(orden[len(orden) // 2], 3),
+        "p95": round(orden[max(int(len(orden) * 0.95) - 1, 0)], 3),
+        "maximo": round(orden[-1], 3),
+    }
+
+
+def backoff(intentos: int) -> float:
+    """Segundos hasta el siguiente intento (exponencial, con jitter, acotado)."""
+    espera = min(GMAIL_BACKOFF_BASE * 2 ** (intentos - 1), GMAIL_BACKOFF_MAXIMO)
+    return espera * random.uniform(0.75, 1.25)
+
+
+class ColaGmail:
+    def __init__(self, workers: int = GMAIL_WORKERS):
+        self.workers = workers
+        self._procesar: Procesador | None = None
+        self._despachador: asyncio.Task | None = None
+        self._tareas: set[asyncio.Task] = set()
+        self._aviso: asyncio.Event | None = None
+        self.procesadas = 0
+        self.reintentos = 0
+        self.fallidas = 0
+        # Últimas 1000 muestras: desde que se encoló hasta terminar, y solo el procesamiento
+        self._latencias = deque(maxlen=1000)
+        self._duraciones = deque(maxlen=1000)
+
+    async def encolar(self, db: AsyncSession, email: str | None, history_id) -> int:
+        """Guarda la notificación (commit incluido) y avisa a los workers del proceso."""
+        notificacion = NotificacionGmail(email=email, history_id=str(history_id))
+        db.add(notificacion)
+        await db.commit()
+        if self._aviso is not None:
+            self._aviso.set()
+        return notificacion.id
+
+    def iniciar(self, procesar: Procesador) -> None:
+        """Arranca el despachador en el event loop actual (desde el lifespan)."""
+        if self.workers <= 0 or self._despachador is not None:
+            return
+        self._procesar = procesar
+        self._aviso = asyncio.Event()
+        self._despachador = asyncio.create_task(self._despachar())
+
+    async def detener(self, espera: float = 10) -> None:
+        """
+        Deja de tomar notificaciones y espera hasta `espera` segundos a las que
+        están en curso; las que no terminan vuelven a la cola por visibilidad.
+        """
+        if self._despachador is None:
+            return
+        self._despachador.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._despachador
+        self._despachador = None
+        if self._tareas:
+            _, pendientes = await asyncio.wait(self._tareas, timeout=espera)
+            for tarea in pendientes:
+                tarea.cancel()
+
+    async def _despachar(self) -> None:
+        while True:
+            self._aviso.clear()
+            try:
+                await self._recuperar_abandonadas()
+                tomadas = await self._tomar(self.workers - len(self._tareas))
+            except Exception as e:
+                print(f"❌ Error leyendo la cola de notificaciones de Gmail: {e}")
+                tomadas = []
+            for notificacion in tomadas:
+                tarea = asyncio.create_task(self._ejecutar(notificacion))
+                self._tareas.add(tarea)
+                tarea.add_done_callback(self._fin_tarea)
+            # Despierta con un encolado de este proceso, al liberarse un worker o por sondeo
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._aviso.wait(), GMAIL_POLL_INTERVALO)
+
+    def _fin_tarea(self, tarea: asyncio.Task) -> None:
+        self._tareas.discard(tarea)
+        if self._aviso is not None:
+            self._aviso.set()
+
+    async def _recuperar_abandonadas(self) -> None:
+        limite = datetime.utcnow() - timedelta(seconds=GMAIL_VISIBILIDAD)
+        async with sesion_async() as db:
+            await db.execute(
+                update(NotificacionGmail)
+                .where(NotificacionGmail.estado == "procesando", NotificacionGmail.tomado_en < limite)
+                .values(estado="pendiente", tomado_en=None)
+            )
+            await db.commit()
+
+    async def _tomar(self, maximo: int) -> list[_Tomada]:
+        """
+        Marca como 'procesando' hasta `maximo` notificaciones listas que sean
+        las más viejas de su email. El UPDATE condicionado al estado hace que
+        solo un proceso se quede con cada una.
+        """
+        if maximo <= 0:
+            return []
+        ahora = datetime.utcnow()
+        anterior = aliased(NotificacionGmail)
+        async with sesion_async() as db:
+            candidatas = (await db.execute(
+                select(
+                    NotificacionGmail.id, NotificacionGmail.email, NotificacionGmail.history_id,
+                    NotificacionGmail.intentos, NotificacionGmail.created_at
+                )
+                .where(NotificacionGmail.estado == "pendiente", NotificacionGmail.disponible_en <= ahora)
+                .where(~exists().where(anterior.email == NotificacionGmail.email, anterior.id < NotificacionGmail.id))
+                .order_by(NotificacionGmail.id)
+                .limit(maximo)
+            )).all()
+            tomadas = []
+            for c in candidatas:
+                resultado = await db.execute(
+                    update(NotificacionGmail)
+                    .where(NotificacionGmail.id == c.id, NotificacionGmail.estado == "pendiente")
+                    .values(estado="procesando", tomado_en=ahora, intentos=NotificacionGmail.intentos + 1)
+                )
+                if resultado.rowcount == 1:
+                    tomadas.append(_Tomada(c.id, c.email, c.history_id, c.intentos + 1, c.created_at))
+            await db.commit()
+        return tomadas
+
+    async def _ejecutar(self, notificacion: _Tomada) -> None:
+        inicio = time.monotonic()
+        try:
+            async with sesion_async() as db:
+                # Las notificaciones del mismo email encoladas hasta ahora quedan
+                # cubiertas por este procesamiento (lee el historial desde el checkpoint)
+                hasta_id = notificacion.id
+                if notificacion.email is not None:
+                    hasta_id = (await db.execute(
+                        select(func.max(NotificacionGmail.id)).where(NotificacionGmail.email == notificacion.email)
+                    )).scalar()
+                await self._procesar(db, notificacion.email, notificacion.history_id)
+            await self._completar(notificacion, hasta_id)
+            self.procesadas += 1
+            self._latencias.append((datetime.utcnow() - notificacion.created_at).total_seconds())
+        except Exception as e:
+            print(f"❌ Error procesando la notificación {notificacion.id} (intento {notificacion.intentos}): {e}")
+            try:
+                await self._reintentar_o_descartar(notificacion, e)
+            except Exception as e2:
+                # Queda 'procesando' y se retoma al vencer GMAIL_VISIBILIDAD
+                print(f"❌ No se pudo reprogramar la notificación {notificacion.id}: {e2}")
+        finally:
+            self._duraciones.append(time.monotonic() - inicio)
+
+    async def _completar(self, notificacion: _Tomada, hasta_id: int) -> None:
+        async with sesion_async() as db:
+            consulta = delete(NotificacionGmail).where(NotificacionGmail.id == notificacion.id)
+            if notificacion.email is not None:
+                consulta = delete(NotificacionGmail).where(
+                    NotificacionGmail.email == notificacion.email, NotificacionGmail.id <= hasta_id
+                )
+            await db.execute(consulta)
+            await db.commit()
+
+    async def _reintentar_o_descartar(self, notificacion: _Tomada, error: Exception) -> None:
+        async with sesion_async() as db:
+            if notificacion.intentos >= GMAIL_MAX_INTENTOS:
+                db.add(NotificacionGmailFallida(
+                    notificacion_id=notificacion.id,
+                    email=notificacion.email,
+                    history_id=notificacion.history_id,
+                    intentos=notificacion.intentos,
+                    error=str(error),
+                    created_at=notificacion.created_at,
+                ))
+                await db.execute(delete(NotificacionGmail).where(NotificacionGmail.id == notificacion.id))
+                self.fallidas += 1
+                print(f"🪦 Notificación {notificacion.id} enviada a dead letter tras {notificacion.intentos} intentos")
+            else:
+                espera = backoff(notificacion.intentos)
+                await db.execute(
+                    update(NotificacionGmail)
+                    .where(NotificacionGmail.id == notificacion.id)
+                    .values(
+                        estado="pendiente",
+                        tomado_en=None,
+                        disponible_en=datetime.utcnow() + timedelta(seconds=espera),
+                        ultimo_error=str(error)[:1000],
+                    )
+                )
+                self.reintentos += 1
+                print(f"🔁 Notificación {notificacion.id} se reintenta en {espera:.1f}s")
+            await db.commit()
+
+    def estadisticas(self) -> dict:
+        """Métricas en memoria de este proceso."""
+        return {
+            "workers": self.workers,
+            "activo": self._despachador is not None,
+            "en_curso": len(self._tareas),
+            "procesadas": self.procesadas,
+            "reintentos": self.reintentos,
+            "fallidas": self.fallidas,
+            "latencia_total": _resumen(self._latencias),
+            "duracion_procesamiento": _resumen(self._duraciones),
+        }
+
+
+def profundidad(db: Session) -> dict:
+    """Tamaño de la cola (compartida por todos los procesos) y del dead letter."""
+    por_estado = dict(
+        db.query(NotificacionGmail.estado, func.count(NotificacionGmail.id))
+        .group_by(NotificacionGmail.estado).all()
+    )
+    mas_vieja = db.query(func.min(NotificacionGmail.created_at)).filter(NotificacionGmail.estado == "pendiente").scalar()
+    return {
+        "pendientes": por_estado.get("pendiente", 0),
+        "procesando": por_estado.get("procesando", 0),
+        "fallidas": db.query(func.count(NotificacionGmailFallida.id)).scalar(),
+        "antiguedad_pendiente": round((datetime.utcnow() - mas_vieja).total_seconds(), 3) if mas_vieja else 0,
+    }
+
+
+cola_gmail = ColaGmail()
@@ -0,0 +1,81 @@
+"""
+Registro de mensajes ya procesados, para descartar duplicados antes de
+llamar a Gmail u OpenAI.
+
+Pub/Sub entrega cada push al menos una vez y dos notificaciones pueden traer
+el mismo mensaje de Gmail. Las claves son `pubsub:<messageId>` (al encolar) y
+`gmail:<email>:<id>` (antes de descargar el mensaje). La tabla
+`mensajes_procesados` es la fuente de verdad compartida por los procesos (la
+restricción UNIQUE sobre `clave` resuelve las carreras); delante hay un
+CacheTTL por proceso que evita la consulta para los duplicados recientes. Las
+filas vencen a los DEDUP_TTL_SEGUNDOS (por defecto 7 días, la retención
+máxima de Pub/Sub) y se purgan cada hora.
+"""
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import MensajeProcesado
+from utils.cache import CacheTTL
+
+DEDUP_TTL_SEGUNDOS = float(os.getenv("DEDUP_TTL_SEGUNDOS", str(7 * 24 * 3600)))
+DEDUP_CACHE_MAX = int(os.getenv("DEDUP_CACHE_MAX", "50000"))
+# Cada cuánto se borran de la tabla las claves vencidas
+DEDUP_PURGA_SEGUNDOS = 3600
+
+
+class RegistroProcesados:
+    def __init__(self, ttl: float = DEDUP_TTL_SEGUNDOS, maximo: int = DEDUP_CACHE_MAX):
+        self.ttl = ttl
+        self.cache = CacheTTL(maximo=maximo, ttl=ttl)
+        self.duplicados = 0
+        self._ultima_purga = time.monotonic()
+
+    async def filtrar_nuevas(self, db: AsyncSession, claves: list[str]) -> list[str]:
+        """
+        Las claves que todavía no se procesaron, en el mismo orden. Las que el
+        cache no conoce se consultan a la BD en una sola consulta.
+        """
+        desconocidas = [c for c in claves if self.cache.get(c) is None]
+        vistas = set(claves) - set(desconocidas)
+        if desconocidas:
+            en_bd = (await db.execute(
+                select(MensajeProcesado.clave).where(
+                    MensajeProcesado.clave.in_(desconocidas),
+                    MensajeProcesado.expira > datetime.utcnow(),
+                )
+            )).scalars().all()
+            for clave in en_bd:
+                self.cache.set(clave, True)
+            vistas.update(en_bd)
+        self.duplicados += len(vistas)
+        return [c for c in claves if c not in vistas]
+
+    def registrar(self, db: AsyncSession, clave: str) -> None:
+        """
+        Agrega la clave a la sesión, sin commit: queda guardada junto con el
+        trabajo que la acompaña. Si otro proceso la guardó antes, el commit
+        lanza IntegrityError.
+        """
+        db.add(MensajeProcesado(clave=clave, expira=datetime.utcnow() + timedelta(seconds=self.ttl)))
+
+    def recordar(self, claves: list[str]) -> None:
+        """Pasa al cache claves ya confirmadas en la BD (después del commit)."""
+        for clave in claves:
+            self.cache.set(clave, True)
+
+    async def purgar(self, db: AsyncSession, forzar: bool = False) -> None:
+        """Borra las claves vencidas, como mucho una vez por DEDUP_PURGA_SEGUNDOS."""
+        ahora = time.monotonic()
+        if not forzar and ahora - self._ultima_purga < DEDUP_PURGA_SEGUNDOS:
+            return
+        self._ultima_purga = ahora
+        await db.execute(delete(MensajeProcesado).where(MensajeProcesado.expira <= datetime.utcnow()))
+        await db.commit()
+
+    def estadisticas(self) -> dict:
+        return {"duplicados_descartados": self.duplicados, "cache": self.cache.estadisticas()}
+
+
+procesados = RegistroProcesados()
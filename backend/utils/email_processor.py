@@ -1,25 +1,45 @@
 from typing import Dict, Optional
-from openai import AsyncOpenAI
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from models import Transaccion, Usuario, Dispositivo
 from datetime import datetime
 import json
 import os
-from dotenv import load_dotenv
+import sys
+from config.entorno import cargar_entorno
+from utils.plantillas_correo import plantillas
 
-# Cargar variables de entorno desde la raíz del proyecto
-dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
-load_dotenv(dotenv_path)
+cargar_entorno()
 
-# Configurar cliente de OpenAI
-client = AsyncOpenAI(
-    api_key=os.getenv("OPENAI_API_KEY")
-)
+_client = None
+
+def _cliente_openai():
+    """Cliente de OpenAI, creado (e importado el SDK) en el primer correo procesado."""
+    global _client
+    if _client is None:
+        from openai import AsyncOpenAI
+        _client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY")
+        )
+    return _client
+
+class GPTNoDisponible(Exception):
+    """OpenAI no respondió (timeout, conexión, 429 o 5xx): el correo se reintenta más tarde."""
+
+def _reintentable(error: Exception) -> bool:
+    # El SDK ya está importado si la llamada llegó a hacerse
+    openai = sys.modules.get("openai")
+    if openai is None:
+        return False
+    if isinstance(error, openai.APIConnectionError):  # incluye APITimeoutError
+        return True
+    return isinstance(error, openai.APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
 
 async def process_email_with_gpt(email_content: str) -> Dict:
     """
     Procesa el contenido del email usando GPT para extraer información relevante.
     Retorna un JSON con la información estructurada.
+    Lanza GPTNoDisponible si OpenAI falló de forma pasajera: el correo no es
+    inválido y la cola de Gmail debe reintentarlo.
     """
     try:
         # Prompt para GPT que explica cómo estructurar la información
@@ -47,7 +67,7 @@ async def process_email_with_gpt(email_content: str) -> Dict:
         """
 
         # Llamada a la API de OpenAI usando el nuevo cliente
-        response = await client.chat.completions.create(
+        response = await _cliente_openai().chat.completions.create(
             model="gpt-4",
             messages=[
                 {"role": "system", "content": "Eres un asistente especializado en extraer información financiera de correos electrónicos."},
@@ -61,6 +81,9 @@ async def process_email_with_gpt(email_content: str) -> Dict:
         return json_response
 
     except Exception as e:
+        if _reintentable(e):
+            print(f"⏳ OpenAI no disponible, se reintentará: {str(e)}")
+            raise GPTNoDisponible(str(e)) from e
         print(f"Error procesando email con GPT: {str(e)}")
         return {
             "Monto": 0,
@@ -72,8 +95,22 @@ async def process_email_with_gpt(email_content: str) -> Dict:
             "Error": str(e)
         }
 
+async def extraer_transaccion(email_content: str, remitente: Optional[str] = None) -> Dict:
+    """
+    Datos de la transacción del correo: primero las plantillas del remitente
+    (utils/plantillas_correo.py, sin red) y, si ninguna lo reconoce, GPT.
+    """
+    transaction_data = plantillas.extraer(email_content, remitente)
+    if transaction_data is not None:
+        print(f"⚡ Correo resuelto con {transaction_data['Origen']}")
+        return transaction_data
+    transaction_data = await process_email_with_gpt(email_content)
+    transaction_data.setdefault("Origen", "gpt")
+    plantillas.registrar_fallback(email_content, remitente, transaction_data)
+    return transaction_data
+
 async def save_transaction_to_db(
-    db: Session,
+    db: AsyncSession,
     transaction_data: Dict,
     dispositivo_id: int,
     category_id: Optional[int] = None
@@ -88,7 +125,7 @@ async def save_transaction_to_db(
             return False
 
         # Obtener el dispositivo para obtener el user_id
-        dispositivo = db.query(Dispositivo).filter(Dispositivo.id == dispositivo_id).first()
+        dispositivo = await db.get(Dispositivo, dispositivo_id)
         if not dispositivo:
             print(f"Dispositivo no encontrado: {dispositivo_id}")
             return False
@@ -109,27 +146,32 @@ async def save_transaction_to_db(
         )
 
         #TODO: ahora no se guarda en la base de datos del server, se guarda en la base de datos de la app, por lo que no se necesita hacer commit
-        # db.add(nueva_transaccion)
-        # db.commit()
+        # Si se vuelve a guardar, dentro de un savepoint: un error deshace solo esta transacción
+        # async with db.begin_nested():
+        #     db.add(nueva_transaccion)
         return True
 
     except Exception as e:
+        # Sin rollback: la sesión es del llamador (el worker de la cola de Gmail);
+        # deshacerla expiraría su GmailToken y las claves de deduplicación pendientes
         print(f"Error guardando transacción en la base de datos: {str(e)}")
-        db.rollback()
         return False
 
 async def process_and_save_email(
-    db: Session,
+    db: AsyncSession,
     email_content: str,
     dispositivo_id: int,
-    category_id: Optional[int] = None
+    category_id: Optional[int] = None,
+    remitente: Optional[str] = None
 ) -> Dict:
     """
     Función principal que coordina el procesamiento del email y el guardado en la base de datos.
+    `remitente` (el From del correo) elige las plantillas que se prueban antes de GPT.
+    Deja pasar GPTNoDisponible para que el correo se reintente.
     """
     try:
-        # Procesar el email con GPT
-        transaction_data = await process_email_with_gpt(email_content)
+        # Extraer los datos (plantilla del banco o, si no hay, GPT)
+        transaction_data = await extraer_transaccion(email_content, remitente)
         
         # Si el status es APROBADA, guardar en la base de datos
         if transaction_data["Status"] == "APROBADA":
@@ -145,6 +187,8 @@ async def process_and_save_email(
         
         return transaction_data
 
+    except GPTNoDisponible:
+        raise
     except Exception as e:
         print(f"Error en el procesamiento del email: {str(e)}")
         return {
@@ -0,0 +1,63 @@
+"""
+GET condicional (ETag / If-None-Match) para los listados por usuario.
+
+La versión de una colección se calcula con `COUNT(*)` y `MAX(updated_at)`
+filtrando por `user_id`, que se resuelven sobre el índice (user_id, updated_at)
+sin leer las filas. Un alta o una edición mueve el máximo y un borrado cambia
+el conteo, así que cualquier cambio produce un ETag distinto.
+
+Uso en un router:
+
+    @router.get("/", dependencies=[Depends(etag_coleccion(Cuenta))])
+"""
+import hashlib
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models import Usuario
+from dependencies import get_usuario_actual, get_db_lectura, UsuarioActual
+
+
+def version_coleccion(db: Session, modelo, user_id: int) -> str:
+    """Marca de agua (conteo y última modificación) de las filas del usuario."""
+    cantidad, ultima = db.query(func.count(), func.max(modelo.updated_at)).filter(
+        modelo.user_id == user_id
+    ).one()
+    return f"{modelo.__tablename__}:{cantidad}:{ultima.isoformat() if ultima else ''}"
+
+
+def calcular_etag(db: Session, user_id: int, modelos, consulta: str = "") -> str:
+    partes = [str(user_id), consulta] + [version_coleccion(db, m, user_id) for m in modelos]
+    return '"' + hashlib.sha1("|".join(partes).encode("utf-8")).hexdigest() + '"'
+
+
+def _coincide(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidatos = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidatos or any(c.removeprefix("W/") == etag for c in candidatos)
+
+
+def etag_coleccion(*modelos):
+    """
+    Crea una dependencia que calcula el ETag de las colecciones indicadas
+    (todas deben tener `user_id` y `updated_at`). Si coincide con el
+    If-None-Match de la petición responde 304 antes de ejecutar el handler;
+    si no, agrega el header ETag a la respuesta.
+
+    El query string forma parte del ETag, porque filtros y cursores cambian
+    el contenido de la respuesta.
+    """
+    def dependencia(
+        request: Request,
+        response: Response,
+        db: Session = Depends(get_db_lectura),
+        current_user: UsuarioActual = Depends(get_usuario_actual)
+    ):
+        etag = calcular_etag(db, current_user.id, modelos, request.url.query)
+        if _coincide(request.headers.get("if-none-match"), etag):
+            raise HTTPException(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "private, no-cache"
+
+    return dependencia
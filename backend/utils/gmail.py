@@ -0,0 +1,288 @@
+"""
+Acceso a la API de Gmail a partir de un GmailToken guardado.
+
+Los SDK de Google se importan en el primer uso: cargarlos cuesta cientos de
+milisegundos y la mayoría de los workers solo atiende el CRUD.
+
+Los servicios se construyen con el documento discovery de Gmail que trae
+google-api-python-client (sin pedirlo por red), parseado una sola vez, y se
+guardan por GmailToken en un cache acotado junto con sus credenciales.
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from sqlalchemy.orm import Session
+from models import GmailToken
+from utils.cache import CacheTTL
+
+# Mensajes por petición batch (Gmail admite 100; recomienda no pasar de 50)
+GMAIL_LOTE = 50
+# Reintentos de los mensajes de un batch que fallan con 429 o 5xx, y espera base (se duplica)
+GMAIL_LOTE_REINTENTOS = int(os.getenv("GMAIL_LOTE_REINTENTOS", "3"))
+GMAIL_LOTE_ESPERA = float(os.getenv("GMAIL_LOTE_ESPERA", "1"))
+# Mensajes recientes que se revisan cuando no hay checkpoint o el historial expiró
+GMAIL_RESYNC_MAXIMO = int(os.getenv("GMAIL_RESYNC_MAXIMO", "20"))
+
+
+# Tópico de Pub/Sub al que Gmail envía los push del INBOX
+GMAIL_TOPICO = os.getenv("GMAIL_TOPICO", "projects/vast-ascent-443822-d0/topics/Chreosis")
+
+# Servicios de Gmail listos para usar, por GmailToken.id
+GMAIL_CLIENTES_MAX = int(os.getenv("GMAIL_CLIENTES_MAX", "256"))
+GMAIL_CLIENTES_TTL = float(os.getenv("GMAIL_CLIENTES_TTL", "3600"))
+clientes = CacheTTL(maximo=GMAIL_CLIENTES_MAX, ttl=GMAIL_CLIENTES_TTL)
+
+_documento_discovery = None
+
+
+class HistorialExpirado(Exception):
+    """El startHistoryId es demasiado viejo: Gmail ya no guarda ese historial (404)."""
+
+
+class MensajesNoObtenidos(Exception):
+    """Mensajes del batch que no se pudieron descargar: el checkpoint no debe avanzar."""
+
+
+def credenciales(gmail_token: GmailToken):
+    from google.oauth2.credentials import Credentials
+    # Convertir los scopes de string a lista
+    scopes = gmail_token.scopes.split(",") if gmail_token.scopes else []
+    return Credentials(
+        token=gmail_token.access_token,
+        refresh_token=gmail_token.refresh_token,
+        token_uri=gmail_token.token_uri,
+        client_id=gmail_token.client_id,
+        client_secret=gmail_token.client_secret,
+        scopes=scopes,
+        # Con la expiración guardada no se renueva un token todavía válido
+        expiry=gmail_token.expiration_date
+    )
+
+
+def _discovery() -> dict | None:
+    """Documento discovery de Gmail v1 incluido en la librería, parseado una vez."""
+    global _documento_discovery
+    if _documento_discovery is None:
+        from googleapiclient.discovery_cache import get_static_doc
+        contenido = get_static_doc('gmail', 'v1')
+        if contenido is not None:
+            _documento_discovery = json.loads(contenido)
+    return _documento_discovery
+
+
+def construir_servicio(credentials):
+    from googleapiclient.discovery import build, build_from_document
+    documento = _discovery()
+    if documento is None:
+        return build('gmail', 'v1', credentials=credentials, static_discovery=True)
+    return build_from_document(documento, credentials=credentials)
+
+
+def servicio_para(gmail_token: GmailToken):
+    """
+    (servicio, credenciales) del token, reutilizados entre notificaciones.
+    Se reconstruyen si cambian el refresh token, el cliente o los scopes
+    (p. ej. al volver a conectar Gmail), o si otro (el renovador) guardó un
+    access token distinto. Bloqueante si hay que construirlo.
+    Un servicio no debe usarse desde dos hilos a la vez: la cola procesa una
+    sola notificación por cuenta al mismo tiempo y el renovador usa sus
+    propias credenciales.
+    """
+    firma = (gmail_token.refresh_token, gmail_token.client_id, gmail_token.scopes)
+    entrada = clientes.get(gmail_token.id)
+    if entrada is not None and entrada[2] == firma and entrada[1].token == gmail_token.access_token:
+        return entrada[0], entrada[1]
+    creds = credenciales(gmail_token)
+    servicio = construir_servicio(creds)
+    clientes.set(gmail_token.id, (servicio, creds, firma))
+    return servicio, creds
+
+
+def olvidar_cliente(gmail_token_id: int) -> None:
+    """Saca del cache el servicio de un token borrado o reemplazado."""
+    clientes.delete(gmail_token_id)
+
+
+def persistir_refresco(gmail_token: GmailToken, creds) -> bool:
+    """
+    Copia al GmailToken (sin commit) el access token que google-auth renovó,
+    para que otros procesos y los reinicios no vuelvan a renovarlo.
+    Retorna True si hubo cambios.
+    """
+    if not creds.token or creds.token == gmail_token.access_token:
+        return False
+    gmail_token.access_token = creds.token
+    gmail_token.expiration_date = creds.expiry
+    return True
+
+
+def refrescar(creds) -> None:
+    """Renueva el access token contra el token_uri del GmailToken. Bloqueante."""
+    from google.auth.transport.requests import Request
+    creds.refresh(Request())
+
+
+def renovar_watch(servicio) -> tuple[str | None, datetime | None]:
+    """
+    Registra (o vuelve a registrar) el watch del INBOX hacia GMAIL_TOPICO.
+    Gmail lo da de baja a los 7 días si no se renueva. Bloqueante.
+    Retorna (historyId actual, expiración del watch en UTC).
+    """
+    respuesta = servicio.users().watch(userId='me', body={
+        'labelIds': ['INBOX'],
+        'topicName': GMAIL_TOPICO,
+        'labelFilterBehavior': 'INCLUDE'
+    }).execute()
+    history_id = respuesta.get('historyId')
+    expiracion = respuesta.get('expiration')  # milisegundos desde epoch
+    return (
+        str(history_id) if history_id else None,
+        datetime.utcfromtimestamp(int(expiracion) / 1000) if expiracion else None,
+    )
+
+
+def ids_desde_historial(servicio, start_history_id: str) -> tuple[list[str], str | None]:
+    """
+    Ids de los mensajes agregados al INBOX desde `start_history_id` (en orden
+    de llegada, sin repetir) y el historyId actual del buzón.
+    """
+    from googleapiclient.errors import HttpError
+    ids: list[str] = []
+    vistos: set[str] = set()
+    ultimo = None
+    page_token = None
+    while True:
+        try:
+            respuesta = servicio.users().history().list(
+                userId='me',
+                startHistoryId=start_history_id,
+                historyTypes=['messageAdded'],
+                labelId='INBOX',
+                pageToken=page_token
+            ).execute()
+        except HttpError as e:
+            if e.resp.status == 404:
+                raise HistorialExpirado() from e
+            raise
+        for registro in respuesta.get('history', []):
+            for agregado in registro.get('messagesAdded', []):
+                msg_id = agregado['message']['id']
+                if msg_id not in vistos:
+                    vistos.add(msg_id)
+                    ids.append(msg_id)
+        ultimo = respuesta.get('historyId', ultimo)
+        page_token = respuesta.get('nextPageToken')
+        if not page_token:
+            return ids, ultimo
+
+
+def ids_recientes(servicio, maximo: int) -> list[str]:
+    """Ids de los últimos `maximo` mensajes del INBOX, del más viejo al más nuevo."""
+    respuesta = servicio.users().messages().list(userId='me', labelIds=['INBOX'], maxResults=maximo).execute()
+    return [m['id'] for m in reversed(respuesta.get('messages', []))]
+
+
+def _estado_http(error) -> int:
+    return int(getattr(getattr(error, "resp", None), "status", 0) or 0)
+
+
+def _reintentable(error) -> bool:
+    estado = _estado_http(error)
+    return estado == 429 or estado >= 500
+
+
+def obtener_mensajes(servicio, ids: list[str]) -> list[dict]:
+    """
+    Descarga los mensajes completos en peticiones batch de GMAIL_LOTE. Los que
+    fallan con 429 o 5xx se vuelven a pedir hasta GMAIL_LOTE_REINTENTOS veces;
+    los borrados desde la notificación (404) se omiten. Si alguno no se pudo
+    descargar lanza MensajesNoObtenidos: la cola reintenta la notificación con
+    el mismo checkpoint en lugar de perder esos mensajes.
+    """
+    mensajes: dict[str, dict] = {}
+    errores: dict[str, Exception] = {}
+
+    def recibir(request_id, respuesta, error):
+        if error is not None:
+            errores[request_id] = error
+        else:
+            mensajes[request_id] = respuesta
+
+    pendientes = list(ids)
+    for intento in range(GMAIL_LOTE_REINTENTOS + 1):
+        if intento:
+            time.sleep(GMAIL_LOTE_ESPERA * 2 ** (intento - 1))
+        errores.clear()
+        for inicio in range(0, len(pendientes), GMAIL_LOTE):
+            lote = servicio.new_batch_http_request(callback=recibir)
+            for msg_id in pendientes[inicio:inicio + GMAIL_LOTE]:
+                lote.add(servicio.users().messages().get(userId='me', id=msg_id, format='full'), request_id=msg_id)
+            lote.execute()
+        for msg_id, error in errores.items():
+            if _estado_http(error) == 404:
+                print(f"⚠️ Mensaje {msg_id} ya no existe, se omite")
+        fallidos = {msg_id: e for msg_id, e in errores.items() if _estado_http(e) != 404}
+        if not fallidos or intento == GMAIL_LOTE_REINTENTOS or not all(_reintentable(e) for e in fallidos.values()):
+            break
+        pendientes = [msg_id for msg_id in pendientes if msg_id in fallidos]
+        print(f"🔁 Reintentando {len(pendientes)} mensajes del batch ({intento + 1}/{GMAIL_LOTE_REINTENTOS})")
+    if fallidos:
+        raise MensajesNoObtenidos(
+            f"No se pudieron obtener {len(fallidos)} mensajes: "
+            + ", ".join(f"{msg_id} ({e})" for msg_id, e in list(fallidos.items())[:5])
+        )
+    return [mensajes[msg_id] for msg_id in ids if msg_id in mensajes]
+
+
+def ids_nuevos(servicio, checkpoint: str | None, history_id_notificacion) -> tuple[list[str], str]:
+    """
+    Ids de los mensajes del INBOX posteriores al checkpoint y el nuevo
+    checkpoint. Sin checkpoint, o si el historial expiró, revisa los últimos
+    GMAIL_RESYNC_MAXIMO mensajes (resincronización acotada). Bloqueante; los
+    mensajes se descargan después con obtener_mensajes.
+    """
+    if checkpoint:
+        try:
+            ids, ultimo = ids_desde_historial(servicio, checkpoint)
+            return ids, str(ultimo or history_id_notificacion)
+        except HistorialExpirado:
+            print(f"⚠️ historyId {checkpoint} expirado, resincronizando los últimos {GMAIL_RESYNC_MAXIMO} mensajes")
+    return ids_recientes(servicio, GMAIL_RESYNC_MAXIMO), str(history_id_notificacion)
+
+
+def respaldar_emails(db: Session) -> tuple[int, int]:
+    """
+    Completa `GmailToken.email` en los tokens guardados antes de que existiera
+    la columna, consultando getProfile una vez por token.
+    Retorna (actualizados, fallidos).
+    """
+    actualizados = fallidos = 0
+    for gmail_token in db.query(GmailToken).filter(GmailToken.email.is_(None)).all():
+        try:
+            servicio = construir_servicio(credenciales(gmail_token))
+            perfil = servicio.users().getProfile(userId='me').execute()
+            gmail_token.email = perfil['emailAddress']
+            db.commit()
+            actualizados += 1
+            print(f"✓ Token {gmail_token.id}: {gmail_token.email}")
+        except Exception as e:
+            db.rollback()
+            fallidos += 1
+            print(f"❌ Token {gmail_token.id} (dispositivo {gmail_token.dispositivo_id}): {e}")
+    return actualizados, fallidos
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Completa el email de los tokens de Gmail existentes")
+    parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        actualizados, fallidos = respaldar_emails(db)
+        print(f"✅ Emails completados: {actualizados}, con error: {fallidos}")
+    finally:
+        db.close()
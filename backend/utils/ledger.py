@@ -0,0 +1,93 @@
+"""
+Servicio de saldos de cuentas.
+
+Todas las modificaciones de `Cuenta.amount` provocadas por transacciones pasan
+por aquí. En lugar de leer el saldo, modificarlo en Python y guardarlo (lo que
+pierde actualizaciones cuando dos peticiones tocan la misma cuenta), cada
+movimiento es un único UPDATE condicional:
+
+    UPDATE cuentas SET amount = amount + :delta
+    WHERE id = :id AND user_id = :user AND amount >= :monto   -- solo en gastos
+
+En PostgreSQL y SQL Server el UPDATE bloquea la fila hasta el commit del
+llamador; SQLite bloquea la base entera. En los dos casos la verificación de
+"Fondos insuficientes" y el cambio de saldo son atómicos.
+test_ledger_concurrencia.py lo prueba en SQLite y, si DATABASE_URL apunta a
+uno de ellos, en PostgreSQL o SQL Server. Los movimientos
+con fecha también actualizan los checkpoints diarios (utils/saldos.py).
+Ninguna función hace commit: forman parte de la transacción del handler.
+"""
+from datetime import datetime
+from typing import Iterable
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from models import Cuenta
+from utils.saldos import registrar_saldo
+
+
+def delta_transaccion(tipo: str, monto: float) -> float:
+    """Efecto de una transacción sobre el saldo de su cuenta."""
+    if tipo == "gasto":
+        return -monto
+    if tipo == "ingreso":
+        return monto
+    return 0
+
+
+def ajustar_saldo(
+    db: Session,
+    user_id: int,
+    account_id: int,
+    delta: float,
+    validar_fondos: bool = True
+) -> None:
+    """
+    Suma `delta` al saldo de la cuenta en un solo UPDATE.
+    Si `validar_fondos` y el delta es negativo, el UPDATE solo aplica cuando
+    el saldo alcanza; de lo contrario lanza 400 "Fondos insuficientes".
+    """
+    query = db.query(Cuenta).filter(Cuenta.id == account_id, Cuenta.user_id == user_id)
+    if validar_fondos and delta < 0:
+        query = query.filter(Cuenta.amount >= -delta)
+    actualizadas = query.update({Cuenta.amount: Cuenta.amount + delta}, synchronize_session=False)
+    if actualizadas:
+        return
+
+    existe = db.query(Cuenta.id).filter(Cuenta.id == account_id, Cuenta.user_id == user_id).first()
+    if not existe:
+        raise HTTPException(status_code=404, detail="Cuenta no encontrada")
+    raise HTTPException(status_code=400, detail="Fondos insuficientes")
+
+
+def aplicar_movimiento(
+    db: Session, user_id: int, account_id: int, tipo: str, monto: float, fecha: datetime
+) -> None:
+    """Aplica una transacción nueva (los gastos validan fondos)."""
+    delta = delta_transaccion(tipo, monto)
+    ajustar_saldo(db, user_id, account_id, delta)
+    registrar_saldo(db, user_id, account_id, fecha.date(), delta)
+
+
+def revertir_movimiento(
+    db: Session, user_id: int, account_id: int, tipo: str, monto: float, fecha: datetime
+) -> None:
+    """Deshace el efecto de una transacción existente (sin validar fondos)."""
+    delta = -delta_transaccion(tipo, monto)
+    ajustar_saldo(db, user_id, account_id, delta, validar_fondos=False)
+    registrar_saldo(db, user_id, account_id, fecha.date(), delta)
+
+
+def bloquear_cuentas(db: Session, user_id: int, account_ids: Iterable[int]) -> None:
+    """
+    Bloquea varias cuentas en orden de id antes de modificarlas, para que dos
+    peticiones que mueven saldo entre las mismas cuentas no se bloqueen mutuamente.
+    """
+    ids = sorted(set(account_ids))
+    if len(ids) > 1:
+        (
+            db.query(Cuenta.id)
+            .filter(Cuenta.id.in_(ids), Cuenta.user_id == user_id)
+            .order_by(Cuenta.id)
+            .with_for_update()
+            .all()
+        )
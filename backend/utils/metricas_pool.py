@@ -0,0 +1,92 @@
+"""
+Métricas del pool de conexiones de SQLAlchemy.
+
+Los contadores se alimentan de los eventos del pool (connect, checkout,
+checkin, close, invalidate). El tiempo de espera por una conexión no tiene
+evento propio, así que se mide envolviendo `_do_get` en una subclase del
+pool (ver `clase_pool`). Se exponen en GET /diagnostico/pool.
+"""
+import threading
+import time
+from sqlalchemy import event
+
+
+class MetricasPool:
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self._lock = threading.Lock()
+        self.conexiones_creadas = 0
+        self.conexiones_cerradas = 0
+        self.invalidadas = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.esperas = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.timeouts = 0
+
+    def _sumar(self, campo: str) -> None:
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+    def instrumentar(self, pool) -> None:
+        event.listen(pool, "connect", lambda *_: self._sumar("conexiones_creadas"))
+        event.listen(pool, "close", lambda *_: self._sumar("conexiones_cerradas"))
+        event.listen(pool, "close_detached", lambda *_: self._sumar("conexiones_cerradas"))
+        event.listen(pool, "invalidate", lambda *_: self._sumar("invalidadas"))
+        event.listen(pool, "soft_invalidate", lambda *_: self._sumar("invalidadas"))
+        event.listen(pool, "checkout", lambda *_: self._sumar("checkouts"))
+        event.listen(pool, "checkin", lambda *_: self._sumar("checkins"))
+
+    def registrar_espera(self, segundos: float, timeout: bool = False) -> None:
+        with self._lock:
+            self.esperas += 1
+            self.espera_total += segundos
+            self.espera_max = max(self.espera_max, segundos)
+            if timeout:
+                self.timeouts += 1
+
+    def estadisticas(self, pool) -> dict:
+        """Estado actual del pool más los contadores acumulados."""
+        with self._lock:
+            datos = {
+                "pool": self.nombre,
+                "conexiones_creadas": self.conexiones_creadas,
+                "conexiones_cerradas": self.conexiones_cerradas,
+                "invalidadas": self.invalidadas,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "espera_promedio_ms": round(self.espera_total / self.esperas * 1000, 3) if self.esperas else 0.0,
+                "espera_max_ms": round(self.espera_max * 1000, 3),
+                "timeouts": self.timeouts,
+            }
+        # Solo los pools con cola (QueuePool y variantes) exponen tamaño y overflow
+        for campo, metodo in (("size", "size"), ("checked_out", "checkedout"),
+                              ("checked_in", "checkedin"), ("overflow", "overflow")):
+            if hasattr(pool, metodo):
+                datos[campo] = getattr(pool, metodo)()
+        if "overflow" in datos:
+            # QueuePool lo reporta negativo mientras no se llenó el pool base
+            datos["overflow"] = max(datos["overflow"], 0)
+        return datos
+
+
+def clase_pool(base, metricas: MetricasPool):
+    """
+    Subclase de `base` que mide cuánto espera cada checkout por una conexión.
+    Se usa como `poolclass`; `engine.dispose()` recrea el pool con la misma
+    clase, así que la medición se conserva.
+    """
+    class PoolMedido(base):
+        def _do_get(self):
+            inicio = time.perf_counter()
+            try:
+                conexion = super()._do_get()
+            except Exception:
+                metricas.registrar_espera(time.perf_counter() - inicio, timeout=True)
+                raise
+            metricas.registrar_espera(time.perf_counter() - inicio)
+            return conexion
+
+    PoolMedido.__name__ = f"{base.__name__}Medido"
+    return PoolMedido
@@ -0,0 +1,391 @@
+"""
+Extracción por plantillas de las notificaciones de consumo de los bancos.
+
+Los correos "Notificación de Consumo" son generados por sistemas: con una
+expresión regular por campo se obtienen Monto, Fecha, Moneda y Lugar en
+microsegundos. GPT queda como respaldo para los correos que ninguna
+plantilla reconoce (ver utils/email_processor.py).
+
+- Cada plantilla aplica a ciertos remitentes (fragmentos del From, p. ej. el
+  dominio del banco) y cuenta intentos y aciertos.
+- Plantillas propias: PLANTILLAS_CORREO_ARCHIVO, un JSON con una lista de
+  {"nombre", "remitentes", "reconocer", "campos", "formatos_fecha", "moneda"}.
+- Los correos que van a GPT se agrupan por forma (remitente y comienzo del
+  texto con los números enmascarados). Cuando una forma se repite
+  PLANTILLAS_PROMOVER_MINIMO veces, se arma una plantilla candidata a partir
+  de la respuesta de GPT; se ve en /diagnostico/plantillas_correo para
+  copiarla al JSON, o se registra sola con PLANTILLAS_AUTOPROMOVER=true.
+
+Probar una plantilla contra un correo guardado:
+
+    python -m utils.plantillas_correo correo.txt --remitente alertas@banco.com
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+
+_DIRECTORIO_CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config")
+PLANTILLAS_CORREO_ARCHIVO = os.getenv(
+    "PLANTILLAS_CORREO_ARCHIVO", os.path.join(_DIRECTORIO_CONFIG, "plantillas_correo.json")
+)
+PLANTILLAS_PROMOVER_MINIMO = int(os.getenv("PLANTILLAS_PROMOVER_MINIMO", "5"))
+PLANTILLAS_AUTOPROMOVER = os.getenv("PLANTILLAS_AUTOPROMOVER", "false").lower() in ("1", "true", "yes")
+# Formas distintas de correos enviados a GPT que se recuerdan (las menos vistas se descartan)
+PLANTILLAS_FORMAS_MAX = 500
+
+# Categoría que asigna el prompt de GPT a todos los consumos
+CATEGORIA_POR_DEFECTO = "Casa"
+
+MONTO = r"\d{1,3}(?:[.,]\d{3})+(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?"
+FECHA = r"\d{1,2}/\d{1,2}/\d{2,4}|\d{4}-\d{2}-\d{2}|\d{1,2}-\d{1,2}-\d{2,4}"
+MONEDA = r"RD\$|US\$|U\$S|DOP|USD|EUR|€|\$"
+FORMATOS_FECHA = ("%d/%m/%Y", "%d/%m/%y", "%Y-%m-%d", "%d-%m-%Y", "%d-%m-%y")
+MONEDAS = {"RD$": "DOP", "DOP": "DOP", "US$": "USD", "U$S": "USD", "USD": "USD", "EUR": "EUR", "€": "EUR"}
+
+
+def normalizar_monto(texto: str) -> float:
+    """'1,234.56', '1.234,56', '1234' -> float. El último separador seguido de 1-2 dígitos es el decimal."""
+    texto = texto.strip()
+    separadores = [i for i, c in enumerate(texto) if c in ".,"]
+    if separadores and len(texto) - separadores[-1] - 1 in (1, 2):
+        entero, decimales = texto[:separadores[-1]], texto[separadores[-1] + 1:]
+    else:
+        entero, decimales = texto, "0"
+    return float(re.sub(r"[.,]", "", entero) + "." + decimales)
+
+
+def normalizar_fecha(texto: str | None, formatos=FORMATOS_FECHA) -> str | None:
+    """Fecha en formato YYYY-MM-DD (el que espera save_transaction_to_db), o None."""
+    for formato in formatos:
+        try:
+            return datetime.strptime(texto, formato).strftime("%Y-%m-%d")
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+@dataclass
+class Plantilla:
+    nombre: str
+    # campo (monto, lugar, fecha, moneda) -> regex con el valor en el grupo "valor" (o el grupo 1)
+    campos: dict[str, str]
+    # Fragmentos del remitente a los que aplica (en minúsculas); vacío = cualquiera
+    remitentes: tuple[str, ...] = ()
+    # Regex que identifica el correo; sin ella basta con que se extraigan los campos
+    reconocer: str | None = None
+    formatos_fecha: tuple[str, ...] = FORMATOS_FECHA
+    # Moneda cuando el correo no la indica o solo dice "$"
+    moneda: str = "DOP"
+    intentos: int = 0
+    aciertos: int = 0
+    _regex: dict = field(default_factory=dict, repr=False)
+
+    def __post_init__(self):
+        self.remitentes = tuple(r.lower() for r in self.remitentes)
+        self._regex = {c: re.compile(p, re.I) for c, p in self.campos.items()}
+        self._reconocer = re.compile(self.reconocer, re.I) if self.reconocer else None
+
+    def aplica_a(self, remitente: str | None) -> bool:
+        return not self.remitentes or (remitente is not None and any(r in remitente.lower() for r in self.remitentes))
+
+    def _valor(self, campo: str, texto: str) -> str | None:
+        regex = self._regex.get(campo)
+        coincidencia = regex.search(texto) if regex else None
+        if coincidencia is None:
+            return None
+        valor = coincidencia.groupdict().get("valor") or (coincidencia.group(1) if regex.groups else coincidencia.group(0))
+        return valor.strip() if valor else None
+
+    def extraer(self, texto: str) -> dict | None:
+        """Datos de la transacción con el formato de la respuesta de GPT, o None si no reconoce el correo."""
+        if self._reconocer is not None and not self._reconocer.search(texto):
+            return None
+        monto, lugar = self._valor("monto", texto), self._valor("lugar", texto)
+        if monto is None or not lugar:
+            return None
+        try:
+            monto = normalizar_monto(monto)
+        except ValueError:
+            return None
+        # Sin fecha legible el correo va a GPT: no se asume la de hoy
+        fecha = normalizar_fecha(self._valor("fecha", texto), self.formatos_fecha)
+        if fecha is None:
+            return None
+        moneda = (self._valor("moneda", texto) or "").upper()
+        return {
+            "Monto": monto,
+            "Fecha": fecha,
+            "Categoria": CATEGORIA_POR_DEFECTO,
+            "Moneda": MONEDAS.get(moneda, self.moneda),
+            "Lugar": lugar,
+            "Status": "APROBADA",
+            "Origen": f"plantilla:{self.nombre}",
+        }
+
+    def a_config(self) -> dict:
+        """Representación para PLANTILLAS_CORREO_ARCHIVO."""
+        return {
+            "nombre": self.nombre,
+            "remitentes": list(self.remitentes),
+            "reconocer": self.reconocer,
+            "campos": self.campos,
+            "formatos_fecha": list(self.formatos_fecha),
+            "moneda": self.moneda,
+        }
+
+    @classmethod
+    def desde_config(cls, datos: dict) -> "Plantilla":
+        return cls(
+            nombre=datos["nombre"],
+            campos=datos["campos"],
+            remitentes=tuple(datos.get("remitentes", ())),
+            reconocer=datos.get("reconocer"),
+            formatos_fecha=tuple(datos.get("formatos_fecha", FORMATOS_FECHA)),
+            moneda=datos.get("moneda", "DOP"),
+        )
+
+
+# Redacciones habituales de las notificaciones de consumo con tarjeta:
+#   "... consumo con su tarjeta terminada en 1234 por RD$ 1,250.00 en SUPERMERCADO X el 20/03/2024 ..."
+#   "Notificación de Consumo / Monto: US$ 45.99 / Comercio: AMAZON.COM / Fecha: 21/03/2024"
+# Aplica a cualquier remitente, así que el cuerpo tiene que decir que es un
+# consumo con tarjeta; otros correos con un monto van a GPT.
+PLANTILLAS_BASE = [
+    Plantilla(
+        nombre="consumo_tarjeta",
+        reconocer=(
+            r"\bnotificaci[oó]n\s+de\s+consumo\b|\bconsumo\s+con\s+su\s+tarjeta\b"
+            r"|\btarjeta\s+(?:terminada|finalizada)\s+en\s+\d{4}\b"
+        ),
+        campos={
+            "moneda": rf"\b(?:por|monto(?:\s+de)?|valor)\s*:?\s*(?P<valor>{MONEDA})\s*(?:{MONTO})",
+            "monto": rf"\b(?:por|monto(?:\s+de)?|valor)\s*:?\s*(?:{MONEDA})?\s*(?P<valor>{MONTO})",
+            # Después del monto ("... 1,250.00 en X") o con etiqueta; nunca empieza con un dígito
+            "lugar": (
+                rf"(?:(?:{MONTO})\s+en|\b(?:comercio|establecimiento)\s*:)\s*(?P<valor>[^\W\d][^\n\r,]*?)"
+                r"\s*(?:,|\.(?:\s|$)|\s+el\s+\d|\s+(?:fecha|a\s+las)\b|\r|\n|$)"
+            ),
+            "fecha": rf"(?P<valor>{FECHA})",
+        },
+    ),
+]
+
+
+def forma(texto: str, remitente: str | None, lugar: str | None = None) -> str:
+    """
+    Firma de la plantilla de un correo: remitente y el comienzo del texto con
+    números (y el comercio, si se conoce) enmascarados. Los correos de un
+    mismo molde comparten la firma aunque cambien monto, fecha o comercio.
+    """
+    if lugar:
+        texto = re.sub(re.escape(lugar), "<lugar>", texto, flags=re.I)
+    # Cada número (con sus separadores: 1,250.00 o 05-04-2024) pasa a ser un 9
+    enmascarado = re.sub(r"\d(?:[\d.,/-]*\d)?", "9", re.sub(r"\s+", " ", texto)).strip().lower()
+    return f"{(remitente or '').lower()}|{enmascarado[:80]}"
+
+
+def _contexto(texto: str, inicio: int, desde: int = 0) -> str:
+    """
+    Regex de las (hasta) 2 palabras fijas anteriores a una posición: sin
+    cruzar números ni el tramo antes de `desde` (otro valor variable).
+    """
+    previo = texto[desde:inicio]
+    digito = re.search(r"\d(?!.*\d)", previo, re.S)
+    if digito:
+        previo = previo[digito.end():]
+    palabras = previo.split()[-2:]
+    if not palabras:
+        return ""
+    return r"\s*".join(re.escape(p) for p in palabras) + r"\s*"
+
+
+def _siguiente(texto: str, fin: int) -> str:
+    """Regex que cierra un valor: el signo o la palabra que lo sigue, o el fin de línea."""
+    siguiente = re.match(r"[ \t]*([^\w\s]|[^\W\d]+)", texto[fin:])
+    if siguiente is None:
+        return r"[ \t]*(?:\r|\n|$)"
+    return r"\s*" + re.escape(siguiente.group(1))
+
+
+def sugerir_plantilla(nombre: str, remitente: str | None, ejemplo: str, resultado: dict) -> Plantilla | None:
+    """
+    Plantilla candidata para los correos con la forma de `ejemplo`, a partir
+    de lo que GPT extrajo de él: cada campo se ancla a las palabras que lo
+    rodean en el texto. Solo se devuelve si reproduce ese resultado.
+    """
+    try:
+        monto = float(resultado.get("Monto"))
+    except (TypeError, ValueError):
+        return None
+    campos = {}
+    lugar = str(resultado.get("Lugar") or "").strip()
+    posicion = ejemplo.lower().find(lugar.lower()) if lugar else -1
+    if posicion < 0:
+        return None
+    fin_lugar = posicion + len(lugar)
+    campos["lugar"] = _contexto(ejemplo, posicion) + r"(?P<valor>[^\n\r]+?)" + _siguiente(ejemplo, fin_lugar)
+
+    for coincidencia in re.finditer(MONTO, ejemplo):
+        if abs(normalizar_monto(coincidencia.group(0)) - monto) < 0.005:
+            desde = fin_lugar if fin_lugar <= coincidencia.start() else 0
+            campos["monto"] = _contexto(ejemplo, coincidencia.start(), desde) + rf"(?:{MONEDA})?\s*(?P<valor>{MONTO})"
+            # Moneda antes ("RD$ 1,250.00") o después ("3.450,75 EUR") del monto
+            antes = re.search(rf"({MONEDA})\s*$", ejemplo[:coincidencia.start()])
+            despues = re.match(rf"\s*({MONEDA})", ejemplo[coincidencia.end():])
+            if antes:
+                campos["moneda"] = _contexto(ejemplo, antes.start(), desde) + rf"(?P<valor>{MONEDA})\s*(?:{MONTO})"
+            elif despues:
+                campos["moneda"] = rf"(?:{MONTO})\s*(?P<valor>{MONEDA})"
+            break
+    if "monto" not in campos:
+        return None
+
+    for coincidencia in re.finditer(FECHA, ejemplo):
+        if normalizar_fecha(coincidencia.group(0)) == resultado.get("Fecha"):
+            desde = fin_lugar if fin_lugar <= coincidencia.start() else 0
+            campos["fecha"] = _contexto(ejemplo, coincidencia.start(), desde) + rf"(?P<valor>{FECHA})"
+            break
+
+    dominio = (remitente or "").lower().rsplit("@", 1)[-1].strip("> ")
+    candidata = Plantilla(
+        nombre=nombre,
+        campos=campos,
+        remitentes=(dominio,) if dominio else (),
+        moneda=resultado.get("Moneda") if resultado.get("Moneda") in MONEDAS.values() else "DOP",
+    )
+    extraido = candidata.extraer(ejemplo)
+    if extraido is None or extraido["Lugar"].lower() != lugar.lower() or abs(extraido["Monto"] - monto) >= 0.005:
+        return None
+    if "fecha" in campos and extraido["Fecha"] != resultado.get("Fecha"):
+        return None
+    return candidata
+
+
+class RegistroPlantillas:
+    def __init__(self, plantillas: list[Plantilla] | None = None):
+        self._plantillas: list[Plantilla] = list(plantillas or [])
+        self._lock = threading.Lock()
+        self.total = 0
+        self.fallbacks = 0
+        # forma -> {"veces", "remitente", "ejemplo", "resultado"}
+        self._formas: dict[str, dict] = {}
+        self.candidatas: dict[str, Plantilla] = {}
+
+    def registrar(self, plantilla: Plantilla) -> None:
+        """Agrega (o reemplaza por nombre) una plantilla; las propias van antes que las base."""
+        with self._lock:
+            self._plantillas = [p for p in self._plantillas if p.nombre != plantilla.nombre]
+            self._plantillas.insert(0, plantilla)
+
+    def cargar_archivo(self, ruta: str = PLANTILLAS_CORREO_ARCHIVO) -> int:
+        """Registra las plantillas del JSON, si existe. Retorna cuántas."""
+        if not os.path.exists(ruta):
+            return 0
+        with open(ruta, encoding="utf-8") as archivo:
+            datos = json.load(archivo)
+        for item in datos:
+            self.registrar(Plantilla.desde_config(item))
+        return len(datos)
+
+    def extraer(self, texto: str, remitente: str | None = None) -> dict | None:
+        """Resultado de la primera plantilla del remitente que reconoce el correo, o None."""
+        with self._lock:
+            self.total += 1
+            plantillas = [p for p in self._plantillas if p.aplica_a(remitente)]
+        for plantilla in plantillas:
+            plantilla.intentos += 1
+            resultado = plantilla.extraer(texto)
+            if resultado is not None:
+                plantilla.aciertos += 1
+                return resultado
+        with self._lock:
+            self.fallbacks += 1
+        return None
+
+    def registrar_fallback(self, texto: str, remitente: str | None, resultado: dict) -> None:
+        """
+        Cuenta la forma de un correo que resolvió GPT y, al llegar a
+        PLANTILLAS_PROMOVER_MINIMO, arma su plantilla candidata.
+        """
+        if resultado.get("Status") != "APROBADA":
+            return
+        clave = forma(texto, remitente, str(resultado.get("Lugar") or ""))
+        with self._lock:
+            entrada = self._formas.get(clave)
+            if entrada is None:
+                if len(self._formas) >= PLANTILLAS_FORMAS_MAX:
+                    del self._formas[min(self._formas, key=lambda c: self._formas[c]["veces"])]
+                entrada = self._formas[clave] = {"veces": 0, "remitente": remitente}
+            entrada["veces"] += 1
+            entrada["ejemplo"], entrada["resultado"] = texto, resultado
+            promover = entrada["veces"] >= PLANTILLAS_PROMOVER_MINIMO and clave not in self.candidatas
+        if not promover:
+            return
+        candidata = sugerir_plantilla(f"candidata_{len(self.candidatas) + 1}", remitente, texto, resultado)
+        if candidata is None:
+            return
+        with self._lock:
+            self.candidatas[clave] = candidata
+        print(f"🧩 Plantilla candidata para {remitente or 'remitente desconocido'}: {candidata.nombre}")
+        if PLANTILLAS_AUTOPROMOVER:
+            self.registrar(candidata)
+
+    def formas_frecuentes(self, limite: int = 20) -> list[dict]:
+        """
+        Las formas más vistas con su candidata. La forma se identifica por un
+        hash: su texto es el comienzo de un correo de algún usuario.
+        """
+        with self._lock:
+            formas = sorted(self._formas.items(), key=lambda item: -item[1]["veces"])[:limite]
+            return [
+                {
+                    "forma": hashlib.sha1(clave.encode("utf-8")).hexdigest()[:12],
+                    "veces": datos["veces"],
+                    "remitente": datos["remitente"],
+                    "candidata": self.candidatas[clave].a_config() if clave in self.candidatas else None,
+                }
+                for clave, datos in formas
+            ]
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "correos": self.total,
+                "fallbacks_gpt": self.fallbacks,
+                "tasa_plantillas": round((self.total - self.fallbacks) / self.total, 4) if self.total else 0.0,
+                "plantillas": [
+                    {
+                        "nombre": p.nombre,
+                        "intentos": p.intentos,
+                        "aciertos": p.aciertos,
+                        "tasa_aciertos": round(p.aciertos / p.intentos, 4) if p.intentos else 0.0,
+                    }
+                    for p in self._plantillas
+                ],
+                "candidatas": len(self.candidatas),
+            }
+
+
+plantillas = RegistroPlantillas(PLANTILLAS_BASE)
+plantillas.cargar_archivo()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba las plantillas de correo contra un correo guardado")
+    parser.add_argument("archivo", help="Texto plano del correo")
+    parser.add_argument("--remitente", default=None, help="Campo From del correo")
+    args = parser.parse_args()
+
+    with open(args.archivo, encoding="utf-8") as archivo:
+        texto = archivo.read()
+    resultado = plantillas.extraer(texto, args.remitente)
+    if resultado is None:
+        print("❌ Ninguna plantilla reconoce el correo (iría a GPT)")
+        print(f"Forma: {forma(texto, args.remitente)}")
+    else:
+        print(f"✅ {json.dumps(resultado, ensure_ascii=False, indent=2)}")
@@ -0,0 +1,172 @@
+"""
+Renovación anticipada de los access tokens y de los watch de Gmail.
+
+Cada GMAIL_RENOVAR_INTERVALO segundos se recorren, en lotes de
+GMAIL_RENOVAR_LOTE por id, los GmailToken cuyo access token vence dentro de
+GMAIL_RENOVAR_ANTICIPO segundos o cuyo watch vence dentro de
+GMAIL_WATCH_ANTICIPO, y se renuevan con hasta GMAIL_RENOVAR_CONCURRENCIA a la
+vez. Así ninguna notificación paga la renovación del token y el watch no
+caduca en silencio. Un token que falla (p. ej. refresh token revocado) no se
+vuelve a intentar hasta pasados GMAIL_RENOVAR_REINTENTO segundos.
+
+El renovador no usa los servicios cacheados de servicio_para (pueden estar en
+uso en un worker de la cola y ni httplib2 ni las Credentials son thread-safe):
+renueva con credenciales propias y solo guarda el token nuevo; el worker
+reconstruye su servicio al ver el cambio.
+
+Con varios workers de uvicorn cada uno corre su renovador; renovar dos veces
+el mismo token o el mismo watch es inofensivo. GMAIL_RENOVADOR=false lo
+desactiva en un proceso.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import suppress
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, select
+
+from database import sesion_async
+from models import GmailToken
+from utils.gmail import construir_servicio, credenciales, persistir_refresco, refrescar, renovar_watch
+
+GMAIL_RENOVADOR = os.getenv("GMAIL_RENOVADOR", "true").lower() in ("1", "true", "yes")
+GMAIL_RENOVAR_INTERVALO = float(os.getenv("GMAIL_RENOVAR_INTERVALO", "60"))
+GMAIL_RENOVAR_ANTICIPO = float(os.getenv("GMAIL_RENOVAR_ANTICIPO", "600"))
+GMAIL_WATCH_ANTICIPO = float(os.getenv("GMAIL_WATCH_ANTICIPO", str(24 * 3600)))
+GMAIL_RENOVAR_LOTE = int(os.getenv("GMAIL_RENOVAR_LOTE", "100"))
+GMAIL_RENOVAR_CONCURRENCIA = int(os.getenv("GMAIL_RENOVAR_CONCURRENCIA", "4"))
+GMAIL_RENOVAR_REINTENTO = float(os.getenv("GMAIL_RENOVAR_REINTENTO", "900"))
+
+
+class RenovadorGmail:
+    def __init__(self, concurrencia: int = GMAIL_RENOVAR_CONCURRENCIA):
+        self.concurrencia = concurrencia
+        self._tarea: asyncio.Task | None = None
+        # GmailToken.id -> time.monotonic() desde el que se puede reintentar
+        self._en_espera: dict[int, float] = {}
+        self.tokens_renovados = 0
+        self.tokens_fallidos = 0
+        self.watches_renovados = 0
+        self.watches_fallidos = 0
+        self.ciclos = 0
+        self.ultimo_ciclo: datetime | None = None
+        self.duracion_ultimo_ciclo = 0.0
+        self.errores = deque(maxlen=20)
+
+    def iniciar(self) -> None:
+        """Arranca el ciclo periódico en el event loop actual (desde el lifespan)."""
+        if not GMAIL_RENOVADOR or self._tarea is not None:
+            return
+        self._tarea = asyncio.create_task(self._correr())
+
+    async def detener(self) -> None:
+        if self._tarea is None:
+            return
+        self._tarea.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._tarea
+        self._tarea = None
+
+    async def _correr(self) -> None:
+        while True:
+            try:
+                await self.ciclo()
+            except Exception as e:
+                print(f"❌ Error en el ciclo de renovación de Gmail: {e}")
+            await asyncio.sleep(GMAIL_RENOVAR_INTERVALO)
+
+    async def ciclo(self) -> None:
+        """Una pasada completa sobre los tokens por vencer, lote a lote."""
+        inicio = time.monotonic()
+        ahora = datetime.utcnow()
+        limite_token = ahora + timedelta(seconds=GMAIL_RENOVAR_ANTICIPO)
+        limite_watch = ahora + timedelta(seconds=GMAIL_WATCH_ANTICIPO)
+        semaforo = asyncio.Semaphore(self.concurrencia)
+        desde_id = 0
+        while True:
+            async with sesion_async() as db:
+                lote = (await db.execute(
+                    select(GmailToken.id, GmailToken.expiration_date, GmailToken.watch_expira)
+                    .where(GmailToken.id > desde_id)
+                    .where(or_(
+                        GmailToken.expiration_date.is_(None), GmailToken.expiration_date <= limite_token,
+                        GmailToken.watch_expira.is_(None), GmailToken.watch_expira <= limite_watch,
+                    ))
+                    .order_by(GmailToken.id)
+                    .limit(GMAIL_RENOVAR_LOTE)
+                )).all()
+            pendientes = [
+                self._renovar(
+                    semaforo, fila.id,
+                    token=fila.expiration_date is None or fila.expiration_date <= limite_token,
+                    watch=fila.watch_expira is None or fila.watch_expira <= limite_watch,
+                )
+                for fila in lote if self._en_espera.get(fila.id, 0) <= time.monotonic()
+            ]
+            await asyncio.gather(*pendientes)
+            if len(lote) < GMAIL_RENOVAR_LOTE:
+                break
+            desde_id = lote[-1].id
+        self.ciclos += 1
+        self.ultimo_ciclo = ahora
+        self.duracion_ultimo_ciclo = time.monotonic() - inicio
+
+    async def _renovar(self, semaforo: asyncio.Semaphore, token_id: int, token: bool, watch: bool) -> None:
+        async with semaforo:
+            async with sesion_async() as db:
+                gmail_token = await db.get(GmailToken, token_id)
+                if gmail_token is None:
+                    return
+                try:
+                    creds = await asyncio.to_thread(credenciales, gmail_token)
+                    if token:
+                        await asyncio.to_thread(refrescar, creds)
+                        persistir_refresco(gmail_token, creds)
+                        await db.commit()
+                        self.tokens_renovados += 1
+                        self._en_espera.pop(token_id, None)
+                except Exception as e:
+                    self.tokens_fallidos += 1
+                    self._fallo(token_id, "token", e)
+                    return
+                if not watch:
+                    return
+                try:
+                    servicio = await asyncio.to_thread(construir_servicio, creds)
+                    history_id, expira = await asyncio.to_thread(renovar_watch, servicio)
+                    gmail_token.watch_expira = expira
+                    # El checkpoint solo se inicializa: pisarlo saltearía mensajes sin procesar
+                    if not gmail_token.history_id:
+                        gmail_token.history_id = history_id
+                    await db.commit()
+                    self.watches_renovados += 1
+                    self._en_espera.pop(token_id, None)
+                except Exception as e:
+                    self.watches_fallidos += 1
+                    self._fallo(token_id, "watch", e)
+
+    def _fallo(self, token_id: int, tipo: str, error: Exception) -> None:
+        self._en_espera[token_id] = time.monotonic() + GMAIL_RENOVAR_REINTENTO
+        self.errores.append({
+            "gmail_token_id": token_id, "tipo": tipo, "error": str(error), "fecha": datetime.utcnow().isoformat()
+        })
+        print(f"❌ No se pudo renovar el {tipo} de Gmail del token {token_id}: {error}")
+
+    def estadisticas(self) -> dict:
+        return {
+            "activo": self._tarea is not None,
+            "ciclos": self.ciclos,
+            "ultimo_ciclo": self.ultimo_ciclo.isoformat() if self.ultimo_ciclo else None,
+            "duracion_ultimo_ciclo": round(self.duracion_ultimo_ciclo, 3),
+            "tokens_renovados": self.tokens_renovados,
+            "tokens_fallidos": self.tokens_fallidos,
+            "watches_renovados": self.watches_renovados,
+            "watches_fallidos": self.watches_fallidos,
+            "en_espera": sum(1 for t in self._en_espera.values() if t > time.monotonic()),
+            "errores_recientes": list(self.errores),
+        }
+
+
+renovador_gmail = RenovadorGmail()
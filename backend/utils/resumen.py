@@ -0,0 +1,158 @@
+"""
+Mantenimiento del resumen mensual de gastos/ingresos (tabla resumenes_mensuales).
+
+Los handlers de transacciones llaman a `sumar_transaccion` dentro de su propia
+transacción de base de datos, así el resumen nunca queda desfasado respecto a
+`transacciones`. Para regenerarlo desde cero:
+
+    python -m utils.resumen [--user-id ID]
+"""
+import argparse
+from datetime import datetime
+from sqlalchemy import extract, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import ResumenMensual, Transaccion
+
+
+def _mes(fecha: datetime) -> str:
+    return fecha.strftime("%Y-%m")
+
+
+def aplicar_a_resumen(
+    db: Session,
+    user_id: int,
+    fecha: datetime,
+    category_id: int,
+    account_id: int,
+    tipo: str,
+    monto: float,
+    cantidad: int
+) -> None:
+    """
+    Suma `monto` y `cantidad` (pueden ser negativos) a la fila del resumen.
+    No hace commit: forma parte de la transacción del llamador.
+    """
+    filtro = (
+        ResumenMensual.user_id == user_id,
+        ResumenMensual.year_month == _mes(fecha),
+        ResumenMensual.category_id == category_id,
+        ResumenMensual.account_id == account_id,
+        ResumenMensual.type == tipo,
+    )
+    cambios = {
+        ResumenMensual.total: ResumenMensual.total + monto,
+        ResumenMensual.cantidad: ResumenMensual.cantidad + cantidad,
+    }
+    if db.query(ResumenMensual).filter(*filtro).update(cambios, synchronize_session=False):
+        if cantidad < 0:
+            _borrar_vacias(db, filtro)
+        return
+    try:
+        with db.begin_nested():
+            db.add(ResumenMensual(
+                user_id=user_id,
+                year_month=_mes(fecha),
+                category_id=category_id,
+                account_id=account_id,
+                type=tipo,
+                total=monto,
+                cantidad=cantidad
+            ))
+    except IntegrityError:
+        # Otra petición creó la fila entre el UPDATE y el INSERT
+        db.query(ResumenMensual).filter(*filtro).update(cambios, synchronize_session=False)
+        if cantidad < 0:
+            _borrar_vacias(db, filtro)
+
+
+def _borrar_vacias(db: Session, filtro: tuple) -> None:
+    """Quita la fila que quedó sin transacciones (si no, impide borrar su categoría o cuenta)."""
+    db.query(ResumenMensual).filter(*filtro, ResumenMensual.cantidad <= 0).delete(synchronize_session=False)
+
+
+def borrar_resumenes(db: Session, category_id: int | None = None, account_id: int | None = None) -> None:
+    """
+    Borra las filas del resumen de una categoría o cuenta que se va a eliminar.
+    No hace commit: forma parte de la transacción del llamador.
+    """
+    query = db.query(ResumenMensual)
+    if category_id is not None:
+        query = query.filter(ResumenMensual.category_id == category_id)
+    if account_id is not None:
+        query = query.filter(ResumenMensual.account_id == account_id)
+    query.delete(synchronize_session=False)
+
+
+def sumar_transaccion(db: Session, transaccion: Transaccion, signo: int = 1) -> None:
+    """Aplica (signo=1) o revierte (signo=-1) una transacción en el resumen."""
+    aplicar_a_resumen(
+        db,
+        user_id=transaccion.user_id,
+        fecha=transaccion.date,
+        category_id=transaccion.category_id,
+        account_id=transaccion.account_id,
+        tipo=transaccion.type,
+        monto=signo * transaccion.amount,
+        cantidad=signo
+    )
+
+
+def reconstruir_resumenes(db: Session, user_id: int | None = None) -> int:
+    """
+    Regenera el resumen a partir de `transacciones` (todo o un solo usuario).
+    Retorna el número de filas creadas.
+    """
+    anio = extract("year", Transaccion.date).label("anio")
+    mes = extract("month", Transaccion.date).label("mes")
+    agregados = db.query(
+        Transaccion.user_id,
+        anio,
+        mes,
+        Transaccion.category_id,
+        Transaccion.account_id,
+        Transaccion.type,
+        func.sum(Transaccion.amount).label("total"),
+        func.count(Transaccion.id).label("cantidad")
+    )
+    borrado = db.query(ResumenMensual)
+    if user_id is not None:
+        agregados = agregados.filter(Transaccion.user_id == user_id)
+        borrado = borrado.filter(ResumenMensual.user_id == user_id)
+    agregados = agregados.group_by(
+        Transaccion.user_id, anio, mes,
+        Transaccion.category_id, Transaccion.account_id, Transaccion.type
+    )
+
+    borrado.delete(synchronize_session=False)
+    filas = [
+        {
+            "user_id": fila.user_id,
+            "year_month": f"{int(fila.anio):04d}-{int(fila.mes):02d}",
+            "category_id": fila.category_id,
+            "account_id": fila.account_id,
+            "type": fila.type,
+            "total": fila.total,
+            "cantidad": fila.cantidad,
+        }
+        for fila in agregados
+    ]
+    if filas:
+        db.bulk_insert_mappings(ResumenMensual, filas)
+    db.commit()
+    return len(filas)
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Regenera la tabla resumenes_mensuales")
+    parser.add_argument("--user-id", type=int, default=None, help="Solo este usuario")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        total = reconstruir_resumenes(db, user_id=args.user_id)
+        print(f"✅ Resumen regenerado: {total} filas")
+    finally:
+        db.close()
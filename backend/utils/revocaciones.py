@@ -0,0 +1,124 @@
+"""
+Registro de familias de refresh tokens y de las revocadas.
+
+Cada login abre una familia (`familias_refresh`) que guarda el único jti que
+se puede rotar. /usuarios/refresh rota con un UPDATE condicionado a ese jti:
+solo un worker gana aunque dos reciban el mismo token, y un token ya rotado
+(posible robo) no coincide y revoca la familia. Nada se guarda por rotación,
+así que las tablas crecen con las sesiones activas, no con los refresh.
+
+Revocar una familia (logout o reutilización) borra su fila y la anota en
+`tokens_revocados`. Esa tabla respalda un diccionario en memoria (familia ->
+expiración) que rechaza sin escribir en la BD los tokens de familias
+revocadas; cada proceso la relee, de forma incremental por id, como mucho
+cada REVOCACION_SYNC_SEGUNDOS. Lo que revocó otro worker desde entonces lo
+detecta igual el UPDATE, porque la fila de la familia ya no existe.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import FamiliaRefresh, TokenRevocado
+
+REVOCACION_SYNC_SEGUNDOS = float(os.getenv("REVOCACION_SYNC_SEGUNDOS", "30"))
+# Cada cuánto se borran de la tabla las revocaciones ya expiradas
+REVOCACION_PURGA_SEGUNDOS = 3600
+
+
+class RegistroRevocaciones:
+    def __init__(self, intervalo: float = REVOCACION_SYNC_SEGUNDOS):
+        self.intervalo = intervalo
+        self._revocados: dict[str, float] = {}
+        self._ultimo_id = 0
+        self._ultima_sync: float | None = None
+        self._ultima_purga = 0.0
+        self._lock = threading.Lock()
+
+    def sincronizar(self, db: Session, forzar: bool = False) -> None:
+        """Trae de la BD las revocaciones nuevas (las de otros workers incluidas)."""
+        ahora = time.monotonic()
+        with self._lock:
+            if not forzar and self._ultima_sync is not None and ahora - self._ultima_sync < self.intervalo:
+                return
+            desde = self._ultimo_id
+        filas = (
+            db.query(TokenRevocado.id, TokenRevocado.jti, TokenRevocado.expira)
+            .filter(TokenRevocado.id > desde, TokenRevocado.expira > datetime.utcnow())
+            .order_by(TokenRevocado.id)
+            .all()
+        )
+        with self._lock:
+            for fila in filas:
+                self._revocados[fila.jti] = _epoch(fila.expira)
+                self._ultimo_id = max(self._ultimo_id, fila.id)
+            self._ultima_sync = ahora
+            vencidos = [jti for jti, expira in self._revocados.items() if expira <= time.time()]
+            for jti in vencidos:
+                del self._revocados[jti]
+            purgar = ahora - self._ultima_purga >= REVOCACION_PURGA_SEGUNDOS
+            if purgar:
+                self._ultima_purga = ahora
+        if purgar:
+            db.query(TokenRevocado).filter(TokenRevocado.expira <= datetime.utcnow()).delete(synchronize_session=False)
+            db.query(FamiliaRefresh).filter(FamiliaRefresh.expira <= datetime.utcnow()).delete(synchronize_session=False)
+            db.commit()
+
+    def esta_revocado(self, *ids: str) -> bool:
+        with self._lock:
+            return any(i in self._revocados for i in ids)
+
+    def abrir_familia(self, db: Session, familia: str, jti: str, user_id: int, expira: datetime) -> None:
+        """Registra la familia de un login con su primer token (commit incluido)."""
+        db.add(FamiliaRefresh(familia=familia, jti=jti, user_id=user_id, expira=expira))
+        db.commit()
+
+    def rotar(self, db: Session, familia: str, jti: str, nuevo_jti: str, expira: datetime) -> bool:
+        """
+        Reemplaza el jti vigente de la familia por `nuevo_jti` si `jti` es el
+        vigente. Retorna False si la familia no existe (revocada o vencida) o
+        si `jti` ya se había rotado; en ese caso no cambia nada.
+        """
+        actualizadas = (
+            db.query(FamiliaRefresh)
+            .filter(
+                FamiliaRefresh.familia == familia,
+                FamiliaRefresh.jti == jti,
+                FamiliaRefresh.expira > datetime.utcnow(),
+            )
+            .update({FamiliaRefresh.jti: nuevo_jti, FamiliaRefresh.expira: expira}, synchronize_session=False)
+        )
+        db.commit()
+        return actualizadas == 1
+
+    def revocar(self, db: Session, familia: str, user_id: int, expira: datetime) -> bool:
+        """
+        Revoca la familia (borra su fila y la anota) y hace commit. Retorna
+        False si ya estaba revocada (p. ej. por otro worker).
+        """
+        db.query(FamiliaRefresh).filter(FamiliaRefresh.familia == familia).delete(synchronize_session=False)
+        db.add(TokenRevocado(jti=familia, tipo="familia", user_id=user_id, expira=expira))
+        try:
+            db.commit()
+            nuevo = True
+        except IntegrityError:
+            db.rollback()
+            db.query(FamiliaRefresh).filter(FamiliaRefresh.familia == familia).delete(synchronize_session=False)
+            db.commit()
+            nuevo = False
+        with self._lock:
+            self._revocados[familia] = _epoch(expira)
+        return nuevo
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._revocados)
+
+
+def _epoch(fecha: datetime) -> float:
+    """`expira` se guarda en UTC sin zona horaria."""
+    return (fecha - datetime(1970, 1, 1)).total_seconds()
+
+
+revocaciones = RegistroRevocaciones()
@@ -0,0 +1,174 @@
+"""
+Checkpoints diarios de saldo por cuenta (tabla saldos_diarios).
+
+Cada fila guarda el saldo al cierre de un día con movimientos y el neto de
+ese día. Un movimiento con fecha D:
+  - suma el delta al neto y al saldo de D (creando la fila si no existe), y
+  - suma el delta al saldo de todos los días posteriores con un solo UPDATE,
+por lo que las ediciones con fecha pasada quedan reflejadas igual que las nuevas.
+
+El saldo a una fecha se obtiene leyendo un único checkpoint (el último con
+fecha <= D). Para cuentas con historial anterior a esta tabla:
+
+    python -m utils.saldos [--account-id ID]
+"""
+import argparse
+from datetime import date, timedelta
+from sqlalchemy.orm import Session
+from models import Cuenta, SaldoDiario, Transaccion
+
+
+def registrar_saldo(
+    db: Session,
+    user_id: int,
+    account_id: int,
+    fecha: date,
+    delta: float,
+    pendiente: float | None = None
+) -> None:
+    """
+    Refleja en los checkpoints un movimiento de `delta` con fecha `fecha`.
+
+    Se llama después de aplicar el delta a `Cuenta.amount` (ver utils/ledger.py):
+    la fila de la cuenta ya está bloqueada y serializa este mantenimiento.
+    `pendiente` es la parte de `Cuenta.amount` que aún no está en los checkpoints
+    (por defecto el propio delta); solo se usa si la cuenta no tiene ninguno.
+    No hace commit.
+    """
+    if not delta:
+        return
+    del_dia = db.query(SaldoDiario).filter(SaldoDiario.account_id == account_id, SaldoDiario.fecha == fecha).update(
+        {SaldoDiario.saldo: SaldoDiario.saldo + delta, SaldoDiario.neto: SaldoDiario.neto + delta},
+        synchronize_session=False
+    )
+    db.query(SaldoDiario).filter(SaldoDiario.account_id == account_id, SaldoDiario.fecha > fecha).update(
+        {SaldoDiario.saldo: SaldoDiario.saldo + delta},
+        synchronize_session=False
+    )
+    if del_dia:
+        return
+
+    # No había movimientos ese día: el saldo previo es el cierre del día anterior
+    # con checkpoint, o la apertura del siguiente, o el saldo actual de la cuenta.
+    anterior = (
+        db.query(SaldoDiario.saldo)
+        .filter(SaldoDiario.account_id == account_id, SaldoDiario.fecha < fecha)
+        .order_by(SaldoDiario.fecha.desc())
+        .first()
+    )
+    if anterior:
+        base = anterior.saldo
+    else:
+        siguiente = (
+            db.query(SaldoDiario.saldo, SaldoDiario.neto)
+            .filter(SaldoDiario.account_id == account_id, SaldoDiario.fecha > fecha)
+            .order_by(SaldoDiario.fecha)
+            .first()
+        )
+        if siguiente:
+            # Su saldo ya incluye el delta recién sumado
+            base = siguiente.saldo - delta - siguiente.neto
+        else:
+            actual = db.query(Cuenta.amount).filter(Cuenta.id == account_id).scalar() or 0
+            base = actual - (delta if pendiente is None else pendiente)
+    db.add(SaldoDiario(user_id=user_id, account_id=account_id, fecha=fecha, saldo=base + delta, neto=delta))
+    db.flush()
+
+
+def saldo_en_fecha(db: Session, account_id: int, fecha: date) -> float:
+    """Saldo de la cuenta al cierre de `fecha`."""
+    anterior = (
+        db.query(SaldoDiario.saldo)
+        .filter(SaldoDiario.account_id == account_id, SaldoDiario.fecha <= fecha)
+        .order_by(SaldoDiario.fecha.desc())
+        .first()
+    )
+    if anterior:
+        return anterior.saldo
+    siguiente = (
+        db.query(SaldoDiario.saldo, SaldoDiario.neto)
+        .filter(SaldoDiario.account_id == account_id, SaldoDiario.fecha > fecha)
+        .order_by(SaldoDiario.fecha)
+        .first()
+    )
+    if siguiente:
+        return siguiente.saldo - siguiente.neto
+    return db.query(Cuenta.amount).filter(Cuenta.id == account_id).scalar() or 0
+
+
+def serie_saldos(db: Session, account_id: int, desde: date, hasta: date) -> list[tuple[date, float]]:
+    """
+    Evolución del saldo entre `desde` y `hasta`: el saldo de apertura en
+    `desde` y el cierre de cada día con movimientos dentro del rango.
+    """
+    puntos = [(desde, saldo_en_fecha(db, account_id, desde - timedelta(days=1)))]
+    filas = (
+        db.query(SaldoDiario.fecha, SaldoDiario.saldo)
+        .filter(SaldoDiario.account_id == account_id, SaldoDiario.fecha >= desde, SaldoDiario.fecha <= hasta)
+        .order_by(SaldoDiario.fecha)
+    )
+    for fila in filas:
+        if fila.fecha == desde:
+            puntos[0] = (fila.fecha, fila.saldo)
+        else:
+            puntos.append((fila.fecha, fila.saldo))
+    return puntos
+
+
+def reconstruir_saldos(db: Session, account_id: int | None = None) -> int:
+    """
+    Regenera los checkpoints desde `transacciones`, partiendo del saldo actual
+    de cada cuenta y retrocediendo día a día. Los ajustes directos del monto
+    (crear/actualizar cuenta) no tienen transacción, así que quedan incluidos
+    en el saldo de apertura. Retorna el número de filas creadas.
+    """
+    cuentas = db.query(Cuenta.id, Cuenta.user_id, Cuenta.amount)
+    borrado = db.query(SaldoDiario)
+    if account_id is not None:
+        cuentas = cuentas.filter(Cuenta.id == account_id)
+        borrado = borrado.filter(SaldoDiario.account_id == account_id)
+    borrado.delete(synchronize_session=False)
+
+    creadas = 0
+    for cuenta in cuentas.all():
+        netos: dict[date, float] = {}
+        movimientos = (
+            db.query(Transaccion.date, Transaccion.type, Transaccion.amount)
+            .filter(Transaccion.account_id == cuenta.id)
+            .yield_per(1000)
+        )
+        for fecha, tipo, monto in movimientos:
+            delta = monto if tipo == "ingreso" else -monto if tipo == "gasto" else 0
+            netos[fecha.date()] = netos.get(fecha.date(), 0) + delta
+
+        saldo = cuenta.amount or 0
+        filas = []
+        for dia in sorted(netos, reverse=True):
+            filas.append({
+                "user_id": cuenta.user_id,
+                "account_id": cuenta.id,
+                "fecha": dia,
+                "saldo": saldo,
+                "neto": netos[dia],
+            })
+            saldo -= netos[dia]
+        if filas:
+            db.bulk_insert_mappings(SaldoDiario, filas)
+            creadas += len(filas)
+    db.commit()
+    return creadas
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Regenera la tabla saldos_diarios")
+    parser.add_argument("--account-id", type=int, default=None, help="Solo esta cuenta")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        total = reconstruir_saldos(db, account_id=args.account_id)
+        print(f"✅ Checkpoints regenerados: {total} filas")
+    finally:
+        db.close()
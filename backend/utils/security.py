@@ -1,23 +1,131 @@
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
 
-# Configuración para hashing de contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Configuración para hashing de contraseñas. min/max iguales al costo por defecto:
+# si BCRYPT_ROUNDS cambia, los hashes anteriores se marcan para actualizar y se
+# re-hashean de forma transparente en el siguiente login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+# Pool de procesos para bcrypt: el hashing es CPU puro y, dentro del worker,
+# retiene el GIL y frena al resto de endpoints.
+# - HASH_POOL_SIZE: procesos del pool (0 = ejecutar en el mismo proceso).
+# - HASH_POOL_QUEUE: operaciones admitidas a la vez (ejecutando + en espera);
+#   por encima se rechaza de inmediato con PoolHashSaturado.
+# - HASH_POOL_TIMEOUT: segundos máximos esperando un resultado; el trabajo
+#   abandonado se cancela si aún no empezó y conserva su cupo hasta terminar.
+HASH_POOL_SIZE = int(os.getenv("HASH_POOL_SIZE", str(min(os.cpu_count() or 2, 4))))
+HASH_POOL_QUEUE = int(os.getenv("HASH_POOL_QUEUE", str(max(HASH_POOL_SIZE, 1) * 8)))
+HASH_POOL_TIMEOUT = float(os.getenv("HASH_POOL_TIMEOUT", "5"))
 
 # Configuración para JWT
 SECRET_KEY = "supersecretkey"  # Cambia esto por una variable de entorno en producción
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
 
-def hash_password(password: str) -> str:
-    """Hashea la contraseña usando bcrypt."""
+
+class PoolHashSaturado(Exception):
+    """El pool de hashing no admite más trabajo; el llamador debe responder 503."""
+
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+_cupos = threading.BoundedSemaphore(max(HASH_POOL_QUEUE, 1))
+
+
+def configurar_pool(tamano: int, cola: int) -> None:
+    """Cambia el tamaño del pool y de la cola (benchmarks y pruebas)."""
+    global HASH_POOL_SIZE, HASH_POOL_QUEUE, _pool, _cupos
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+        HASH_POOL_SIZE = tamano
+        HASH_POOL_QUEUE = cola
+        _cupos = threading.BoundedSemaphore(max(cola, 1))
+
+
+def cerrar_pool() -> None:
+    """Detiene los procesos del pool (al apagar la app)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _obtener_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: el proceso padre tiene hilos y conexiones abiertas que no deben heredarse
+            _pool = ProcessPoolExecutor(
+                max_workers=HASH_POOL_SIZE,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _ejecutar(funcion, *args):
+    if HASH_POOL_SIZE <= 0:
+        return funcion(*args)
+    cupos = _cupos
+    if not cupos.acquire(blocking=False):
+        raise PoolHashSaturado()
+    try:
+        futuro = _obtener_pool().submit(funcion, *args)
+    except BaseException:
+        cupos.release()
+        raise
+    # El cupo se libera cuando el trabajo termina o se cancela, no cuando el
+    # llamador deja de esperarlo: así la cola del pool nunca pasa de HASH_POOL_QUEUE
+    futuro.add_done_callback(lambda _: cupos.release())
+    try:
+        return futuro.result(timeout=HASH_POOL_TIMEOUT)
+    except FutureTimeoutError:
+        futuro.cancel()
+        raise PoolHashSaturado()
+
+
+# Funciones que corren dentro del pool (deben ser de nivel de módulo para poder serializarse)
+def _hash(password: str) -> str:
     return pwd_context.hash(password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verifica una contraseña contra su hash."""
+def _verify(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+def _verify_and_update(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def hash_password(password: str) -> str:
+    """Hashea la contraseña usando bcrypt (en el pool de procesos)."""
+    return _ejecutar(_hash, password)
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verifica una contraseña contra su hash (en el pool de procesos)."""
+    return _ejecutar(_verify, plain_password, hashed_password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """
+    Verifica la contraseña y, si el hash usa parámetros de costo anteriores,
+    retorna también el nuevo hash para guardarlo: (valida, nuevo_hash | None).
+    """
+    return _ejecutar(_verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
     """
     Crea un JWT (token de acceso) codificando los datos del usuario.
@@ -30,6 +138,23 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_refresh_token(user_id: int, familia: str | None = None) -> str:
+    """
+    Crea un refresh token de un solo uso.
+    - jti: identificador único del token (se revoca al rotarlo).
+    - fam: familia de rotación; todos los tokens obtenidos a partir del mismo
+      login la comparten, y revocarla invalida la cadena completa.
+    """
+    expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    to_encode = {
+        "sub": str(user_id),
+        "type": "refresh",
+        "jti": str(uuid.uuid4()),
+        "fam": familia or str(uuid.uuid4()),
+        "exp": expire,
+    }
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
 def decode_access_token(token: str) -> dict:
     """
     Decodifica el JWT y retorna los datos si es válido. Lanza excepción si es inválido o expiró.
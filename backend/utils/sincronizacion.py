@@ -0,0 +1,13 @@
+"""
+Utilidades para la sincronización incremental del cliente móvil.
+"""
+from sqlalchemy.orm import Session
+from models import Eliminacion
+
+
+def registrar_eliminacion(db: Session, user_id: int, entidad: str, entidad_id: int) -> None:
+    """
+    Guarda el tombstone de un borrado. No hace commit: se llama desde los
+    handlers eliminar_* antes de su propio commit.
+    """
+    db.add(Eliminacion(user_id=user_id, entidad=entidad, entidad_id=entidad_id))